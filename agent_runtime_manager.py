@@ -1,6 +1,12 @@
 import subprocess
 import os
 import argparse
+import time
+
+from lifelong_cache import ResultCache
+from lifelong_preflight import INVALID, add_preflight_args, preflight_from_args
+from lifelong_resources import ResourceMonitor, write_manifest
+from lifelong_watchdog import ABORTED, add_watchdog_args, watchdog_from_args
 
 class LifelongLauncher:
     """
@@ -10,7 +16,8 @@ class LifelongLauncher:
     def __init__(self, lifelong_path, map_file, output_folder,
                  num_agents, scenario_name, solver,
                  simulation_time=5000, simulation_window=5, planning_window=100,
-                 task_file=None, seed=0, suboptimality=1.1, extra_args=None):
+                 task_file=None, seed=0, suboptimality=1.1, extra_args=None, cache=None,
+                 watchdog=None, scen_file=None, preflight=None):
         """
         Initializes the LifelongLauncher.
 
@@ -27,6 +34,11 @@ class LifelongLauncher:
         :param seed: The random seed.
         :param suboptimality: The suboptimality factor for the solver.
         :param extra_args: A list of additional command-line arguments.
+        :param cache: Optional ResultCache. Runs found in it are restored instead of re-run.
+        :param watchdog: Optional Watchdog that aborts the run when it goes over budget.
+        :param scen_file: Optional .scen file that the pre-flight check compares with the map.
+                          It is not passed to 'lifelong'.
+        :param preflight: Optional PreflightChecker. Runs whose inputs are inconsistent are not started.
         """
         self.lifelong_path = lifelong_path
         self.map_file = map_file
@@ -41,53 +53,121 @@ class LifelongLauncher:
         self.seed = seed
         self.suboptimality = suboptimality
         self.extra_args = extra_args if extra_args is not None else []
+        self.cache = cache
+        self.watchdog = watchdog
+        self.scen_file = scen_file
+        self.preflight = preflight
         
         self.process = None
 
-    def run_simulation(self):
+    def build_command(self):
+        """
+        Builds the argument vector for the 'lifelong' executable.
+
+        :return: The command as a list of strings.
+        """
+        command = [
+            self.lifelong_path,
+            "-m", self.map_file,
+            "-o", self.output_folder,
+            "-k", str(self.num_agents),
+            "--scenario", self.scenario_name,
+            "--solver", self.solver,
+            "--simulation_time", str(self.simulation_time),
+            "--simulation_window", str(self.simulation_window),
+            "--planning_window", str(self.planning_window),
+            "-d", str(self.seed),
+            "--suboptimal_bound", str(self.suboptimality)
+        ]
+
+        if self.task_file:
+            command.extend(["--task", self.task_file])
+
+        command.extend(self.extra_args)
+        return command
+
+    def run_simulation(self, timeout=None, log_path=None):
         """
         Calls the external 'lifelong' simulation engine once with all parameters.
+
+        :param timeout: Optional wall-clock limit in seconds. The engine is killed when it is exceeded.
+        :param log_path: Optional file that receives the engine's stdout and stderr instead of the console.
+        :return: The run status, one of "finished", "cached", "failed", "timeout",
+                 "aborted: over budget" or "invalid input".
+
+        The status, exit code and resource usage of the run (peak RSS, CPU times, wall time,
+        context switches and I/O) are written to run_manifest.json in the output folder.
         """
+        if self.cache is not None and self.cache.restore(self):
+            print(f"--- Reusing cached 'lifelong' results in {self.output_folder} ---")
+            write_manifest(self.output_folder, self.build_command(), "cached")
+            return "cached"
+
+        if self.preflight is not None:
+            result = self.preflight.check_launcher(self)
+            for warning in result["warnings"]:
+                print(f"Warning: {warning}")
+            if result["errors"]:
+                for error in result["errors"]:
+                    print(f"Error: {error}")
+                print("--- Not launching 'lifelong': its inputs are inconsistent ---")
+                os.makedirs(self.output_folder, exist_ok=True)
+                write_manifest(self.output_folder, self.build_command(), INVALID, reason="; ".join(result["errors"]))
+                return INVALID
+
         print("--- Launching 'lifelong' simulation engine ---")
         
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
             print(f"Created output directory: {self.output_folder}")
 
+        log = None
+        command = self.build_command()
+        started = time.time()
+        status = "failed"
+        returncode = None
+        reason = None
+        monitor = None
         try:
-            command = [
-                self.lifelong_path,
-                "-m", self.map_file,
-                "-o", self.output_folder,
-                "-k", str(self.num_agents),
-                "--scenario", self.scenario_name,
-                "--solver", self.solver,
-                "--simulation_time", str(self.simulation_time),
-                "--simulation_window", str(self.simulation_window),
-                "--planning_window", str(self.planning_window),
-                "-d", str(self.seed),
-                "--suboptimal_bound", str(self.suboptimality)
-            ]
-            
-            if self.task_file:
-                command.extend(["--task", self.task_file])
-
-            command.extend(self.extra_args)
-
             print(f"Executing command: {' '.join(command)}")
-            
-            # This runs the command and waits for it to complete.
-            # The output of the C++ program will be streamed to the console.
-            self.process = subprocess.run(command, check=True)
-            
-            print("\n--- 'lifelong' simulation finished. ---")
+
+            if log_path:
+                log = open(log_path, 'w')
+
+            # This runs the command and waits for it to complete while sampling its resource usage.
+            # Without a log file, the output of the C++ program is streamed to the console.
+            self.process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT if log else None)
+            monitor = ResourceMonitor(self.process)
+            check = self.watchdog.watch(self) if self.watchdog is not None else None
+            returncode, reason = monitor.wait(timeout, check)
+
+            if reason == "timeout":
+                print(f"Error: 'lifelong' did not finish within {timeout} seconds and was killed.")
+                status = "timeout"
+            elif reason:
+                print(f"Error: 'lifelong' was aborted by the watchdog: {reason}")
+                status = ABORTED
+            elif returncode != 0:
+                print(f"Error: 'lifelong' exited with a non-zero status code: {returncode}")
+            else:
+                print("\n--- 'lifelong' simulation finished. ---")
+                if self.cache is not None:
+                    self.cache.store(self)
+                status = "finished"
 
         except FileNotFoundError:
             print(f"Error: The executable was not found at '{self.lifelong_path}'")
-        except subprocess.CalledProcessError as e:
-            print(f"Error: 'lifelong' exited with a non-zero status code: {e.returncode}")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+        finally:
+            if log:
+                log.close()
+            if self.process is not None and self.process.returncode is None:
+                self.process.kill()
+                self.process.wait()
+        write_manifest(self.output_folder, command, status, returncode,
+                       monitor.usage if monitor else None, started, reason)
+        return status
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Launch the 'lifelong' MAPF simulation engine.")
@@ -104,6 +184,12 @@ if __name__ == '__main__':
     parser.add_argument("--task", dest="task_file", help="Optional path to a pre-generated task file.")
     parser.add_argument("-d", "--seed", type=int, default=0, help="The random seed.")
     parser.add_argument("--suboptimal_bound", dest="suboptimality", type=float, default=1.1, help="The suboptimality factor for the solver.")
+    parser.add_argument("--cache_dir", help="Optional folder of a result cache; identical runs are reused from it.")
+    parser.add_argument("--cache_size_gb", type=float, default=10.0, help="Size cap of the result cache in GB.")
+    parser.add_argument("--scen", dest="scen_file",
+                        help="Optional .scen file checked against the map before the run (not passed to 'lifelong').")
+    add_watchdog_args(parser)
+    add_preflight_args(parser)
     
     args, unknown = parser.parse_known_args()
 
@@ -120,7 +206,11 @@ if __name__ == '__main__':
         task_file=args.task_file,
         seed=args.seed,
         suboptimality=args.suboptimality,
-        extra_args=unknown
+        extra_args=unknown,
+        cache=ResultCache(args.cache_dir, int(args.cache_size_gb * 1024 ** 3)) if args.cache_dir else None,
+        watchdog=watchdog_from_args(args),
+        scen_file=args.scen_file,
+        preflight=preflight_from_args(args)
     )
 
     launcher.run_simulation()
@@ -0,0 +1,199 @@
+import argparse
+import csv
+import os
+
+from lifelong_results import run_metrics
+from lifelong_sweep import (LifelongSweep, add_base_config_args, add_pool_args,
+                            base_config_from_args, pool_options_from_args)
+
+SUCCESS = ("finished", "cached")
+
+
+class CapacityFinder:
+    """
+    Searches for the largest number of agents a map can sustain.
+
+    A number of agents k is sustainable if every seed's run finishes, the chosen per-window
+    runtime statistic from solver.csv stays within max_runtime for every seed, and the mean
+    throughput over the seeds meets the throughput limits. Starting at k_start, k is doubled
+    until a value is not sustainable (bracketing), and the bracket is then bisected down to
+    the requested resolution. This assumes that sustainability is monotone in k.
+    """
+    CURVE_FILE = "capacity_curve.csv"
+    RUNTIME_STATS = ("mean", "p95", "max")
+
+    def __init__(self, base_config, seeds, output_root, max_runtime, runtime_stat="p95",
+                 min_throughput=None, min_throughput_per_agent=None,
+                 k_start=50, k_max=None, resolution=10, **pool_options):
+        """
+        Initializes the CapacityFinder.
+
+        :param base_config: LifelongLauncher keyword arguments shared by every run (without output_folder).
+        :param seeds: The seeds to run for every k.
+        :param output_root: Folder that receives one sweep per evaluated k and the measured curve.
+        :param max_runtime: Limit in seconds for the per-window runtime statistic.
+        :param runtime_stat: The per-window runtime statistic to limit, one of "mean", "p95" or "max".
+        :param min_throughput: Optional lower limit of the throughput, in tasks per timestep.
+        :param min_throughput_per_agent: Optional lower limit of the throughput divided by k.
+        :param k_start: The first number of agents to evaluate.
+        :param k_max: Optional upper end of the search.
+        :param resolution: The search stops when the bracket is at most this wide.
+        :param pool_options: LifelongSweep options (max_workers, timeout, cache, watchdog, preflight).
+        """
+        if runtime_stat not in self.RUNTIME_STATS:
+            raise ValueError(f"runtime_stat should be one of {self.RUNTIME_STATS}, not '{runtime_stat}'")
+        self.base_config = dict(base_config)
+        self.seeds = list(seeds)
+        self.output_root = output_root
+        self.max_runtime = max_runtime
+        self.runtime_stat = runtime_stat
+        self.min_throughput = min_throughput
+        self.min_throughput_per_agent = min_throughput_per_agent
+        self.k_start = k_start
+        self.k_max = k_max
+        self.resolution = max(1, resolution)
+        self.pool_options = pool_options
+        self.curve = {}
+
+    def evaluate(self, k):
+        """
+        Runs every seed with k agents and summarizes the runs. Results are memoized.
+
+        :return: A dict describing the point of the runtime-versus-k curve.
+        """
+        if k in self.curve:
+            return self.curve[k]
+
+        print(f"=== Evaluating k = {k} over {len(self.seeds)} seeds ===")
+        sweep = LifelongSweep(self.base_config, {"num_agents": [k], "seed": self.seeds},
+                              os.path.join(self.output_root, f"k={k}"), **self.pool_options)
+        records = sweep.run()
+
+        metrics = [run_metrics(r["output_folder"], self.base_config.get("simulation_time"))
+                   for r in records if r["status"] in SUCCESS]
+        runtimes = [m[f"runtime_{self.runtime_stat}"] for m in metrics if m[f"runtime_{self.runtime_stat}"] is not None]
+        throughputs = [m["throughput"] for m in metrics if m["throughput"] is not None]
+
+        point = {
+            "num_agents": k,
+            "runs": len(records),
+            "succeeded": len(metrics),
+            "runtime_mean": _mean([m["runtime_mean"] for m in metrics if m["runtime_mean"] is not None]),
+            "runtime_p95": _mean([m["runtime_p95"] for m in metrics if m["runtime_p95"] is not None]),
+            "runtime_worst_seed": max(runtimes) if runtimes else None,
+            "throughput": _mean(throughputs),
+        }
+        point["sustainable"], point["reason"] = self.judge(point, records)
+        print(f"=== k = {k}: {'sustainable' if point['sustainable'] else 'not sustainable'}"
+              f"{'' if point['sustainable'] else ' (' + point['reason'] + ')'} ===")
+        self.curve[k] = point
+        return point
+
+    def judge(self, point, records):
+        """
+        Decides whether a point of the curve is within the limits.
+
+        :return: A (sustainable, reason) pair.
+        """
+        failed = [r for r in records if r["status"] not in SUCCESS]
+        if failed:
+            return False, f"{len(failed)} run(s) {', '.join(sorted(set(r['status'] for r in failed)))}"
+        if point["runtime_worst_seed"] is None:
+            return False, "no replanning runtimes recorded"
+        if point["runtime_worst_seed"] > self.max_runtime:
+            return False, f"{self.runtime_stat} runtime {point['runtime_worst_seed']:.3f} s > {self.max_runtime} s"
+        if self.min_throughput is not None or self.min_throughput_per_agent is not None:
+            if point["throughput"] is None:
+                return False, "no throughput recorded"
+            if self.min_throughput is not None and point["throughput"] < self.min_throughput:
+                return False, f"throughput {point['throughput']:.3f} < {self.min_throughput}"
+            per_agent = point["throughput"] / point["num_agents"]
+            if self.min_throughput_per_agent is not None and per_agent < self.min_throughput_per_agent:
+                return False, f"throughput per agent {per_agent:.4f} < {self.min_throughput_per_agent}"
+        return True, ""
+
+    def search(self):
+        """
+        Runs the bracketing and bisection search.
+
+        :return: The largest sustainable number of agents found, or None if even the
+                 smallest evaluated value is not sustainable.
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        low, high = 0, None  # largest sustainable and smallest unsustainable k seen so far
+        k = self.k_start
+        while True:
+            if self.evaluate(k)["sustainable"]:
+                low = k
+                if self.k_max is not None and k >= self.k_max:
+                    break
+                k = k * 2 if self.k_max is None else min(k * 2, self.k_max)
+            else:
+                high = k
+                break
+
+        while high is not None and high - low > self.resolution:
+            mid = (low + high) // 2
+            if self.evaluate(mid)["sustainable"]:
+                low = mid
+            else:
+                high = mid
+
+        self.write_curve()
+        if low == 0:
+            print("No sustainable number of agents was found.")
+            return None
+        print(f"Largest sustainable number of agents: {low}"
+              + (f" (k = {high} is not sustainable)" if high is not None else " (upper end of the search)"))
+        return low
+
+    def write_curve(self):
+        """
+        Writes every evaluated point, sorted by k, to capacity_curve.csv in output_root.
+        """
+        path = os.path.join(self.output_root, self.CURVE_FILE)
+        fields = ["num_agents", "runs", "succeeded", "runtime_mean", "runtime_p95",
+                  "runtime_worst_seed", "throughput", "sustainable", "reason"]
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for k in sorted(self.curve):
+                writer.writerow(self.curve[k])
+        print(f"Runtime-versus-k curve written to {path}")
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the largest number of agents a map can sustain with the 'lifelong' engine.")
+
+    add_base_config_args(parser)
+    parser.add_argument("--seeds", default="0,1,2", help="Comma-separated seeds to run for every k (default: 0,1,2).")
+    parser.add_argument("--max_runtime", type=float, required=True, help="Limit in seconds for the per-window runtime statistic.")
+    parser.add_argument("--runtime_stat", choices=CapacityFinder.RUNTIME_STATS, default="p95",
+                        help="Per-window runtime statistic to limit (default: p95).")
+    parser.add_argument("--min_throughput", type=float, default=None, help="Lower limit of the throughput in tasks per timestep.")
+    parser.add_argument("--min_throughput_per_agent", type=float, default=None, help="Lower limit of the throughput per agent.")
+    parser.add_argument("--k_start", type=int, default=50, help="First number of agents to evaluate (default: 50).")
+    parser.add_argument("--k_max", type=int, default=None, help="Upper end of the search.")
+    parser.add_argument("--resolution", type=int, default=10, help="Stop when the bracket is at most this wide (default: 10).")
+    add_pool_args(parser)
+
+    args, unknown = parser.parse_known_args()
+
+    finder = CapacityFinder(
+        base_config_from_args(args, unknown),
+        seeds=[int(s) for s in args.seeds.split(',') if s.strip()],
+        output_root=args.output_root,
+        max_runtime=args.max_runtime,
+        runtime_stat=args.runtime_stat,
+        min_throughput=args.min_throughput,
+        min_throughput_per_agent=args.min_throughput_per_agent,
+        k_start=args.k_start,
+        k_max=args.k_max,
+        resolution=args.resolution,
+        **pool_options_from_args(args)
+    )
+    finder.search()
@@ -0,0 +1,393 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from urllib.request import pathname2url
+
+from lifelong_resources import MANIFEST_FILE
+from lifelong_results import count_finished_tasks, find_result_files, percentile, read_config
+
+# config.txt settings and the runs columns they are stored in.
+CONFIG_COLUMNS = {
+    "map": "map",
+    "#drives": "drives",
+    "seed": "seed",
+    "solver": "solver",
+    "time_limit": "time_limit",
+    "simulation_window": "simulation_window",
+    "planning_window": "planning_window",
+    "simulation_time": "simulation_time",
+    "robust": "robust",
+    "rotate": "rotate",
+    "use_dummy_paths": "use_dummy_paths",
+    "hold_endpoints": "hold_endpoints",
+}
+
+# The first twelve solver.csv columns, named after the PBS/ECBS layout. The other solvers
+# reuse the slots: WHCA writes its restarts and LRA its wait commands in the two high-level
+# columns, and both leave the columns they have no value for at 0.
+WINDOW_COLUMNS = ["runtime", "hl_expanded", "hl_generated", "ll_expanded", "ll_generated",
+                  "solution_cost", "lower_bound", "avg_path_length", "num_collisions",
+                  "timestep", "num_agents", "seed"]
+
+SUMMARY_GROUPS = ("map_name", "solver", "drives", "seed", "simulation_window", "planning_window",
+                  "simulation_time", "robust", "rotate", "status")
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+           run_id INTEGER PRIMARY KEY, folder TEXT UNIQUE, signature TEXT, indexed REAL,
+           map TEXT, map_name TEXT, drives INTEGER, seed INTEGER, solver TEXT, time_limit REAL,
+           simulation_window INTEGER, planning_window INTEGER, simulation_time INTEGER,
+           robust INTEGER, rotate INTEGER, use_dummy_paths INTEGER, hold_endpoints INTEGER,
+           status TEXT, wall_time REAL, peak_rss_bytes INTEGER,
+           windows INTEGER, runtime_total REAL, runtime_mean REAL, runtime_p95 REAL, runtime_max REAL,
+           finished_tasks INTEGER, throughput REAL, config TEXT)""",
+    "CREATE INDEX IF NOT EXISTS runs_setting ON runs (map_name, solver, drives)",
+    "CREATE INDEX IF NOT EXISTS runs_solver ON runs (solver, drives)",
+    """CREATE TABLE IF NOT EXISTS windows (
+           run_id INTEGER, call INTEGER, runtime REAL, hl_expanded INTEGER, hl_generated INTEGER,
+           ll_expanded INTEGER, ll_generated INTEGER, solution_cost INTEGER, lower_bound REAL,
+           avg_path_length REAL, num_collisions INTEGER, timestep INTEGER, num_agents INTEGER, seed INTEGER,
+           PRIMARY KEY (run_id, call)) WITHOUT ROWID""",
+]
+
+
+def folder_signature(folder):
+    """
+    Describes the state of a run folder by the sizes and modification times of its files.
+
+    :return: A string that changes whenever one of the run's files is written, or None if
+             the folder holds no config.txt.
+    """
+    files = find_result_files(folder)
+    if "config.txt" not in files:
+        return None
+    manifest = os.path.join(folder, MANIFEST_FILE)
+    if os.path.isfile(manifest):
+        files[MANIFEST_FILE] = manifest
+    parts = []
+    for name in sorted(files):
+        try:
+            stat = os.stat(files[name])
+        except OSError:
+            continue
+        parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def read_run(folder):
+    """
+    Reads one run folder: its config.txt, every solver.csv row, the finished tasks from
+    tasks.txt and the status from run_manifest.json, if present.
+
+    :return: A (run, windows) pair, where run is a dict of runs columns and windows a list
+             of solver.csv rows, each a list of WINDOW_COLUMNS values.
+    """
+    files = find_result_files(folder)
+    config = read_config(files["config.txt"])
+    run = {column: config.get(name) for name, column in CONFIG_COLUMNS.items()}
+    run["map_name"] = os.path.splitext(os.path.basename(str(run["map"] or "")))[0] or None
+    run["config"] = json.dumps(config, sort_keys=True)
+
+    windows = []
+    if "solver.csv" in files:
+        with open(files["solver.csv"]) as f:
+            for line in f:
+                fields = line.strip().split(',')
+                if len(fields) < len(WINDOW_COLUMNS):
+                    continue
+                try:
+                    windows.append([float(v) for v in fields[:len(WINDOW_COLUMNS)]])
+                except ValueError:
+                    continue
+    runtimes = [row[0] for row in windows]
+    run["windows"] = len(runtimes)
+    run["runtime_total"] = sum(runtimes) if runtimes else None
+    run["runtime_mean"] = sum(runtimes) / len(runtimes) if runtimes else None
+    run["runtime_p95"] = percentile(runtimes, 95)
+    run["runtime_max"] = max(runtimes) if runtimes else None
+
+    run["finished_tasks"] = count_finished_tasks(files["tasks.txt"]) if "tasks.txt" in files else None
+    simulation_time = run["simulation_time"]
+    run["throughput"] = run["finished_tasks"] / simulation_time \
+        if run["finished_tasks"] is not None and simulation_time else None
+
+    run["status"] = run["wall_time"] = run["peak_rss_bytes"] = None
+    manifest = os.path.join(folder, MANIFEST_FILE)
+    if os.path.isfile(manifest):
+        try:
+            with open(manifest) as f:
+                data = json.load(f)
+            resources = data.get("resources") or {}
+            run["status"] = data.get("status")
+            run["wall_time"] = resources.get("wall_time")
+            run["peak_rss_bytes"] = resources.get("peak_rss_bytes")
+        except (OSError, ValueError):
+            pass
+    return run, windows
+
+
+def _read_run_job(item):
+    folder, signature = item
+    try:
+        return folder, signature, read_run(folder), None
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        return folder, signature, None, str(e)
+
+
+def find_run_folders(root):
+    """Lists every folder below root (including root) that holds a config.txt."""
+    folders = []
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name == "config.txt":
+                        folders.append(os.path.abspath(folder))
+        except OSError:
+            continue
+    return folders
+
+
+class ExperimentIndex:
+    """
+    A SQLite database of the runs found in any number of output trees.
+
+    Every folder holding a config.txt is one run. The runs table holds its settings and
+    per-run statistics (number of replanning calls, mean/p95/max runtime, finished tasks,
+    throughput, and the status and resource usage from run_manifest.json), and the windows
+    table holds every solver.csv row. Scans are incremental: a folder is only read again
+    when the sizes or modification times of its files have changed.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the ExperimentIndex.
+
+        :param path: Path of the database file. It is created if needed.
+        """
+        self.path = path
+        with closing(self._connect()) as db, db:
+            db.execute("PRAGMA journal_mode = WAL")
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    def _connect(self, readonly=False):
+        if readonly:
+            # Open the file read-only, so a query can never change the index.
+            uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+            db = sqlite3.connect(uri, timeout=60, uri=True)
+        else:
+            db = sqlite3.connect(self.path, timeout=60)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def scan(self, roots, max_workers=None, prune=True):
+        """
+        Adds the new and changed runs below the given folders to the index.
+
+        :param roots: Output folders to scan recursively.
+        :param max_workers: Number of processes reading run folders in parallel (default: one per CPU).
+        :param prune: Also remove runs below the roots whose folder no longer holds a config.txt.
+        :return: A dict with the number of added, updated, unchanged, removed and unreadable runs.
+        """
+        started = time.time()
+        roots = [os.path.abspath(root) for root in roots]
+        folders = [folder for root in roots for folder in find_run_folders(root)]
+        with closing(self._connect()) as db:
+            known = {row["folder"]: (row["run_id"], row["signature"])
+                     for row in db.execute("SELECT run_id, folder, signature FROM runs")}
+
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "unreadable": 0}
+        todo = []
+        for folder in folders:
+            signature = folder_signature(folder)
+            if signature is None:
+                continue
+            if folder in known and known[folder][1] == signature:
+                counts["unchanged"] += 1
+            else:
+                todo.append((folder, signature))
+
+        gone = []
+        if prune:
+            present = set(folders)
+            for folder, (run_id, _) in known.items():
+                inside = any(folder == root or folder.startswith(root + os.sep) for root in roots)
+                if inside and folder not in present:
+                    gone.append(run_id)
+
+        if todo:
+            chunksize = max(1, len(todo) // (4 * (max_workers or os.cpu_count() or 1)))
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(_read_run_job, todo, chunksize=chunksize))
+        else:
+            results = []
+
+        with closing(self._connect()) as db, db:
+            if gone:
+                db.executemany("DELETE FROM windows WHERE run_id = ?", [(run_id,) for run_id in gone])
+                db.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in gone])
+                counts["removed"] = len(gone)
+            columns = list(CONFIG_COLUMNS.values()) + [
+                "map_name", "status", "wall_time", "peak_rss_bytes", "windows", "runtime_total",
+                "runtime_mean", "runtime_p95", "runtime_max", "finished_tasks", "throughput", "config"]
+            insert_run = (f"INSERT INTO runs (folder, signature, indexed, {', '.join(columns)}) "
+                          f"VALUES ({', '.join('?' * (len(columns) + 3))})")
+            insert_window = (f"INSERT INTO windows (run_id, call, {', '.join(WINDOW_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * (len(WINDOW_COLUMNS) + 2))})")
+            now = time.time()
+            for folder, signature, result, error in results:
+                if result is None:
+                    print(f"Could not read '{folder}': {error}")
+                    counts["unreadable"] += 1
+                    continue
+                run, windows = result
+                if folder in known:
+                    run_id = known[folder][0]
+                    db.execute("DELETE FROM windows WHERE run_id = ?", (run_id,))
+                    db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+                    counts["updated"] += 1
+                else:
+                    counts["added"] += 1
+                cursor = db.execute(insert_run, [folder, signature, now] + [run[c] for c in columns])
+                db.executemany(insert_window, ([cursor.lastrowid, call] + row for call, row in enumerate(windows)))
+
+        print(f"Scanned {len(folders)} run folders in {time.time() - started:.1f} s: "
+              + ", ".join(f"{n} {name}" for name, n in counts.items()))
+        return counts
+
+    def query(self, sql, params=()):
+        """
+        Runs a read-only SQL query against the runs and windows tables.
+        Statements that would modify the index fail with sqlite3.OperationalError.
+
+        :return: A list of dicts, one per result row.
+        """
+        with closing(self._connect(readonly=True)) as db:
+            return [dict(row) for row in db.execute(sql, params)]
+
+    def runs(self, **filters):
+        """
+        Lists the indexed runs matching the filters.
+
+        :param filters: runs columns and their required values, e.g. solver="PBS", drives=400.
+                        A list or tuple value matches any of its elements.
+        :return: A list of dicts, one per run.
+        """
+        where, params = _where(filters)
+        return self.query(f"SELECT * FROM runs{where} ORDER BY folder", params)
+
+    def summary(self, group_by=("map_name", "solver", "drives"), **filters):
+        """
+        Aggregates the indexed runs by setting, e.g. the mean runtime of ECBS and PBS at 400
+        drives on kiva is summary(map_name="kiva", drives=400, solver=["ECBS", "PBS"]).
+
+        :param group_by: runs columns to group by (see SUMMARY_GROUPS).
+        :param filters: runs columns and their required values, as for runs().
+        :return: A list of dicts with the group columns, the number of runs and replanning calls,
+                 the mean runtime per call over all runs of the group, the mean of the per-run p95
+                 runtimes, the largest runtime, the mean throughput and the mean finished tasks.
+        """
+        for column in group_by:
+            if column not in SUMMARY_GROUPS:
+                raise ValueError(f"Cannot group by '{column}', use one of {SUMMARY_GROUPS}")
+        where, params = _where(filters)
+        groups = ", ".join(group_by)
+        sql = (f"SELECT {groups + ', ' if groups else ''}COUNT(*) AS runs, SUM(windows) AS windows, "
+               f"SUM(runtime_total) / SUM(windows) AS runtime_mean, AVG(runtime_p95) AS runtime_p95, "
+               f"MAX(runtime_max) AS runtime_max, AVG(throughput) AS throughput, "
+               f"AVG(finished_tasks) AS finished_tasks FROM runs{where}")
+        if groups:
+            sql += f" GROUP BY {groups} ORDER BY {groups}"
+        return self.query(sql, params)
+
+
+def _where(filters):
+    clauses, params = [], []
+    for column, value in filters.items():
+        if not column.isidentifier():
+            raise ValueError(f"Invalid column name '{column}'")
+        if isinstance(value, (list, tuple)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def print_rows(rows):
+    """Prints query results as an aligned table."""
+    if not rows:
+        print("No matching runs.")
+        return
+    columns = list(rows[0])
+    cells = [[_format(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def _parse_filters(args):
+    filters = {}
+    for column in ("map_name", "solver", "status"):
+        value = getattr(args, column)
+        if value:
+            values = value.split(',')
+            filters[column] = values if len(values) > 1 else values[0]
+    for column in ("drives", "seed", "simulation_window", "planning_window"):
+        value = getattr(args, column)
+        if value:
+            values = [int(v) for v in value.split(',')]
+            filters[column] = values if len(values) > 1 else values[0]
+    return filters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Index the output folders of 'lifelong' runs in a SQLite database and query it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Add new and changed runs below the given folders to the index.")
+    ingest.add_argument("roots", nargs="+", help="Output folders to scan recursively.")
+    ingest.add_argument("--db", default="experiments.db", help="Path of the index database (default: experiments.db).")
+    ingest.add_argument("-j", "--jobs", type=int, default=None, help="Number of folders read in parallel (default: one per CPU).")
+    ingest.add_argument("--keep_missing", action="store_true", help="Keep runs whose folder no longer exists.")
+
+    summary = commands.add_parser("summary", help="Aggregate the indexed runs by setting.")
+    summary.add_argument("--db", default="experiments.db", help="Path of the index database (default: experiments.db).")
+    summary.add_argument("--group_by", default="map_name,solver,drives",
+                         help=f"Comma-separated columns to group by, from {', '.join(SUMMARY_GROUPS)} (default: map_name,solver,drives).")
+    for column in ("map_name", "solver", "status", "drives", "seed", "simulation_window", "planning_window"):
+        summary.add_argument(f"--{column}", help=f"Only include runs with this {column} (comma-separated for several).")
+
+    sql = commands.add_parser("sql", help="Run an SQL query against the runs and windows tables.")
+    sql.add_argument("--db", default="experiments.db", help="Path of the index database (default: experiments.db).")
+    sql.add_argument("query", help="The SQL query.")
+
+    args = parser.parse_args()
+    index = ExperimentIndex(args.db)
+
+    if args.command == "ingest":
+        index.scan(args.roots, max_workers=args.jobs, prune=not args.keep_missing)
+    elif args.command == "summary":
+        group_by = [c for c in args.group_by.split(',') if c]
+        print_rows(index.summary(group_by, **_parse_filters(args)))
+    else:
+        print_rows(index.query(args.query))
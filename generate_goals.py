@@ -1,49 +1,38 @@
 import argparse
 import random
 import json
+import os
 import sys
 
+# Folder of scripts/grid_map.py, which compiles maps with NumPy.
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
 def parse_map_for_traversable_cells(map_file_path):
     """
-    Parses a standard .map file to find all traversable cells.
-    Traversable cells are assumed to be marked with a '.' character.
+    Loads a map file with scripts/grid_map.py to find all traversable cells.
+    Weighted .grid files, engine (kiva) .map files and MovingAI .map files
+    are read the way the engine reads them.
 
     Args:
         map_file_path (str): The full path to the map file.
 
     Returns:
-        list: A list of (x, y) tuples representing valid, non-obstacle coordinates.
-    
-    Raises:
-        ValueError: If the 'map' keyword is not found in the file.
+        list: A list of (x, y) tuples representing valid, non-obstacle coordinates,
+              where x is the column and y the row.
     """
-    traversable_cells = []
+    # grid_map needs NumPy, so it is imported only when a map is loaded.
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.append(SCRIPTS_DIR)
+    from grid_map import GridMap
+
     try:
-        with open(map_file_path, 'r') as f:
-            lines = f.readlines()
-
-        # Find the line where the actual map grid begins
-        map_start_index = -1
-        for i, line in enumerate(lines):
-            if line.strip().lower() == 'map':
-                map_start_index = i + 1
-                break
-        
-        if map_start_index == -1:
-            raise ValueError("Map definition ('map' keyword) not found in file.")
-
-        # Iterate over the grid portion of the map
-        map_grid_lines = lines[map_start_index:]
-        for y, line in enumerate(map_grid_lines):
-            for x, char in enumerate(line.strip()):
-                if char == '.':
-                    traversable_cells.append((x, y))
-                    
+        grid_map = GridMap.load(map_file_path)
     except FileNotFoundError:
         print(f"Error: Map file not found at '{map_file_path}'", file=sys.stderr)
         sys.exit(1)
-        
-    return traversable_cells
+
+    xs, ys = grid_map.id_to_xy(grid_map.traversable.nonzero()[0])
+    return list(zip(xs.tolist(), ys.tolist()))
 
 def generate_random_goals(traversable_cells, num_goals):
     """
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from lifelong_results import RESULT_FILES, find_result_files
+
+
+class ResultCache:
+    """
+    A local, content-addressed cache of finished 'lifelong' runs.
+
+    A run is identified by the hashes of the 'lifelong' binary, the map file, the task
+    file and the argument vector (without the output folder). Each entry is a folder
+    holding the run's config.txt, solver.csv, paths.txt and tasks.txt. The total size
+    is capped, and the least recently used entries are evicted first.
+    """
+    ENTRY_FILE = "entry.json"
+
+    def __init__(self, cache_dir, max_bytes=10 * 1024 ** 3):
+        """
+        Initializes the ResultCache.
+
+        :param cache_dir: Folder that holds the cache entries.
+        :param max_bytes: Size cap of the cache in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def hash_file(self, path):
+        """
+        Hashes a file's contents. Results are memoized by path, size and modification time,
+        so the binary and the map are only read once per sweep.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if memo_key in self._file_hashes:
+                return self._file_hashes[memo_key]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        with self._lock:
+            self._file_hashes[memo_key] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def key(self, launcher):
+        """
+        Computes the cache key of a LifelongLauncher's run.
+
+        :return: A hex digest, or None if one of the input files does not exist.
+        """
+        try:
+            parts = {
+                "binary": self.hash_file(launcher.lifelong_path),
+                "map": self.hash_file(launcher.map_file),
+                "task": self.hash_file(launcher.task_file) if launcher.task_file else None,
+            }
+        except OSError:
+            return None
+
+        # The output folder does not change the result, and the input files are
+        # identified by content rather than by path.
+        placeholders = {launcher.output_folder: "<output>", launcher.map_file: "<map>",
+                        launcher.task_file: "<task>", launcher.lifelong_path: "<lifelong>"}
+        parts["args"] = [placeholders.get(arg, arg) for arg in launcher.build_command()]
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, launcher):
+        """
+        Copies a cached result into the launcher's output folder, if there is one.
+
+        :return: True on a cache hit, False otherwise.
+        """
+        key = self.key(launcher)
+        if key is None:
+            return False
+        entry = self.entry_path(key)
+        if not os.path.isfile(os.path.join(entry, self.ENTRY_FILE)):
+            return False
+
+        os.makedirs(launcher.output_folder, exist_ok=True)
+        for name in RESULT_FILES:
+            source = os.path.join(entry, name)
+            if os.path.isfile(source):
+                shutil.copy2(source, os.path.join(launcher.output_folder, name))
+        os.utime(entry)  # mark as recently used
+        return True
+
+    def store(self, launcher):
+        """
+        Adds the results of a finished run to the cache and evicts old entries if the
+        cache grows beyond its size cap.
+
+        :return: True if the run was stored.
+        """
+        key = self.key(launcher)
+        files = find_result_files(launcher.output_folder)
+        if key is None or "config.txt" not in files:
+            return False
+        entry = self.entry_path(key)
+        if os.path.isdir(entry):
+            os.utime(entry)
+            return True
+
+        # Build the entry next to its final location and rename it into place, so that
+        # concurrent runs never see a half-written entry.
+        staging = f"{entry}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(staging)
+        size = 0
+        for name, path in files.items():
+            shutil.copy2(path, os.path.join(staging, name))
+            size += os.path.getsize(path)
+        with open(os.path.join(staging, self.ENTRY_FILE), 'w') as f:
+            json.dump({"key": key, "size": size, "created": time.time(),
+                       "command": launcher.build_command()}, f, indent=4)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)  # another run stored it first
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+        Lists the cache entries.
+
+        :return: A list of (last_used, size, path) tuples.
+        """
+        found = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name.endswith(".tmp") or not os.path.isdir(path):
+                    continue
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                found.append((os.path.getmtime(path), size, path))
+        return found
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+
+        :return: The number of removed entries.
+        """
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+            return removed
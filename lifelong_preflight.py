@@ -0,0 +1,430 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+
+INVALID = "invalid input"
+
+# Number of example ids or lines listed per problem.
+MAX_EXAMPLES = 5
+# A line of a BEE task file: the sequence, one separator character and the flower ids.
+BEE_TASK_LINE = re.compile(r"^\s*(?P<agent>-?\d+)\s*\S(?P<ids>.*)$")
+# Folder of scripts/grid_map.py, which compiles maps with NumPy.
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
+
+class MapCells:
+    """
+    The free cells and connected components of a map, as plain lists for fast lookups of
+    single cells. The map is parsed with GridMap, like in the other tools.
+    """
+
+    def __init__(self, grid_map):
+        self.rows = grid_map.rows
+        self.cols = grid_map.cols
+        self.size = grid_map.size
+        self.free = grid_map.traversable.tolist()
+        self._grid_map = grid_map
+        self._components = None
+
+    def components(self):
+        """Returns the connected component of every cell, -1 for obstacles, computed once."""
+        if self._components is None:
+            self._components = self._grid_map.components().tolist()
+        return self._components
+
+
+def load_map_cells(map_file, bee=None):
+    """
+    Loads a map with scripts/grid_map.py. The module is imported here rather than at the
+    top, so the launchers still run where NumPy is not installed.
+
+    :param bee: The parameters of a BEE map file, from read_bee_parameters; the map is
+                built from its obstacles instead of being read from map_file.
+    :return: A MapCells, or None if NumPy is not installed.
+    """
+    if importlib.util.find_spec("numpy") is None:
+        return None
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.append(SCRIPTS_DIR)
+    from grid_map import NO_STATION, TYPE_NAMES, GridMap, unit_weights
+    if bee is None:
+        # Parse without the .npy cache, so launching a run writes nothing next to the map.
+        return MapCells(GridMap.load(map_file, use_cache=False))
+    # BeeGraph::load_map: a square map whose moves between free cells all cost the same.
+    size = bee["rows"] * bee["rows"]
+    obstacle = [False] * size
+    for location in bee["obstacles"]:
+        if 0 <= location < size:
+            obstacle[location] = True
+    types = [TYPE_NAMES.index("Obstacle" if blocked else "Travel") for blocked in obstacle]
+    return MapCells(GridMap(bee["rows"], bee["rows"], types, [NO_STATION] * size,
+                            unit_weights(bee["rows"], bee["rows"], obstacle)))
+
+
+def read_bee_parameters(path):
+    """
+    Reads the map (parameter) file of the BEE scenario like BeeGraph::load_map: a list of
+    labelled values (size, removes, D, N, R, T, Q, demand, theta_1, theta_2, theta_d,
+    D_locations, N_location, R_locations, remove_locations). Locations are 1-based in the
+    file and 0-based in the result.
+
+    :return: A dict with the rows (= columns) of the map, the number of bees, the flower,
+             entrance, initial and obstacle locations and the path of the time window file.
+    """
+    with open(path) as f:
+        tokens = f.read().split()
+    position = 0
+
+    def take(count):
+        nonlocal position
+        values = tokens[position + 1:position + 1 + count]  # skip the label
+        if len(values) < count:
+            raise ValueError(f"'{path}' ends before its {tokens[position] if position < len(tokens) else 'last'} values")
+        position += 1 + count
+        return [int(float(v)) for v in values]
+
+    rows, num_obstacles, num_flowers, num_bees, num_initial = (take(1)[0] for _ in range(5))
+    for count in (1, 1, num_flowers, 1, 1, num_flowers):  # T, Q, demand, theta_1, theta_2, theta_d
+        take(count)
+    flowers = [v - 1 for v in take(num_flowers)]
+    entrance = take(1)[0] - 1
+    initial = [v - 1 for v in take(num_initial)]
+    obstacles = [v - 1 for v in take(num_obstacles)]
+    # The time windows are read from the map path with "parameter" replaced by "D_time_windows".
+    name = os.path.splitext(path)[0]
+    at = name.rfind("parameter")
+    windows = name[:at] + "D_time_windows" + name[at + len("parameter"):] + ".csv" if at >= 0 else None
+    return {"rows": rows, "num_bees": num_bees, "flowers": flowers, "entrance": entrance,
+            "initial": initial, "obstacles": obstacles, "time_windows": windows}
+
+
+def read_bee_tasks(path):
+    """
+    Reads a task file of the BEE scenario like BeeSystem::load_task_assignments: one line
+    per task sequence, "i : flower_id flower_id ...". Sequence i (1-based) adds flowers to
+    the sequence of bee i, and i = 0 appends a new sequence. Flower ids are 1-based.
+
+    :return: A list of (line number, i, flower ids, unreadable ids) tuples.
+    """
+    sequences = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            match = BEE_TASK_LINE.match(line)
+            if match is None:
+                raise ValueError(f"line {number} is not in the 'i : flower_id ...' format")
+            ids, unreadable = [], []
+            for token in match.group("ids").split():
+                if token.lstrip('-').isdigit():
+                    ids.append(int(token))
+                else:
+                    unreadable.append(token)
+            sequences.append((number, int(match.group("agent")), ids, unreadable))
+    return sequences
+
+
+def read_scen_file(path):
+    """
+    Reads a MovingAI .scen file.
+
+    :return: A list of (line number, map name, width, height, start x, start y, goal x, goal y) tuples.
+    """
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split()
+            if len(fields) < 8 or fields[0] == "version":
+                continue
+            entries.append((number, fields[1], *(int(v) for v in fields[2:8])))
+    return entries
+
+
+def _problem(message, examples):
+    shown = ", ".join(str(e) for e in examples[:MAX_EXAMPLES]) + (", ..." if len(examples) > MAX_EXAMPLES else "")
+    return f"{message} ({len(examples)}: {shown})"
+
+
+def check_bee_map(grid, bee, num_agents):
+    """
+    Checks the flower, entrance and initial locations of a BEE map file, and that its time
+    window file can be read. The bees must be able to reach every flower from the entrance.
+
+    :param grid: The MapCells of the map, or None to skip the map checks.
+    :return: A (problems, warnings) pair.
+    """
+    problems, warnings = [], []
+    if num_agents != bee["num_bees"]:
+        warnings.append(f"the BEE map file has {bee['num_bees']} bees, which the engine uses instead of -k {num_agents}")
+    windows = bee["time_windows"]
+    if windows is None:
+        problems.append("the BEE map file name should contain 'parameter', which names its time window file")
+    else:
+        try:
+            with open(windows) as f:
+                count = sum(1 for line in f if line.strip())
+            if count < len(bee["flowers"]):
+                problems.append(f"{windows} has {count} time windows for {len(bee['flowers'])} flowers")
+        except OSError as e:
+            problems.append(f"the time window file cannot be read: {e}")
+    if grid is None:
+        return problems, warnings
+
+    size = bee["rows"] * bee["rows"]
+    cells = [(f"flower {i + 1}", location) for i, location in enumerate(bee["flowers"])]
+    cells += [("the entrance", bee["entrance"])]
+    cells += [(f"initial location {i + 1}", location) for i, location in enumerate(bee["initial"])]
+    outside = [f"{name}: {location + 1}" for name, location in cells if not 0 <= location < size]
+    outside += [f"remove location: {location + 1}" for location in bee["obstacles"] if not 0 <= location < size]
+    blocked = [f"{name}: {location + 1}" for name, location in cells if 0 <= location < size and not grid.free[location]]
+    if outside:
+        problems.append(_problem(f"locations outside the {grid.rows}x{grid.cols} map", outside))
+    if blocked:
+        problems.append(_problem("locations on obstacles", blocked))
+    if not outside and not blocked:
+        components = grid.components()
+        entrance = components[bee["entrance"]]
+        unreachable = [f"{name}: {location + 1}" for name, location in cells if components[location] != entrance]
+        if unreachable:
+            problems.append(_problem("locations the bees cannot reach from the entrance", unreachable))
+    return problems, warnings
+
+
+def check_bee_tasks(bee, sequences):
+    """
+    Checks the lines of a BEE task file against its map file: every line must add to an
+    existing sequence (one per initial location, plus one per earlier line of i = 0) and
+    every flower id must be one of the map's flowers.
+
+    :return: A list of problems.
+    """
+    problems = []
+    num_sequences = len(bee["initial"])
+    unknown, unreadable, bad_agents = [], [], []
+    for number, agent, ids, tokens in sequences:
+        if agent == 0:
+            num_sequences += 1
+        elif not 1 <= agent <= num_sequences:
+            bad_agents.append(f"line {number}: {agent}")
+        unknown += [f"line {number}: {i}" for i in ids if not 1 <= i <= len(bee["flowers"])]
+        unreadable += [f"line {number}: {token}" for token in tokens]
+    if bad_agents:
+        problems.append(_problem(f"task lines for sequences that do not exist (the map file has "
+                                 f"{len(bee['initial'])} initial locations)", bad_agents))
+    if unknown:
+        problems.append(_problem(f"flower ids outside 1..{len(bee['flowers'])}", unknown))
+    if unreadable:
+        problems.append(_problem("flower ids that are not integers", unreadable))
+    return problems
+
+
+def check_scen(grid, entries, map_file, num_agents):
+    """
+    Checks the entries of a .scen file against the map: its size (width = columns,
+    height = rows), and whether the starts and goals are free cells of one component.
+
+    :return: A (problems, warnings) pair.
+    """
+    problems, warnings = [], []
+    sizes = sorted({(width, height) for _, _, width, height, *_ in entries})
+    if any(size != (grid.cols, grid.rows) for size in sizes):
+        problems.append(f"the scen file is for maps of {', '.join(f'{w}x{h}' for w, h in sizes)} (width x height) "
+                        f"but {map_file} is {grid.cols}x{grid.rows}")
+    names = sorted({os.path.basename(name) for _, name, *_ in entries})
+    if names and os.path.basename(map_file) not in names:
+        warnings.append(f"the scen file refers to {', '.join(names)}, not {os.path.basename(map_file)}")
+    if len(entries) < num_agents:
+        warnings.append(f"the scen file has {len(entries)} entries for {num_agents} agents")
+
+    components = None
+    outside, blocked, unreachable = [], [], []
+    for number, _, _, _, sx, sy, gx, gy in entries:
+        cells = []
+        for x, y in ((sx, sy), (gx, gy)):
+            if not (0 <= x < grid.cols and 0 <= y < grid.rows):
+                outside.append(f"line {number}: ({x},{y})")
+            elif not grid.free[y * grid.cols + x]:
+                blocked.append(f"line {number}: ({x},{y})")
+            else:
+                cells.append(y * grid.cols + x)
+        if len(cells) == 2:
+            components = components or grid.components()
+            if components[cells[0]] != components[cells[1]]:
+                unreachable.append(f"line {number}")
+    if outside:
+        problems.append(_problem("scen starts or goals outside the map", outside))
+    if blocked:
+        problems.append(_problem("scen starts or goals on obstacles", blocked))
+    if unreachable:
+        problems.append(_problem("scen goals in another connected component than their start", unreachable))
+    return problems, warnings
+
+
+def check_inputs(map_file, num_agents, task_file=None, scen_file=None, scenario=None):
+    """
+    Checks a map, task file and scen file against each other. The engine reads the task
+    file only in the BEE scenario, where the map file is a BEE parameter file.
+
+    :param scenario: The simulation scenario, as passed to lifelong with --scenario.
+    :return: A dict with the lists of "errors" and "warnings".
+    """
+    result = {"errors": [], "warnings": []}
+    bee = None
+    try:
+        if scenario == "BEE":
+            bee = read_bee_parameters(map_file)
+        grid = load_map_cells(map_file, bee)
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        result["errors"].append(f"the map {map_file} cannot be read: {e}")
+        return result
+    if grid is None:
+        result["warnings"].append("NumPy is not installed, so the map is not checked")
+    if bee is not None:
+        problems, warnings = check_bee_map(grid, bee, num_agents)
+        result["errors"] += problems
+        result["warnings"] += warnings
+    if task_file and bee is None:
+        result["warnings"].append(f"the task file {task_file} is only read in the BEE scenario and is not checked")
+    elif task_file:
+        try:
+            result["errors"] += check_bee_tasks(bee, read_bee_tasks(task_file))
+        except (OSError, ValueError) as e:
+            result["errors"].append(f"the task file {task_file} cannot be read: {e}")
+    if scen_file and grid is not None:
+        try:
+            problems, warnings = check_scen(grid, read_scen_file(scen_file), map_file, num_agents)
+            result["errors"] += problems
+            result["warnings"] += warnings
+        except (OSError, ValueError) as e:
+            result["errors"].append(f"the scen file {scen_file} cannot be read: {e}")
+    return result
+
+
+class PreflightChecker:
+    """
+    Checks the inputs of 'lifelong' runs before they start.
+
+    Results are memoized by the hashes of the map, task and scen files and the number of
+    agents, in memory and optionally in a folder, so a sweep over solvers or seeds checks
+    its inputs once.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Initializes the PreflightChecker.
+
+        :param cache_dir: Optional folder that keeps the results between processes.
+        """
+        self.cache_dir = cache_dir
+        self._results = {}
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def hash_file(self, path):
+        """Hashes a file's contents, memoized by path, size and modification time."""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if memo_key in self._file_hashes:
+                return self._file_hashes[memo_key]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        with self._lock:
+            self._file_hashes[memo_key] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def key(self, map_file, num_agents, task_file=None, scen_file=None, scenario=None):
+        """
+        Computes the key of a set of inputs.
+
+        :return: A hex digest, or None if one of the files does not exist.
+        """
+        try:
+            parts = {"map": self.hash_file(map_file), "map_type": os.path.splitext(map_file)[1],
+                     "task": self.hash_file(task_file) if task_file else None,
+                     "scen": self.hash_file(scen_file) if scen_file else None,
+                     "map_name": os.path.basename(map_file) if scen_file else None,
+                     "num_agents": num_agents, "scenario": scenario}
+        except OSError:
+            return None
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def check(self, map_file, num_agents, task_file=None, scen_file=None, scenario=None):
+        """
+        Checks the inputs, reusing an earlier result for the same file contents.
+
+        :return: A dict with the lists of "errors" and "warnings".
+        """
+        key = self.key(map_file, num_agents, task_file, scen_file, scenario)
+        if key is None:
+            return check_inputs(map_file, num_agents, task_file, scen_file, scenario)
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+        path = os.path.join(self.cache_dir, key + ".json") if self.cache_dir else None
+        result = None
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = None
+        if result is None:
+            result = check_inputs(map_file, num_agents, task_file, scen_file, scenario)
+            if path:
+                with open(f"{path}.{os.getpid()}.tmp", 'w') as f:
+                    json.dump(result, f, indent=4)
+                os.replace(f"{path}.{os.getpid()}.tmp", path)
+        with self._lock:
+            self._results[key] = result
+        return result
+
+    def check_launcher(self, launcher):
+        """Checks the inputs of a LifelongLauncher."""
+        return self.check(launcher.map_file, launcher.num_agents, launcher.task_file, launcher.scen_file,
+                          launcher.scenario_name)
+
+
+def add_preflight_args(parser):
+    """
+    Adds the pre-flight options to an argparse parser.
+    """
+    parser.add_argument("--no_preflight", action="store_true", help="Start runs without checking their inputs first.")
+
+
+def preflight_from_args(args):
+    """
+    Builds the PreflightChecker of the options of add_preflight_args, or None if it is disabled.
+    Its results are kept next to the result cache when --cache_dir is given.
+    """
+    if args.no_preflight:
+        return None
+    cache_dir = getattr(args, "cache_dir", None)
+    return PreflightChecker(os.path.join(cache_dir, "preflight") if cache_dir else None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check a map, task file and scen file against each other.")
+    parser.add_argument("-m", "--map_file", required=True, help="Path to the map file.")
+    parser.add_argument("-k", "--num_agents", required=True, type=int, help="The number of agents.")
+    parser.add_argument("--scenario", help="The simulation scenario; task files are checked for 'BEE'.")
+    parser.add_argument("--task", dest="task_file", help="Optional task file (BEE scenario).")
+    parser.add_argument("--scen", dest="scen_file", help="Optional .scen file.")
+    args = parser.parse_args()
+
+    result = check_inputs(args.map_file, args.num_agents, args.task_file, args.scen_file, args.scenario)
+    for warning in result["warnings"]:
+        print(f"Warning: {warning}")
+    for error in result["errors"]:
+        print(f"Error: {error}")
+    print("The inputs are consistent." if not result["errors"] else f"{len(result['errors'])} problems found.")
+    raise SystemExit(1 if result["errors"] else 0)
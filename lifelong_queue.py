@@ -0,0 +1,439 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from lifelong_cache import ResultCache
+from lifelong_launcher import LifelongLauncher
+from lifelong_preflight import add_preflight_args, preflight_from_args
+from lifelong_sweep import add_base_config_args, base_config_from_args, expand_grid, parse_grid_args, run_name
+from lifelong_watchdog import add_watchdog_args, watchdog_from_args
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+
+def make_job(name, config):
+    """
+    Builds a job from a run name and its LifelongLauncher keyword arguments.
+
+    The job id combines the name with a hash of the configuration, so enqueuing the
+    same run twice does not duplicate it.
+    """
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+    return {"id": f"{name}-{digest}", "name": name, "config": config}
+
+
+class SQLiteJobQueue:
+    """
+    A job queue stored in one SQLite database. Claims are made in IMMEDIATE transactions,
+    so any number of worker processes can share the database. Use it on a local disk, or on
+    a shared filesystem whose file locking SQLite supports.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        """
+        Initializes the SQLiteJobQueue.
+
+        :param path: Path of the database file. It is created if needed.
+        :param max_attempts: Number of claims after which a job whose worker keeps dying is marked failed.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                              id TEXT PRIMARY KEY, name TEXT, config TEXT, state TEXT,
+                              attempts INTEGER DEFAULT 0, worker TEXT, heartbeat REAL,
+                              result TEXT, created REAL, finished REAL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Transaction(db)
+
+    def enqueue(self, jobs):
+        """
+        Adds jobs to the queue. Jobs that are already queued are skipped.
+
+        :return: The number of jobs added.
+        """
+        added = 0
+        with self._connect() as db:
+            for job in jobs:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO jobs (id, name, config, state, created) VALUES (?, ?, ?, ?, ?)",
+                    (job["id"], job["name"], json.dumps(job["config"]), PENDING, time.time()))
+                added += cursor.rowcount
+        return added
+
+    def claim(self, worker):
+        """
+        Claims the oldest pending job for a worker.
+
+        :return: The job dict, or None if no job is pending.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE state = ? ORDER BY created, id LIMIT 1", (PENDING,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET state = ?, worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ?",
+                       (RUNNING, worker, time.time(), row["id"]))
+        return {"id": row["id"], "name": row["name"], "config": json.loads(row["config"]),
+                "attempts": row["attempts"] + 1}
+
+    def heartbeat(self, job_id, worker):
+        """
+        Records that a worker is still running a job.
+
+        :return: False if the job is no longer owned by the worker (it was requeued).
+        """
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND state = ? AND worker = ?",
+                                (time.time(), job_id, RUNNING, worker))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        """
+        Marks a job as done with the run status as its result.
+
+        :return: False if the job is no longer owned by the worker.
+        """
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET state = ?, result = ?, finished = ? WHERE id = ? AND state = ? AND worker = ?",
+                                (DONE, result, time.time(), job_id, RUNNING, worker))
+            return cursor.rowcount == 1
+
+    def requeue_stale(self, stale_after):
+        """
+        Puts running jobs whose worker has not sent a heartbeat for stale_after seconds back
+        in the queue, or marks them failed once they have used up max_attempts.
+
+        :return: The number of requeued jobs.
+        """
+        cutoff = time.time() - stale_after
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET state = ?, result = ?, finished = ? WHERE state = ? AND heartbeat < ? AND attempts >= ?",
+                       (DONE, "failed: worker lost", time.time(), RUNNING, cutoff, self.max_attempts))
+            cursor = db.execute("UPDATE jobs SET state = ?, worker = NULL WHERE state = ? AND heartbeat < ?",
+                                (PENDING, RUNNING, cutoff))
+            return cursor.rowcount
+
+    def counts(self):
+        """
+        Counts the jobs by state, and the done jobs by result.
+
+        :return: A dict such as {"pending": 3, "running": 2, "done: finished": 10}.
+        """
+        counts = {}
+        with self._connect() as db:
+            for row in db.execute("SELECT state, result, COUNT(*) AS n FROM jobs GROUP BY state, result"):
+                key = row["state"] if row["state"] != DONE else f"{DONE}: {row['result']}"
+                counts[key] = counts.get(key, 0) + row["n"]
+        return counts
+
+
+class _Transaction:
+    """Runs the statements of a with-block in one IMMEDIATE transaction and closes the connection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+
+class DirectoryJobQueue:
+    """
+    A job queue stored as JSON files in pending/, running/ and done/ subfolders of a
+    directory on a shared filesystem.
+
+    A worker claims a job by renaming its file from pending/ to running/. Renames are
+    atomic, so exactly one worker wins each job, without a broker or a lock server.
+    Heartbeats touch the job's file in running/. Staleness is judged by the file's change
+    time, which the claiming rename updates too, so a freshly claimed job is never stale.
+    """
+
+    def __init__(self, root, max_attempts=3):
+        """
+        Initializes the DirectoryJobQueue.
+
+        :param root: The queue directory. It is created if needed.
+        :param max_attempts: Number of claims after which a job whose worker keeps dying is marked failed.
+        """
+        self.root = root
+        self.max_attempts = max_attempts
+        for state in (PENDING, RUNNING, DONE):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def _path(self, state, job_id):
+        return os.path.join(self.root, state, job_id + ".json")
+
+    def _write(self, path, job):
+        # Write to a temporary name in the same folder and rename, so readers never see partial files.
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(job, f, indent=4)
+        os.replace(temporary, path)
+
+    def _read(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def _ids(self, state):
+        folder = os.path.join(self.root, state)
+        return sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".json"))
+
+    def enqueue(self, jobs):
+        added = 0
+        for job in jobs:
+            if any(os.path.exists(self._path(state, job["id"])) for state in (PENDING, RUNNING, DONE)):
+                continue
+            self._write(self._path(PENDING, job["id"]), dict(job, attempts=0, created=time.time()))
+            added += 1
+        return added
+
+    def claim(self, worker):
+        for job_id in self._ids(PENDING):
+            running = self._path(RUNNING, job_id)
+            try:
+                os.rename(self._path(PENDING, job_id), running)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+            job = self._read(running)
+            job.update(worker=worker, attempts=job.get("attempts", 0) + 1)
+            self._write(running, job)
+            return job
+        return None
+
+    def heartbeat(self, job_id, worker):
+        path = self._path(RUNNING, job_id)
+        try:
+            if self._read(path).get("worker") != worker:
+                return False
+            os.utime(path)
+            return True
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def complete(self, job_id, worker, result):
+        path = self._path(RUNNING, job_id)
+        # Claim the completion by renaming the file out of running/, so a concurrent
+        # requeue_stale cannot move the job back to pending/ while the result is written.
+        finished = f"{path}.{uuid.uuid4().hex}.done"
+        try:
+            os.rename(path, finished)
+        except FileNotFoundError:
+            return False
+        try:
+            job = self._read(finished)
+        except ValueError:
+            os.rename(finished, path)
+            return False
+        if job.get("worker") != worker:
+            # The job was requeued and claimed by another worker; hand it back.
+            os.rename(finished, path)
+            return False
+        job.update(result=result, finished=time.time())
+        self._write(self._path(DONE, job_id), job)
+        os.remove(finished)
+        return True
+
+    def requeue_stale(self, stale_after):
+        cutoff = time.time() - stale_after
+        requeued = 0
+        for job_id in self._ids(RUNNING):
+            path = self._path(RUNNING, job_id)
+            try:
+                if os.stat(path).st_ctime >= cutoff:
+                    continue
+                job = self._read(path)
+            except (FileNotFoundError, ValueError):
+                continue
+            # Move the file out of running/ first, so only one worker handles the stale job.
+            stale = f"{path}.{uuid.uuid4().hex}.stale"
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                continue
+            job.pop("worker", None)
+            if job.get("attempts", 0) >= self.max_attempts:
+                job.update(result="failed: worker lost", finished=time.time())
+                self._write(self._path(DONE, job_id), job)
+            else:
+                self._write(self._path(PENDING, job_id), job)
+                requeued += 1
+            os.remove(stale)
+        return requeued
+
+    def counts(self):
+        counts = {PENDING: len(self._ids(PENDING)), RUNNING: len(self._ids(RUNNING))}
+        for job_id in self._ids(DONE):
+            try:
+                key = f"{DONE}: {self._read(self._path(DONE, job_id)).get('result')}"
+            except (FileNotFoundError, ValueError):
+                continue
+            counts[key] = counts.get(key, 0) + 1
+        return {key: n for key, n in counts.items() if n}
+
+
+def open_queue(location, max_attempts=3):
+    """
+    Opens a job queue: a SQLite database for paths ending in .db or .sqlite, a directory otherwise.
+    """
+    if location.endswith((".db", ".sqlite")):
+        return SQLiteJobQueue(location, max_attempts)
+    return DirectoryJobQueue(location, max_attempts)
+
+
+class QueueWorker:
+    """
+    Claims jobs from a queue and runs them with LifelongLauncher, one at a time,
+    sending heartbeats while a job is running.
+    """
+
+    def __init__(self, queue, worker_id=None, heartbeat_interval=30, stale_after=300, timeout=None,
+                 cache=None, watchdog=None, preflight=None):
+        """
+        Initializes the QueueWorker.
+
+        :param queue: A SQLiteJobQueue or DirectoryJobQueue.
+        :param worker_id: Unique name of the worker (default: host name, process id and a random suffix).
+        :param heartbeat_interval: Seconds between heartbeats.
+        :param stale_after: Seconds without heartbeat after which another worker's job is requeued.
+        :param timeout: Optional wall-clock limit in seconds for each run.
+        :param cache: Optional ResultCache used by every run.
+        :param watchdog: Optional Watchdog applied to every run.
+        :param preflight: Optional PreflightChecker; jobs whose inputs are inconsistent are not started.
+        """
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.timeout = timeout
+        self.cache = cache
+        self.watchdog = watchdog
+        self.preflight = preflight
+
+    def run_job(self, job):
+        """Runs one claimed job while a background thread sends heartbeats. Returns the run status."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat_interval):
+                if not self.queue.heartbeat(job["id"], self.worker_id):
+                    print(f"Warning: job '{job['id']}' was requeued while {self.worker_id} was running it.")
+                    return
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+        try:
+            launcher = LifelongLauncher(cache=self.cache, watchdog=self.watchdog, preflight=self.preflight,
+                                        **job["config"])
+            os.makedirs(launcher.output_folder, exist_ok=True)
+            return launcher.run_simulation(timeout=self.timeout,
+                                           log_path=os.path.join(launcher.output_folder, "lifelong.log"))
+        except Exception as e:
+            print(f"Error: job '{job['id']}' could not be run: {e}")
+            return "failed"
+        finally:
+            stop.set()
+            heart.join()
+
+    def run(self, wait=False, poll_interval=10):
+        """
+        Processes jobs until the queue is empty.
+
+        :param wait: Keep polling for new jobs instead of exiting when none is pending,
+                     as long as other workers still have jobs running.
+        :param poll_interval: Seconds between polls while waiting.
+        :return: The number of jobs this worker ran.
+        """
+        ran = 0
+        while True:
+            self.queue.requeue_stale(self.stale_after)
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if wait and self.queue.counts().get(RUNNING):
+                    time.sleep(poll_interval)
+                    continue
+                return ran
+            print(f"[{self.worker_id}] running job '{job['id']}' (attempt {job.get('attempts', 1)})")
+            status = self.run_job(job)
+            if not self.queue.complete(job["id"], self.worker_id, status):
+                print(f"Warning: job '{job['id']}' was requeued before {self.worker_id} finished it.")
+            print(f"[{self.worker_id}] job '{job['id']}': {status}")
+            ran += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Queue 'lifelong' runs and process them with workers on any number of hosts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add the runs of a parameter grid to a queue.")
+    enqueue.add_argument("--queue", required=True, help="Queue location: a .db/.sqlite file or a directory.")
+    add_base_config_args(enqueue)
+    enqueue.add_argument("--grid", action="append", default=[],
+                         help="A swept parameter as name=v1,v2,... using LifelongLauncher names. May be repeated.")
+
+    worker = commands.add_parser("worker", help="Process jobs from a queue.")
+    worker.add_argument("--queue", required=True, help="Queue location: a .db/.sqlite file or a directory.")
+    worker.add_argument("-n", "--workers", type=int, default=1, help="Number of workers to start in this process (default: 1).")
+    worker.add_argument("--heartbeat", type=float, default=30, help="Seconds between heartbeats (default: 30).")
+    worker.add_argument("--stale_after", type=float, default=300,
+                        help="Seconds without heartbeat after which a job is requeued (default: 300).")
+    worker.add_argument("--max_attempts", type=int, default=3, help="Claims before a job whose worker keeps dying is marked failed.")
+    worker.add_argument("--wait", action="store_true", help="Keep waiting while other workers still have jobs running.")
+    worker.add_argument("--timeout", type=float, default=None, help="Wall-clock limit in seconds for each run.")
+    worker.add_argument("--cache_dir", help="Optional folder of a result cache.")
+    worker.add_argument("--cache_size_gb", type=float, default=10.0, help="Size cap of the result cache in GB.")
+    add_watchdog_args(worker)
+    add_preflight_args(worker)
+
+    status = commands.add_parser("status", help="Show the number of jobs by state.")
+    status.add_argument("--queue", required=True, help="Queue location: a .db/.sqlite file or a directory.")
+
+    args, unknown = parser.parse_known_args()
+
+    if args.command == "enqueue":
+        base_config = base_config_from_args(args, unknown)
+        jobs = []
+        for params in expand_grid(parse_grid_args(args.grid)):
+            name = run_name(params)
+            config = dict(base_config, **params)
+            config["output_folder"] = os.path.join(args.output_root, name)
+            jobs.append(make_job(name, config))
+        added = open_queue(args.queue).enqueue(jobs)
+        print(f"Enqueued {added} of {len(jobs)} runs in '{args.queue}'.")
+
+    elif args.command == "worker":
+        queue = open_queue(args.queue, args.max_attempts)
+        cache = ResultCache(args.cache_dir, int(args.cache_size_gb * 1024 ** 3)) if args.cache_dir else None
+        preflight = preflight_from_args(args)
+        workers = [QueueWorker(queue, heartbeat_interval=args.heartbeat, stale_after=args.stale_after,
+                               timeout=args.timeout, cache=cache, watchdog=watchdog_from_args(args),
+                               preflight=preflight)
+                   for _ in range(args.workers)]
+        threads = [threading.Thread(target=w.run, kwargs={"wait": args.wait}) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"Queue '{args.queue}': {queue.counts()}")
+
+    else:
+        for key, n in sorted(open_queue(args.queue).counts().items()):
+            print(f"{key}: {n}")
@@ -0,0 +1,176 @@
+import json
+import os
+import platform
+import sys
+import time
+
+MANIFEST_FILE = "run_manifest.json"
+
+
+def read_proc_status(pid):
+    """
+    Reads the memory and context-switch counters of a process from /proc/<pid>/status.
+
+    :return: A dict of the counters found (sizes in bytes), empty if /proc is not available.
+    """
+    fields = {"VmHWM": "peak_rss_bytes", "VmRSS": "rss_bytes",
+              "voluntary_ctxt_switches": "voluntary_ctx_switches",
+              "nonvoluntary_ctxt_switches": "involuntary_ctx_switches"}
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in fields:
+                    parts = rest.split()
+                    value = int(parts[0])
+                    if len(parts) > 1 and parts[1] == "kB":
+                        value *= 1024
+                    values[fields[name]] = value
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def read_proc_io(pid):
+    """
+    Reads the I/O counters of a process from /proc/<pid>/io.
+
+    :return: A dict with rchar, wchar, read_bytes and write_bytes, empty if not available.
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ("rchar", "wchar", "read_bytes", "write_bytes"):
+                    values[name] = int(rest)
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+class ResourceMonitor:
+    """
+    Waits for a 'lifelong' child process while sampling its resource usage.
+
+    On Linux, /proc/<pid> is sampled while the engine runs and once more after it exits
+    but before it is reaped, so the I/O totals include the final writes of the result files.
+    The exact CPU times, peak RSS and context switches of the child come from os.wait4.
+    """
+
+    def __init__(self, process, interval=0.5):
+        """
+        Initializes the ResourceMonitor.
+
+        :param process: The subprocess.Popen object of the engine.
+        :param interval: Sampling period in seconds.
+        """
+        self.process = process
+        self.interval = interval
+        self.usage = {}
+        self.samples = 0
+
+    def sample(self):
+        """Takes one sample of /proc/<pid> and merges it into the usage record."""
+        status = read_proc_status(self.process.pid)
+        if "peak_rss_bytes" in status:
+            self.usage["peak_rss_bytes"] = max(status["peak_rss_bytes"], self.usage.get("peak_rss_bytes", 0))
+        for name in ("voluntary_ctx_switches", "involuntary_ctx_switches"):
+            if name in status:
+                self.usage[name] = status[name]
+        self.usage.update(read_proc_io(self.process.pid))
+        self.samples += 1
+
+    def _exited(self):
+        """Checks whether the child has exited, without reaping it where the platform allows."""
+        if hasattr(os, "waitid"):
+            try:
+                return os.waitid(os.P_PID, self.process.pid, os.WEXITED | os.WNOWAIT | os.WNOHANG) is not None
+            except ChildProcessError:
+                return True
+        return self.process.poll() is not None
+
+    def _reap(self):
+        """Reaps the child and records its rusage. Returns the exit code."""
+        if self.process.returncode is not None:
+            return self.process.returncode
+        if not hasattr(os, "wait4"):
+            return self.process.wait()
+
+        _, wait_status, rusage = os.wait4(self.process.pid, 0)
+        if os.WIFSIGNALED(wait_status):
+            returncode = -os.WTERMSIG(wait_status)
+        else:
+            returncode = os.WEXITSTATUS(wait_status)
+        self.process.returncode = returncode  # keep the Popen object consistent
+
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        maxrss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+        self.usage["peak_rss_bytes"] = max(maxrss, self.usage.get("peak_rss_bytes", 0))
+        self.usage["user_time"] = rusage.ru_utime
+        self.usage["sys_time"] = rusage.ru_stime
+        self.usage["voluntary_ctx_switches"] = rusage.ru_nvcsw
+        self.usage["involuntary_ctx_switches"] = rusage.ru_nivcsw
+        self.usage["block_input_ops"] = rusage.ru_inblock
+        self.usage["block_output_ops"] = rusage.ru_oublock
+        return returncode
+
+    def wait(self, timeout=None, check=None):
+        """
+        Waits for the engine to exit, sampling every interval seconds.
+
+        :param timeout: Optional wall-clock limit in seconds. The engine is killed when it is exceeded.
+        :param check: Optional callable polled with each sample. When it returns a non-empty
+                      reason, the engine is killed.
+        :return: A (returncode, reason) pair. reason is None for a normal exit, "timeout"
+                 or the value returned by check otherwise.
+        """
+        start = time.time()
+        reason = None
+        delay = min(0.05, self.interval)  # poll quickly at first, so short runs are not held back
+        while not self._exited():
+            self.sample()
+            if timeout is not None and time.time() - start > timeout:
+                reason = "timeout"
+                self.process.kill()
+                break
+            reason = check() if check is not None else None
+            if reason:
+                self.process.kill()
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, self.interval)
+        else:
+            self.sample()  # the exited child is still readable until it is reaped
+        returncode = self._reap()
+        self.usage["wall_time"] = round(time.time() - start, 3)
+        return returncode, reason
+
+
+def write_manifest(output_folder, command, status, returncode=None, usage=None, started=None, reason=None):
+    """
+    Writes run_manifest.json next to the engine's config.txt.
+
+    :param output_folder: The run's output folder.
+    :param command: The argument vector the engine was started with.
+    :param status: The run status reported by the launcher.
+    :param returncode: The engine's exit code, if it ran.
+    :param usage: The resource usage recorded by ResourceMonitor, if it ran.
+    :param started: Start time of the run as a Unix timestamp.
+    :param reason: Optional explanation of why the run was stopped.
+    :return: The path of the manifest.
+    """
+    manifest = {
+        "command": command,
+        "status": status,
+        "returncode": returncode,
+        "reason": reason,
+        "started": started,
+        "host": platform.node(),
+        "resources": usage or {},
+    }
+    path = os.path.join(output_folder, MANIFEST_FILE)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return path
@@ -0,0 +1,123 @@
+import os
+
+# Files the engine leaves behind for a run. paths.txt and tasks.txt are written as
+# "<output>\paths.txt", which on Linux ends up next to the output folder rather than in it.
+RESULT_FILES = ["config.txt", "solver.csv", "paths.txt", "tasks.txt"]
+
+
+def find_result_files(output_folder):
+    """
+    Locates the result files of a finished run, in either of the layouts the engine produces.
+
+    :param output_folder: The run's output folder.
+    :return: A dict mapping result file names to their paths on disk.
+    """
+    found = {}
+    for name in RESULT_FILES:
+        for path in (os.path.join(output_folder, name), os.path.normpath(output_folder) + "\\" + name):
+            if os.path.isfile(path):
+                found[name] = path
+                break
+    return found
+
+
+def read_config(path):
+    """
+    Reads the engine's config.txt ("map: maps/kiva", "#drives: 100", ...).
+
+    :return: A dict of the settings, with numeric values converted to int or float.
+    """
+    config = {}
+    with open(path) as f:
+        for line in f:
+            name, sep, value = line.partition(':')
+            if not sep:
+                continue
+            value = value.strip()
+            for cast in (int, float):
+                try:
+                    value = cast(value)
+                    break
+                except ValueError:
+                    pass
+            config[name.strip()] = value
+    return config
+
+
+def read_window_runtimes(path):
+    """
+    Reads the runtime of every replanning call from solver.csv (its first column).
+
+    :return: A list of runtimes in seconds, in file order.
+    """
+    runtimes = []
+    with open(path) as f:
+        for line in f:
+            field = line.split(',', 1)[0].strip()
+            if field:
+                try:
+                    runtimes.append(float(field))
+                except ValueError:
+                    pass
+    return runtimes
+
+
+def count_finished_tasks(path):
+    """
+    Counts the tasks finished during a run from tasks.txt.
+
+    Each agent line lists "location,time,distance;" records. The first record is the start
+    location at time 0, finished tasks have a positive time and unfinished ones have -1.
+    """
+    finished = 0
+    with open(path) as f:
+        f.readline()  # number of agents
+        for line in f:
+            for record in line.strip().split(';'):
+                fields = record.split(',')
+                if len(fields) >= 2 and fields[1].strip().lstrip('-').isdigit() and int(fields[1]) > 0:
+                    finished += 1
+    return finished
+
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of values with linear interpolation, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def run_metrics(output_folder, simulation_time=None):
+    """
+    Summarizes one finished run from its output folder.
+
+    :param output_folder: The run's output folder.
+    :param simulation_time: Simulation length used for the throughput. Defaults to the value in config.txt.
+    :return: A dict with the number of replanning calls, their mean, p95 and max runtime,
+             the number of finished tasks and the throughput in tasks per timestep.
+             Metrics whose files are missing are None.
+    """
+    files = find_result_files(output_folder)
+    metrics = {"windows": 0, "runtime_mean": None, "runtime_p95": None, "runtime_max": None,
+               "finished_tasks": None, "throughput": None}
+
+    if simulation_time is None and "config.txt" in files:
+        simulation_time = read_config(files["config.txt"]).get("simulation_time")
+
+    if "solver.csv" in files:
+        runtimes = read_window_runtimes(files["solver.csv"])
+        if runtimes:
+            metrics["windows"] = len(runtimes)
+            metrics["runtime_mean"] = sum(runtimes) / len(runtimes)
+            metrics["runtime_p95"] = percentile(runtimes, 95)
+            metrics["runtime_max"] = max(runtimes)
+
+    if "tasks.txt" in files:
+        metrics["finished_tasks"] = count_finished_tasks(files["tasks.txt"])
+        if simulation_time:
+            metrics["throughput"] = metrics["finished_tasks"] / simulation_time
+    return metrics
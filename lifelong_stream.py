@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import re
+import time
+
+from lifelong_launcher import LifelongLauncher
+
+# Lines printed by the 'lifelong' engine, mapped to structured events.
+# Each pattern's named groups become fields of the event; numeric fields are converted below.
+EVENT_PATTERNS = [
+    ("loading_map", re.compile(r"^\*\*\* Loading map \*\*\*$")),
+    ("map_size", re.compile(r"^Map size: (?P<rows>\d+)x(?P<cols>\d+)(?: with (?P<details>.*))?$")),
+    ("preprocessing", re.compile(r"^\*\*\* PreProcessing map \*\*\*$")),
+    ("generating_instance", re.compile(r"^\*\*\* Generating instance (?P<seed>-?\d+) \*\*\*$")),
+    ("reading_instance", re.compile(r"^\*\*\* Reading instance (?P<file>.+) \*\*\*$")),
+    ("simulating", re.compile(r"^\*\*\* Simulating (?P<seed>-?\d+) \*\*\*$")),
+    ("timestep", re.compile(r"^Timestep (?P<timestep>\d+)$")),
+    ("tasks_finished", re.compile(r"^(?P<count>\d+) tasks has been finished$")),
+    ("replan", re.compile(r"^(?P<solver>PBS|ECBS|WHCA\*|LRA\*):(?P<outcome>Succeed|Timeout|No solutions|Nodesout),"
+                          r"(?P<runtime>[-+.\deE]+)")),
+    ("collision", re.compile(r"^Agents (?P<agent1>\d+) and (?P<agent2>\d+) collides at "
+                             r"\(?(?P<loc1>-?\d+)(?:-->(?P<loc2>-?\d+)\))? at timestep (?P<timestep>-?\d+)$")),
+    ("jump", re.compile(r"^Drive (?P<agent>\d+) jump from (?P<prev>[-\d,]+) to (?P<curr>[-\d,]+)$")),
+    ("invalid_rotation", re.compile(r"^Drive (?P<agent>\d+) rotates (?P<kind>180 degrees|while moving) "
+                                    r"from (?P<prev>[-\d,]+) to (?P<curr>[-\d,]+)$")),
+    ("conflict", re.compile(r"^Drive (?P<agent1>\d+) at (?P<state1>[-\d,]+) has a conflict with drive "
+                            r"(?P<agent2>\d+) at (?P<state2>[-\d,]+)$")),
+    ("congestion", re.compile(r"^\*+ Too many traffic jams \*+$")),
+    ("saving", re.compile(r"^\*\*\* Saving (?P<seed>-?\d+) \*\*\*$")),
+    ("done", re.compile(r"^Done!(?: \((?P<runtime>[-+.\deE]+) ?s\))?$")),
+]
+
+INT_FIELDS = {"rows", "cols", "seed", "timestep", "count", "agent", "agent1", "agent2", "loc1", "loc2"}
+FLOAT_FIELDS = {"runtime"}
+
+
+def parse_line(line):
+    """
+    Turns one line of 'lifelong' output into a structured event.
+
+    :param line: A line of engine output, without the trailing newline.
+    :return: A dict with an "event" kind and the fields extracted from the line,
+             or None for blank lines. Unrecognized lines become "output" events.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    for kind, pattern in EVENT_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            event = {"event": kind}
+            for name, value in match.groupdict().items():
+                if value is None:
+                    continue
+                if name in INT_FIELDS:
+                    value = int(value)
+                elif name in FLOAT_FIELDS:
+                    value = float(value)
+                event[name] = value
+            return event
+    return {"event": "output", "text": line}
+
+
+async def _emit(on_event, event):
+    result = on_event(event)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def _pump(stream, name, run, started, on_event, events_file):
+    """Reads one pipe line by line and dispatches the parsed events."""
+    while True:
+        raw = await stream.readline()
+        if not raw:
+            break
+        event = parse_line(raw.decode(errors='replace'))
+        if event is None:
+            continue
+        event["run"] = run
+        event["stream"] = name
+        event["elapsed"] = round(time.monotonic() - started, 3)
+        if events_file:
+            events_file.write(json.dumps(event) + "\n")
+            events_file.flush()
+        if on_event:
+            await _emit(on_event, event)
+
+
+async def stream_simulation(launcher, on_event=None, events_path=None, run=None, timeout=None):
+    """
+    Runs the 'lifelong' engine of a LifelongLauncher as an asyncio subprocess and turns its
+    stdout and stderr into events as the lines arrive. Both pipes are drained continuously,
+    so the engine never stalls on a full pipe.
+
+    :param launcher: The configured LifelongLauncher.
+    :param on_event: Optional callback (plain function or coroutine function) called with each event dict.
+    :param events_path: Optional JSONL file that receives one event per line.
+    :param run: Name attached to every event (default: the launcher's output folder).
+    :param timeout: Optional wall-clock limit in seconds. The engine is killed when it is exceeded.
+    :return: The run status, one of "finished", "failed" or "timeout".
+    """
+    run = run or launcher.output_folder
+    os.makedirs(launcher.output_folder, exist_ok=True)
+    events_file = open(events_path, 'w') if events_path else None
+    started = time.monotonic()
+    status = "failed"
+    try:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *launcher.build_command(),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            print(f"Error: The executable was not found at '{launcher.lifelong_path}'")
+            return status
+
+        pumps = asyncio.gather(
+            _pump(process.stdout, "stdout", run, started, on_event, events_file),
+            _pump(process.stderr, "stderr", run, started, on_event, events_file))
+        try:
+            await asyncio.wait_for(asyncio.shield(pumps), timeout)
+            returncode = await process.wait()
+            status = "finished" if returncode == 0 else "failed"
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            await pumps
+            status = "timeout"
+        except BaseException:
+            # A failing callback or a cancelled task must not leave the engine running.
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+        final = {"event": "exit", "run": run, "status": status, "returncode": process.returncode,
+                 "elapsed": round(time.monotonic() - started, 3)}
+        if events_file:
+            events_file.write(json.dumps(final) + "\n")
+        if on_event:
+            await _emit(on_event, final)
+        return status
+    finally:
+        if events_file:
+            events_file.close()
+
+
+async def stream_many(launchers, on_event=None, max_concurrent=None, timeout=None):
+    """
+    Streams several simulations from one event loop. Each run writes its events to
+    events.jsonl in its own output folder and also passes them to on_event.
+
+    :param launchers: A dict mapping run names to LifelongLauncher objects.
+    :param on_event: Optional callback shared by all runs; events carry their run name.
+    :param max_concurrent: Maximum number of engines running at once (default: all).
+    :param timeout: Optional wall-clock limit in seconds for each run.
+    :return: A dict mapping run names to run statuses.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent or len(launchers) or 1)
+
+    async def run_one(name, launcher):
+        async with semaphore:
+            return await stream_simulation(
+                launcher, on_event=on_event, run=name, timeout=timeout,
+                events_path=os.path.join(launcher.output_folder, "events.jsonl"))
+
+    names = list(launchers.keys())
+    statuses = await asyncio.gather(*(run_one(name, launchers[name]) for name in names))
+    return dict(zip(names, statuses))
+
+
+def print_event(event):
+    """Default console callback: prints the structured events, skipping plain output lines."""
+    if event["event"] == "output":
+        return
+    fields = ", ".join(f"{k}={v}" for k, v in event.items() if k not in ("event", "run", "stream", "elapsed"))
+    print(f"[{event['elapsed']:9.3f}s] {event['event']}" + (f": {fields}" if fields else ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Launch the 'lifelong' MAPF simulation engine and stream its output as events.")
+
+    parser.add_argument("lifelong_path", help="Path to the compiled 'lifelong' executable.")
+    parser.add_argument("-m", "--map_file", required=True, help="Path to the map file.")
+    parser.add_argument("-o", "--output_folder", required=True, help="Path to the folder for output files.")
+    parser.add_argument("-k", "--num_agents", required=True, type=int, help="The number of agents to simulate.")
+    parser.add_argument("--scenario", required=True, help="The simulation scenario name (e.g., 'SORTING').")
+    parser.add_argument("--solver", required=True, help="The solver to use (e.g., 'PBS').")
+    parser.add_argument("--simulation_time", type=int, default=5000, help="Total simulation time.")
+    parser.add_argument("--simulation_window", type=int, default=5, help="Replanning period (h).")
+    parser.add_argument("--planning_window", type=int, default=100, help="Planning window (w).")
+    parser.add_argument("--task", dest="task_file", help="Optional path to a pre-generated task file.")
+    parser.add_argument("-d", "--seed", type=int, default=0, help="The random seed.")
+    parser.add_argument("--suboptimal_bound", dest="suboptimality", type=float, default=1.1, help="The suboptimality factor for the solver.")
+    parser.add_argument("--events", help="JSONL file for the events (default: events.jsonl in the output folder).")
+    parser.add_argument("--timeout", type=float, default=None, help="Wall-clock limit in seconds.")
+
+    args, unknown = parser.parse_known_args()
+
+    launcher = LifelongLauncher(
+        lifelong_path=args.lifelong_path,
+        map_file=args.map_file,
+        output_folder=args.output_folder,
+        num_agents=args.num_agents,
+        scenario_name=args.scenario,
+        solver=args.solver,
+        simulation_time=args.simulation_time,
+        simulation_window=args.simulation_window,
+        planning_window=args.planning_window,
+        task_file=args.task_file,
+        seed=args.seed,
+        suboptimality=args.suboptimality,
+        extra_args=unknown
+    )
+
+    events_path = args.events or os.path.join(args.output_folder, "events.jsonl")
+    status = asyncio.run(stream_simulation(launcher, on_event=print_event,
+                                           events_path=events_path, timeout=args.timeout))
+    print(f"\nSimulation {status}. Events saved to '{events_path}'.")
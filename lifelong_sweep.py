@@ -0,0 +1,263 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from lifelong_cache import ResultCache
+from lifelong_launcher import LifelongLauncher
+from lifelong_preflight import add_preflight_args, preflight_from_args
+from lifelong_watchdog import add_watchdog_args, watchdog_from_args
+
+
+def parse_value(text):
+    """
+    Converts a command-line value to int or float when possible.
+
+    :param text: The raw string value.
+    :return: An int, a float or the original string.
+    """
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def expand_grid(grid):
+    """
+    Expands a parameter grid into the list of all its combinations.
+
+    :param grid: A dict mapping LifelongLauncher keyword names to lists of values.
+    :return: A list of dicts, one per combination, in a stable order.
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_name(params):
+    """
+    Builds a folder-safe name for one combination of parameters, e.g. "num_agents=100_seed=0".
+    """
+    return "_".join(f"{name}={value}" for name, value in params.items())
+
+
+class LifelongSweep:
+    """
+    Runs a grid of 'lifelong' configurations through a bounded pool of
+    concurrent engine processes. Every run gets its own output folder under
+    output_root, and a summary of all runs is written to sweep_summary.csv.
+    """
+    SUMMARY_FILE = "sweep_summary.csv"
+
+    def __init__(self, base_config, grid, output_root, max_workers=None, timeout=None, cache=None,
+                 watchdog=None, preflight=None):
+        """
+        Initializes the LifelongSweep.
+
+        :param base_config: LifelongLauncher keyword arguments shared by every run (without output_folder).
+        :param grid: A dict mapping LifelongLauncher keyword names to lists of values to sweep over,
+                     or an explicit list of parameter dicts, one per run.
+        :param output_root: Folder that receives one subfolder per run and the sweep summary.
+        :param max_workers: Maximum number of 'lifelong' processes running at once (default: CPU count).
+        :param timeout: Optional wall-clock limit in seconds for each run.
+        :param cache: Optional ResultCache shared by all runs, so that a restarted sweep
+                      only runs the configurations that are missing from it.
+        :param watchdog: Optional Watchdog applied to every run.
+        :param preflight: Optional PreflightChecker shared by all runs, so that inputs used by
+                          several runs are checked once.
+        """
+        self.base_config = dict(base_config)
+        self.grid = grid
+        self.output_root = output_root
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cache = cache
+        self.watchdog = watchdog
+        self.preflight = preflight
+
+    def runs(self):
+        """
+        Lists the runs of the sweep.
+
+        :return: A list of (name, params) pairs.
+        """
+        combinations = expand_grid(self.grid) if isinstance(self.grid, dict) else self.grid
+        return [(run_name(params), params) for params in combinations]
+
+    def make_launcher(self, name, params):
+        """
+        Creates the LifelongLauncher for one run of the sweep.
+        """
+        config = dict(self.base_config)
+        config.update(params)
+        config["output_folder"] = os.path.join(self.output_root, name)
+        config["cache"] = self.cache
+        config["watchdog"] = self.watchdog
+        config["preflight"] = self.preflight
+        return LifelongLauncher(**config)
+
+    def run_one(self, name, params):
+        """
+        Runs one configuration and records its outcome.
+
+        :return: A dict with the run name, its parameters, status, wall time and output folder.
+        """
+        launcher = self.make_launcher(name, params)
+        os.makedirs(launcher.output_folder, exist_ok=True)
+        start = time.time()
+        status = launcher.run_simulation(timeout=self.timeout,
+                                         log_path=os.path.join(launcher.output_folder, "lifelong.log"))
+        record = {"run": name, "status": status, "wall_time": round(time.time() - start, 3),
+                  "output_folder": launcher.output_folder}
+        record.update(params)
+        return record
+
+    def run(self):
+        """
+        Runs every configuration of the grid, at most max_workers at a time.
+        A failing or timed-out run does not stop the others.
+
+        :return: The list of run records, in grid order.
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        runs = self.runs()
+        print(f"--- Sweeping {len(runs)} runs with up to {self.max_workers} concurrent processes ---")
+
+        records = {}
+        # Each worker thread only waits on its own 'lifelong' child process,
+        # so the actual parallelism comes from the engine processes.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.run_one, name, params): name for name, params in runs}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    records[name] = future.result()
+                except Exception as e:
+                    print(f"Error: run '{name}' could not be launched: {e}")
+                    records[name] = {"run": name, "status": "failed", "wall_time": 0.0,
+                                     "output_folder": os.path.join(self.output_root, name)}
+                print(f"[{len(records)}/{len(runs)}] {name}: {records[name]['status']}")
+
+        ordered = [records[name] for name, _ in runs]
+        self.write_summary(ordered)
+        return ordered
+
+    def write_summary(self, records):
+        """
+        Writes the run records to sweep_summary.csv in output_root.
+        """
+        fields = ["run", "status", "wall_time", "output_folder"]
+        for _, params in self.runs():
+            fields += [name for name in params if name not in fields]
+        path = os.path.join(self.output_root, self.SUMMARY_FILE)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+
+        counts = {}
+        for record in records:
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        print(f"Sweep summary written to {path}: " +
+              ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+
+
+def parse_grid_args(items):
+    """
+    Parses repeated "--grid name=v1,v2,..." arguments into a grid dict.
+    """
+    grid = {}
+    for item in items:
+        if '=' not in item:
+            raise ValueError(f"Grid entry '{item}' should look like name=v1,v2,...")
+        name, values = item.split('=', 1)
+        grid[name.strip()] = [parse_value(v.strip()) for v in values.split(',') if v.strip()]
+    return grid
+
+
+def add_base_config_args(parser):
+    """
+    Adds the LifelongLauncher options shared by all runs of a sweep to an argparse parser.
+    """
+    parser.add_argument("lifelong_path", help="Path to the compiled 'lifelong' executable.")
+    parser.add_argument("-m", "--map_file", required=True, help="Path to the map file.")
+    parser.add_argument("-o", "--output_root", required=True, help="Folder that receives one subfolder per run.")
+    parser.add_argument("-k", "--num_agents", type=int, default=100, help="The number of agents, unless swept.")
+    parser.add_argument("--scenario", required=True, help="The simulation scenario name (e.g., 'SORTING').")
+    parser.add_argument("--solver", default="PBS", help="The solver to use, unless swept.")
+    parser.add_argument("--simulation_time", type=int, default=5000, help="Total simulation time.")
+    parser.add_argument("--simulation_window", type=int, default=5, help="Replanning period (h).")
+    parser.add_argument("--planning_window", type=int, default=100, help="Planning window (w).")
+    parser.add_argument("--task", dest="task_file", help="Optional path to a pre-generated task file.")
+    parser.add_argument("--scen", dest="scen_file",
+                        help="Optional .scen file checked against the map before every run (not passed to 'lifelong').")
+    parser.add_argument("-d", "--seed", type=int, default=0, help="The random seed, unless swept.")
+    parser.add_argument("--suboptimal_bound", dest="suboptimality", type=float, default=1.1, help="The suboptimality factor for the solver.")
+
+
+def base_config_from_args(args, extra_args):
+    """
+    Builds the LifelongLauncher keyword arguments from the options of add_base_config_args.
+
+    :param args: The parsed arguments.
+    :param extra_args: Unrecognized arguments, passed through to 'lifelong'.
+    """
+    return {
+        "lifelong_path": args.lifelong_path,
+        "map_file": args.map_file,
+        "num_agents": args.num_agents,
+        "scenario_name": args.scenario,
+        "solver": args.solver,
+        "simulation_time": args.simulation_time,
+        "simulation_window": args.simulation_window,
+        "planning_window": args.planning_window,
+        "task_file": args.task_file,
+        "scen_file": args.scen_file,
+        "seed": args.seed,
+        "suboptimality": args.suboptimality,
+        "extra_args": extra_args,
+    }
+
+
+def add_pool_args(parser):
+    """
+    Adds the options that control how the runs of a sweep are executed to an argparse parser.
+    """
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Maximum number of concurrent runs (default: CPU count).")
+    parser.add_argument("--timeout", type=float, default=None, help="Wall-clock limit in seconds for each run.")
+    parser.add_argument("--cache_dir", help="Optional folder of a result cache; runs already in it are not re-run.")
+    parser.add_argument("--cache_size_gb", type=float, default=10.0, help="Size cap of the result cache in GB.")
+    add_watchdog_args(parser)
+    add_preflight_args(parser)
+
+
+def pool_options_from_args(args):
+    """
+    Builds the LifelongSweep keyword arguments from the options of add_pool_args.
+    """
+    return {
+        "max_workers": args.jobs,
+        "timeout": args.timeout,
+        "cache": ResultCache(args.cache_dir, int(args.cache_size_gb * 1024 ** 3)) if args.cache_dir else None,
+        "watchdog": watchdog_from_args(args),
+        "preflight": preflight_from_args(args),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of the 'lifelong' MAPF simulation engine in parallel.")
+
+    add_base_config_args(parser)
+    parser.add_argument("--grid", action="append", default=[],
+                        help="A swept parameter as name=v1,v2,... using LifelongLauncher names "
+                             "(e.g. num_agents=100,200 or seed=0,1,2). May be repeated.")
+    add_pool_args(parser)
+
+    args, unknown = parser.parse_known_args()
+
+    sweep = LifelongSweep(base_config_from_args(args, unknown), parse_grid_args(args.grid), args.output_root,
+                          **pool_options_from_args(args))
+    sweep.run()
@@ -0,0 +1,267 @@
+import argparse
+import csv
+import math
+import os
+import random
+
+from lifelong_results import run_metrics
+from lifelong_sweep import (LifelongSweep, add_base_config_args, add_pool_args, base_config_from_args,
+                            expand_grid, parse_grid_args, pool_options_from_args, run_name)
+
+SUCCESS = ("finished", "cached")
+
+# The knobs tuned by default and the values tried for each.
+DEFAULT_SPACE = {
+    "solver": ["PBS", "ECBS"],
+    "simulation_window": [1, 5, 10],
+    "planning_window": [5, 10, 20, 100],
+    "suboptimality": [1.1, 1.5],
+}
+
+
+class SuccessiveHalvingTuner:
+    """
+    Tunes engine settings (solver, simulation_window, planning_window, suboptimality, ...)
+    for a fixed map and number of agents by successive halving.
+
+    Every candidate is first run for a short simulation_time, with all candidates and seeds
+    in parallel. Candidates that fail or break the limits are dropped, the others are ranked
+    by the objective, and the best 1/eta of them are run again with an eta times longer
+    simulation, until the full simulation_time of the base configuration is reached.
+    """
+    RESULTS_FILE = "tuning_results.csv"
+    OBJECTIVES = {"throughput": True, "runtime_mean": False, "runtime_p95": False}  # name: maximize
+
+    def __init__(self, base_config, space, seeds, output_root, objective="throughput", max_runtime=None,
+                 min_throughput=None, eta=3, min_simulation_time=100, max_candidates=None, sample_seed=0,
+                 **pool_options):
+        """
+        Initializes the SuccessiveHalvingTuner.
+
+        :param base_config: LifelongLauncher keyword arguments shared by every run (without output_folder).
+                            Its simulation_time is the length of the final rung.
+        :param space: A dict mapping LifelongLauncher keyword names to the values to try.
+        :param seeds: The seeds to run every candidate with.
+        :param output_root: Folder that receives one sweep per rung and the tuning results.
+        :param objective: "throughput" (maximized), "runtime_mean" or "runtime_p95" (minimized).
+        :param max_runtime: Optional limit in seconds for the p95 replanning runtime of every seed.
+        :param min_throughput: Optional lower limit of the mean throughput in tasks per timestep.
+        :param eta: Factor by which the candidates are reduced and the simulation extended per rung.
+        :param min_simulation_time: Simulation length of the first rung, at the least.
+        :param max_candidates: If the space has more combinations, a random sample of this many is tuned.
+        :param sample_seed: Seed of the candidate sample.
+        :param pool_options: LifelongSweep options (max_workers, timeout, cache, watchdog, preflight).
+        """
+        if objective not in self.OBJECTIVES:
+            raise ValueError(f"objective should be one of {tuple(self.OBJECTIVES)}, not '{objective}'")
+        if eta < 2:
+            raise ValueError("eta should be at least 2")
+        self.base_config = dict(base_config)
+        self.space = space
+        self.seeds = list(seeds)
+        self.output_root = output_root
+        self.objective = objective
+        self.max_runtime = max_runtime
+        self.min_throughput = min_throughput
+        self.eta = eta
+        self.min_simulation_time = min_simulation_time
+        self.max_candidates = max_candidates
+        self.sample_seed = sample_seed
+        self.pool_options = pool_options
+        self.results = []
+
+    def candidates(self):
+        """
+        Lists the candidate settings. Combinations with a planning window shorter than the
+        replanning period are skipped, as RHCR needs h >= w, and suboptimality is only kept
+        for ECBS, the only solver that reads it.
+
+        :return: A list of parameter dicts.
+        """
+        candidates = []
+        for params in expand_grid(self.space):
+            settings = dict(self.base_config, **params)
+            if settings.get("planning_window", 100) < settings.get("simulation_window", 5):
+                continue
+            if settings.get("solver") != "ECBS":
+                params = {name: value for name, value in params.items() if name != "suboptimality"}
+            if params not in candidates:
+                candidates.append(params)
+        if self.max_candidates is not None and len(candidates) > self.max_candidates:
+            candidates = random.Random(self.sample_seed).sample(candidates, self.max_candidates)
+        return candidates
+
+    def rung_times(self):
+        """
+        Computes the simulation_time of every rung, ending with the base configuration's.
+        """
+        times = [self.base_config.get("simulation_time", 5000)]
+        while times[0] // self.eta >= self.min_simulation_time:
+            times.insert(0, times[0] // self.eta)
+        return times
+
+    def evaluate(self, rung, simulation_time, candidates):
+        """
+        Runs every candidate with every seed for simulation_time timesteps.
+
+        :return: A list of result dicts, one per candidate, in the order of candidates.
+        """
+        runs = [dict(params, seed=seed) for params in candidates for seed in self.seeds]
+        rung_root = os.path.join(self.output_root, f"rung{rung}_T={simulation_time}")
+        sweep = LifelongSweep(dict(self.base_config, simulation_time=simulation_time), runs, rung_root,
+                              **self.pool_options)
+        records = {record["run"]: record for record in sweep.run()}
+
+        results = []
+        for params in candidates:
+            seed_records = [records[run_name(dict(params, seed=seed))] for seed in self.seeds]
+            metrics = [run_metrics(r["output_folder"], simulation_time) for r in seed_records if r["status"] in SUCCESS]
+            result = {
+                "rung": rung,
+                "simulation_time": simulation_time,
+                "candidate": run_name(params),
+                "params": params,
+                "succeeded": len(metrics),
+                "throughput": _mean([m["throughput"] for m in metrics]),
+                "runtime_mean": _mean([m["runtime_mean"] for m in metrics]),
+                "runtime_p95": _mean([m["runtime_p95"] for m in metrics]),
+                "runtime_p95_worst_seed": max((m["runtime_p95"] for m in metrics if m["runtime_p95"] is not None),
+                                              default=None),
+            }
+            result["feasible"], result["reason"] = self.judge(result, seed_records)
+            results.append(result)
+        return results
+
+    def judge(self, result, records):
+        """
+        Decides whether a candidate's result is within the limits.
+
+        :return: A (feasible, reason) pair.
+        """
+        failed = [r for r in records if r["status"] not in SUCCESS]
+        if failed:
+            return False, f"{len(failed)} run(s) {', '.join(sorted(set(r['status'] for r in failed)))}"
+        if result[self.objective] is None:
+            return False, f"no {self.objective} recorded"
+        if self.max_runtime is not None:
+            if result["runtime_p95_worst_seed"] is None:
+                return False, "no replanning runtimes recorded"
+            if result["runtime_p95_worst_seed"] > self.max_runtime:
+                return False, f"p95 runtime {result['runtime_p95_worst_seed']:.3f} s > {self.max_runtime} s"
+        if self.min_throughput is not None:
+            if result["throughput"] is None or result["throughput"] < self.min_throughput:
+                return False, f"throughput {_format(result['throughput'])} < {self.min_throughput}"
+        return True, ""
+
+    def rank(self, results):
+        """
+        Sorts the feasible results from best to worst by the objective.
+        """
+        maximize = self.OBJECTIVES[self.objective]
+        feasible = [r for r in results if r["feasible"]]
+        return sorted(feasible, key=lambda r: -r[self.objective] if maximize else r[self.objective])
+
+    def tune(self):
+        """
+        Runs successive halving over the candidates.
+
+        :return: The result dict of the best candidate of the final rung, or None if no
+                 candidate stayed within the limits.
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        candidates = self.candidates()
+        times = self.rung_times()
+        print(f"=== Tuning {len(candidates)} candidates over {len(times)} rungs "
+              f"(simulation_time {', '.join(map(str, times))}) ===")
+
+        best = None
+        for rung, simulation_time in enumerate(times):
+            results = self.evaluate(rung, simulation_time, candidates)
+            ranked = self.rank(results)
+            last = rung == len(times) - 1
+            keep = len(ranked) if last else max(1, math.ceil(len(candidates) / self.eta))
+            promoted = ranked[:keep]
+            for result in results:
+                result["promoted"] = any(result is r for r in promoted) and not last
+            self.results.extend(results)
+
+            print(f"=== Rung {rung} (simulation_time {simulation_time}): {len(ranked)} of {len(results)} "
+                  f"candidates feasible ===")
+            for result in ranked:
+                print(f"    {result['candidate']}: {self.objective} {_format(result[self.objective])}")
+            if not promoted:
+                break
+            best = promoted[0]
+            candidates = [r["params"] for r in promoted]
+
+        self.write_results()
+        if not self.results or best is None or best["rung"] != len(times) - 1:
+            print("No candidate stayed within the limits.")
+            return None
+        print(f"Best setting: {best['candidate']} ({self.objective} {_format(best[self.objective])}, "
+              f"p95 runtime {_format(best['runtime_p95'])} s)")
+        return best
+
+    def write_results(self):
+        """
+        Writes the result of every candidate in every rung to tuning_results.csv in output_root.
+        """
+        path = os.path.join(self.output_root, self.RESULTS_FILE)
+        names = list(self.space.keys())
+        fields = ["rung", "simulation_time", "candidate"] + names + [
+            "succeeded", "throughput", "runtime_mean", "runtime_p95", "runtime_p95_worst_seed",
+            "feasible", "reason", "promoted"]
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for result in self.results:
+                writer.writerow(dict(result, **result["params"]))
+        print(f"Tuning results written to {path}")
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def _format(value):
+    return "-" if value is None else f"{value:.4g}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tune the settings of the 'lifelong' engine by successive halving.")
+
+    add_base_config_args(parser)
+    parser.add_argument("--space", action="append", default=[],
+                        help="A tuned parameter as name=v1,v2,... using LifelongLauncher names "
+                             "(e.g. planning_window=5,10,20). May be repeated. Default: solver, "
+                             "simulation_window, planning_window and suboptimality.")
+    parser.add_argument("--seeds", default="0,1,2", help="Comma-separated seeds to run every candidate with (default: 0,1,2).")
+    parser.add_argument("--objective", choices=tuple(SuccessiveHalvingTuner.OBJECTIVES), default="throughput",
+                        help="Maximize throughput or minimize runtime_mean/runtime_p95 (default: throughput).")
+    parser.add_argument("--max_runtime", type=float, default=None, help="Limit in seconds for the p95 replanning runtime.")
+    parser.add_argument("--min_throughput", type=float, default=None, help="Lower limit of the throughput in tasks per timestep.")
+    parser.add_argument("--eta", type=int, default=3, help="Reduction factor per rung (default: 3).")
+    parser.add_argument("--min_simulation_time", type=int, default=100,
+                        help="Simulation length of the first rung, at the least (default: 100).")
+    parser.add_argument("--max_candidates", type=int, default=None, help="Tune a random sample of this many candidates.")
+    parser.add_argument("--sample_seed", type=int, default=0, help="Seed of the candidate sample (default: 0).")
+    add_pool_args(parser)
+
+    args, unknown = parser.parse_known_args()
+
+    tuner = SuccessiveHalvingTuner(
+        base_config_from_args(args, unknown),
+        space=parse_grid_args(args.space) if args.space else DEFAULT_SPACE,
+        seeds=[int(s) for s in args.seeds.split(',') if s.strip()],
+        output_root=args.output_root,
+        objective=args.objective,
+        max_runtime=args.max_runtime,
+        min_throughput=args.min_throughput,
+        eta=args.eta,
+        min_simulation_time=args.min_simulation_time,
+        max_candidates=args.max_candidates,
+        sample_seed=args.sample_seed,
+        **pool_options_from_args(args)
+    )
+    tuner.tune()
@@ -0,0 +1,133 @@
+import os
+import time
+
+ABORTED = "aborted: over budget"
+
+
+class Watchdog:
+    """
+    Thresholds for aborting runaway 'lifelong' runs early.
+
+    The watchdog follows a run through the rows the engine appends to solver.csv, one per
+    replanning call, whose first column is the call's runtime and whose tenth column is the
+    simulation timestep. A run is aborted when:
+
+    - max_window_runtime is exceeded by `patience` consecutive replanning calls,
+    - its elapsed wall-clock time exceeds wall_clock_budget, or, once min_progress of the
+      simulation is done, its projected total wall-clock time does,
+    - no new replanning call has been recorded for stall_timeout seconds.
+    """
+
+    def __init__(self, max_window_runtime=None, patience=3, wall_clock_budget=None,
+                 min_progress=0.1, stall_timeout=None):
+        """
+        Initializes the Watchdog.
+
+        :param max_window_runtime: Runtime limit in seconds for one replanning call.
+        :param patience: Number of consecutive calls over max_window_runtime that abort the run.
+        :param wall_clock_budget: Wall-clock budget in seconds for the whole run.
+        :param min_progress: Fraction of simulation_time after which the projected wall-clock time is checked.
+        :param stall_timeout: Seconds without a new replanning call after which the run is aborted.
+        """
+        self.max_window_runtime = max_window_runtime
+        self.patience = patience
+        self.wall_clock_budget = wall_clock_budget
+        self.min_progress = min_progress
+        self.stall_timeout = stall_timeout
+
+    def watch(self, launcher):
+        """
+        Starts watching one run.
+
+        :param launcher: The LifelongLauncher whose run is about to start.
+        :return: A WatchdogSession to be called periodically while the run is in progress.
+        """
+        return WatchdogSession(self, launcher)
+
+
+class WatchdogSession:
+    """The state of the watchdog for one run. Calling it returns an abort reason or None."""
+
+    def __init__(self, watchdog, launcher):
+        self.watchdog = watchdog
+        self.simulation_time = launcher.simulation_time
+        self.solver_csv = os.path.join(launcher.output_folder, "solver.csv")
+        # The engine appends to solver.csv, so rows left over from earlier runs are skipped.
+        self.offset = os.path.getsize(self.solver_csv) if os.path.isfile(self.solver_csv) else 0
+        self.partial = ""
+        self.started = time.time()
+        self.last_progress = self.started
+        self.timestep = 0
+        self.windows = 0
+        self.slow_streak = 0
+        self.reason = None
+
+    def read_new_rows(self):
+        """Reads the rows appended to solver.csv since the last call."""
+        if not os.path.isfile(self.solver_csv):
+            return []
+        with open(self.solver_csv) as f:
+            f.seek(self.offset)
+            data = f.read()
+            self.offset = f.tell()
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()  # the last line may still be incomplete
+        return [line.split(",") for line in lines if line.strip()]
+
+    def __call__(self):
+        watchdog = self.watchdog
+        now = time.time()
+        for row in self.read_new_rows():
+            try:
+                runtime = float(row[0])
+                self.timestep = max(self.timestep, int(row[9]))
+            except (IndexError, ValueError):
+                continue
+            self.windows += 1
+            self.last_progress = now
+            if watchdog.max_window_runtime is not None and runtime > watchdog.max_window_runtime:
+                self.slow_streak += 1
+            else:
+                self.slow_streak = 0
+            if watchdog.max_window_runtime is not None and self.slow_streak >= watchdog.patience:
+                self.reason = (f"{self.slow_streak} consecutive replanning calls took more than "
+                               f"{watchdog.max_window_runtime} s (last: {runtime} s at timestep {self.timestep})")
+                return self.reason
+
+        elapsed = now - self.started
+        if watchdog.wall_clock_budget is not None:
+            if elapsed > watchdog.wall_clock_budget:
+                self.reason = f"wall-clock time {elapsed:.0f} s exceeded the budget of {watchdog.wall_clock_budget} s"
+                return self.reason
+            progress = self.timestep / self.simulation_time if self.simulation_time else 0
+            if progress >= watchdog.min_progress:
+                projected = elapsed / progress
+                if projected > watchdog.wall_clock_budget:
+                    self.reason = (f"projected wall-clock time {projected:.0f} s at timestep {self.timestep} "
+                                   f"exceeds the budget of {watchdog.wall_clock_budget} s")
+                    return self.reason
+
+        if watchdog.stall_timeout is not None and now - self.last_progress > watchdog.stall_timeout:
+            self.reason = f"no replanning call finished in the last {watchdog.stall_timeout} s"
+            return self.reason
+        return None
+
+
+def add_watchdog_args(parser):
+    """Adds the watchdog options to an argparse parser."""
+    parser.add_argument("--max_window_runtime", type=float, default=None,
+                        help="Runtime limit in seconds for one replanning call.")
+    parser.add_argument("--window_patience", type=int, default=3,
+                        help="Number of consecutive calls over --max_window_runtime that abort a run (default: 3).")
+    parser.add_argument("--wall_clock_budget", type=float, default=None,
+                        help="Abort when the elapsed or projected wall-clock time of a run exceeds this many seconds.")
+    parser.add_argument("--stall_timeout", type=float, default=None,
+                        help="Abort when no replanning call finishes for this many seconds.")
+
+
+def watchdog_from_args(args):
+    """Creates a Watchdog from parsed watchdog options, or None if none of them is set."""
+    if args.max_window_runtime is None and args.wall_clock_budget is None and args.stall_timeout is None:
+        return None
+    return Watchdog(max_window_runtime=args.max_window_runtime, patience=args.window_patience,
+                    wall_clock_budget=args.wall_clock_budget, stall_timeout=args.stall_timeout)
@@ -0,0 +1,133 @@
+import argparse
+import os
+
+import numpy as np
+
+from grid_map import GridMap, find_map_file
+from trajectories import MISSING, find_run_files, load_paths, time_chunks
+
+METRICS = ("visits", "waits", "near_misses")
+
+
+def congestion_counts(locations, num_cells, slice_length=500, budget=1 << 24):
+    """
+    Counts visits, waits and near-misses per cell and time slice.
+
+    A visit is an agent at the cell at a timestep, a wait an agent staying at the cell from
+    the previous timestep, and a near-miss an agent entering the cell one timestep after
+    another agent was there (a 1-robust conflict). Timesteps are processed in chunks whose
+    occupancy tables fit in about budget entries, and every chunk is counted with one
+    np.bincount over slice * num_cells + location, so memory-mapped paths are read once.
+
+    :param locations: The (agents x timesteps) locations from trajectories.load_paths.
+    :param num_cells: Number of cells of the map (rows * cols).
+    :param slice_length: Number of timesteps per slice.
+    :return: A dict with "slice_starts" and an int64 (slices x num_cells) array per metric.
+    """
+    horizon = locations.shape[1]
+    num_slices = max(1, -(-horizon // slice_length))
+    counts = {name: np.zeros(num_slices * num_cells, dtype=np.int64) for name in METRICS}
+    for t0, t1, occupancy in time_chunks(locations, history=1, budget=budget):
+        current = np.asarray(locations[:, t0:t1]).astype(np.int64)
+        previous = np.asarray(locations[:, max(t0 - 1, 0):t1 - 1]).astype(np.int64)
+        if t0 == 0:
+            previous = np.c_[np.full((len(current), 1), MISSING), previous]
+        agents, steps = np.nonzero(current != MISSING)
+        cells = current[agents, steps]
+        bins = ((t0 + steps) // slice_length) * num_cells + cells
+        counts["visits"] += np.bincount(bins, minlength=len(counts["visits"]))
+
+        stayed = previous[agents, steps] == cells
+        counts["waits"] += np.bincount(bins[stayed], minlength=len(counts["waits"]))
+
+        # occupancy row s holds timestep t0 + s - 1, the one before the agent's timestep.
+        entered = ~stayed & (cells < occupancy.shape[1])
+        before = occupancy[steps[entered], cells[entered]]
+        missed = (before != -1) & (before != agents[entered])
+        counts["near_misses"] += np.bincount(bins[entered][missed], minlength=len(counts["near_misses"]))
+
+    result = {name: values.reshape(num_slices, num_cells) for name, values in counts.items()}
+    result["slice_starts"] = np.arange(num_slices) * slice_length
+    return result
+
+
+def save_counts(counts, graph, path):
+    """Saves the counts and the map dimensions as a compressed .npz file."""
+    np.savez_compressed(path, rows=graph.rows, cols=graph.cols, obstacle=graph.obstacle, **counts)
+
+
+def render_heatmaps(counts, graph, output_folder, prefix="congestion"):
+    """
+    Draws every metric of every slice, and of the whole run, over the map as PNG images.
+    Obstacles are drawn black and cells without any count are left white. Requires matplotlib.
+
+    :return: The paths of the saved images.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(output_folder, exist_ok=True)
+    saved = []
+    obstacle = graph.obstacle.reshape(graph.rows, graph.cols)
+    starts = counts["slice_starts"]
+    for name in METRICS:
+        values = counts[name]
+        frames = [("all", values.sum(axis=0))] + [(f"t{start}", values[i]) for i, start in enumerate(starts)]
+        vmax = max(int(values.sum(axis=0).max()), 1)
+        for label, frame in frames:
+            grid = frame.reshape(graph.rows, graph.cols).astype(np.float64)
+            fig, ax = plt.subplots(figsize=(max(4.0, graph.cols / 6), max(3.0, graph.rows / 6)))
+            ax.imshow(np.where(obstacle, 0.0, np.nan), cmap="gray", vmin=0, vmax=1, interpolation="nearest")
+            image = ax.imshow(np.ma.masked_where(obstacle | (grid == 0), grid), cmap="hot_r", interpolation="nearest",
+                              vmin=0, vmax=vmax if label == "all" else max(int(values.max()), 1))
+            fig.colorbar(image, ax=ax, label=name.replace('_', ' '))
+            ax.set_title(f"{name.replace('_', ' ')} ({'whole run' if label == 'all' else 'from timestep ' + label[1:]})")
+            ax.set_xticks([])
+            ax.set_yticks([])
+            path = os.path.join(output_folder, f"{prefix}_{name}_{label}.png")
+            fig.savefig(path, dpi=100, bbox_inches="tight")
+            plt.close(fig)
+            saved.append(path)
+    return saved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-cell congestion heatmaps of a 'lifelong' run per time slice.")
+    parser.add_argument("run", help="Run output folder or paths.txt file.")
+    parser.add_argument("-m", "--map", help="Map file (default: the map in config.txt, as .grid or .map).")
+    parser.add_argument("--slice", type=int, default=500, help="Timesteps per slice (default: 500).")
+    parser.add_argument("-o", "--output_folder", default="heatmaps", help="Folder for the arrays and images (default: heatmaps).")
+    parser.add_argument("--no_images", action="store_true", help="Only save the arrays.")
+    args = parser.parse_args()
+
+    try:
+        paths_file, config = find_run_files(args.run)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    map_file = args.map
+    if map_file is None and "map" in config:
+        map_file = find_map_file(config["map"])
+    if map_file is None:
+        print("Error: no map found, pass it with -m")
+        raise SystemExit(1)
+
+    graph = GridMap.load(map_file)
+    locations, _ = load_paths(paths_file)
+    counts = congestion_counts(locations, graph.size, args.slice)
+    os.makedirs(args.output_folder, exist_ok=True)
+    save_counts(counts, graph, os.path.join(args.output_folder, "congestion.npz"))
+    print(f"{args.run}: {len(counts['slice_starts'])} slices of {args.slice} timesteps, "
+          + ", ".join(f"{int(counts[name].sum())} {name.replace('_', ' ')}" for name in METRICS))
+    for name in METRICS:
+        total = counts[name].sum(axis=0)
+        top = np.argsort(-total, kind="stable")[:5]
+        print(f"    busiest cells by {name.replace('_', ' ')}: " + ", ".join(f"{c} ({total[c]})" for c in top if total[c]))
+    if not args.no_images:
+        try:
+            saved = render_heatmaps(counts, graph, args.output_folder)
+            print(f"{len(saved)} images saved to {args.output_folder}")
+        except ImportError:
+            print("Warning: matplotlib is not installed, only the arrays were saved")
+    print(f"Arrays saved to {os.path.join(args.output_folder, 'congestion.npz')}")
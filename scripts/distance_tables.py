@@ -0,0 +1,324 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from grid_map import GridMap
+
+# Cell types whose cells get a distance table: the goals of the sorting (Induct, Eject),
+# kiva (Endpoint, Home) and pick scenarios.
+STATION_TYPES = ("Induct", "Eject", "Endpoint", "Home", "Pick")
+TABLE_DTYPE = np.float32
+
+
+def station_cells(grid_map, types=STATION_TYPES):
+    """Returns the sorted ids of the cells of the given types."""
+    mask = np.zeros(grid_map.size, dtype=bool)
+    for name in types:
+        mask |= grid_map.type_mask(name)
+    return np.flatnonzero(mask)
+
+
+def map_hash(grid_map):
+    """Hashes the dimensions and edge weights of a map, which determine all distances."""
+    digest = hashlib.sha256(f"{grid_map.rows},{grid_map.cols}".encode())
+    digest.update(np.ascontiguousarray(grid_map.weights, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def reverse_edges(grid_map, rotation=False):
+    """
+    Builds the reverse edges of the engine's search graph, grouped by their target state.
+
+    Without rotation, the states are the locations and moving from u in direction d costs
+    weights[u][d]. With rotation, state u * 4 + d is location u facing direction d: an
+    agent moves forward in the direction it faces and turns by 90 degrees at the cost of
+    waiting, weights[u][4], as in BasicGraph::get_reverse_neighbors.
+
+    :return: A (starts, sources, costs) triple: the reverse edges into state v are
+             sources[starts[v]:starts[v + 1]] with costs[starts[v]:starts[v + 1]].
+    """
+    size = grid_map.size
+    cells = np.arange(size, dtype=np.int64)
+    targets, sources, costs = [], [], []
+    for d, move in enumerate(grid_map.moves.tolist()):
+        allowed = np.isfinite(grid_map.weights[:, d]) & (cells + move >= 0) & (cells + move < size)
+        u = cells[allowed]
+        targets.append((u + move) * 4 + d if rotation else u + move)
+        sources.append(u * 4 + d if rotation else u)
+        costs.append(grid_map.weights[u, d])
+    num_states = size * 4 if rotation else size
+    if rotation:
+        can_turn = np.isfinite(grid_map.weights[:, 4])
+        u = cells[can_turn]
+        for d in range(4):
+            for turn in (1, 3):
+                targets.append(u * 4 + d)
+                sources.append(u * 4 + (d + turn) % 4)
+                costs.append(grid_map.weights[u, 4])
+    targets, sources, costs = np.concatenate(targets), np.concatenate(sources), np.concatenate(costs)
+    order = np.argsort(targets, kind="stable")
+    starts = np.searchsorted(targets[order], np.arange(num_states + 1))
+    return starts, sources[order], costs[order]
+
+
+def root_states(grid_map, goals, rotation=False):
+    """
+    Lists the states a search towards every goal starts from, with distance 0.
+
+    :return: A (rows, states) pair of equal-length arrays; rows indexes goals.
+    """
+    goals = np.asarray(goals, dtype=np.int64)
+    if not rotation:
+        return np.arange(len(goals)), goals
+    # The engine starts from the goal facing every direction it can be entered from.
+    rows, states = [], []
+    for d, move in enumerate(grid_map.moves.tolist()):
+        u = goals - move
+        entered = (u >= 0) & (u < grid_map.size)
+        entered[entered] = np.isfinite(grid_map.weights[u[entered], d])
+        rows.append(np.flatnonzero(entered))
+        states.append(goals[entered] * 4 + d)
+    return np.concatenate(rows), np.concatenate(states)
+
+
+def backward_distances(edges, num_states, rows, states, num_rows):
+    """
+    Computes the distance from every state to a batch of goals at once.
+
+    The search is a label-correcting Dijkstra over the reverse edges, relaxed with array
+    operations: every round expands all (goal, state) pairs whose distance dropped in the
+    previous round. With unit weights this is a breadth-first search, and every state of
+    every goal is expanded once.
+
+    :param edges: The reverse edges from reverse_edges.
+    :param rows: Row (goal) of every root state, from root_states.
+    :return: A (num_rows x num_states) float64 array, inf where a goal is unreachable.
+    """
+    starts, sources, costs = edges
+    dist = np.full(num_rows * num_states, np.inf)
+    active = np.unique(np.asarray(rows, dtype=np.int64) * num_states + states)
+    dist[active] = 0
+    while len(active):
+        row, state = np.divmod(active, num_states)
+        counts = starts[state + 1] - starts[state]
+        first = np.repeat(starts[state] - np.cumsum(counts) + counts, counts)
+        edge = first + np.arange(counts.sum())
+        keys = np.repeat(row * num_states, counts) + sources[edge]
+        candidates = np.repeat(dist[active], counts) + costs[edge]
+        better = candidates < dist[keys]
+        keys, candidates = keys[better], candidates[better]
+        np.minimum.at(dist, keys, candidates)
+        active = np.unique(keys)
+    return dist.reshape(num_rows, num_states)
+
+
+def _fill_rows(table_file, first, last, edges, num_states, rows, states):
+    """Computes the rows first..last-1 of a table and writes them into its .npy file."""
+    table = np.lib.format.open_memmap(table_file, mode='r+')
+    dist = backward_distances(edges, num_states, rows, states, last - first)
+    table[first:last] = dist.reshape(table[first:last].shape)
+    table.flush()
+    return last - first
+
+
+class DistanceTable:
+    """
+    True shortest-path distances from every cell to a set of goal cells (the stations).
+
+    Row i of the table holds the distances to goals[i]; with rotation, the distances of
+    every cell and orientation (in the engine's move order). Distances use the weights of
+    the map and are inf where the goal cannot be reached, like the engine's heuristic
+    tables (BasicGraph::compute_heuristics).
+    """
+
+    def __init__(self, grid_map, goals, table, rotation=False):
+        self.grid_map = grid_map
+        self.goals = np.asarray(goals, dtype=np.int64)
+        self.table = table
+        self.rotation = rotation
+
+    def rows(self, goals):
+        """Maps goal ids to table rows; raises KeyError for cells without a table."""
+        goals = np.asarray(goals, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.goals, goals), max(len(self.goals) - 1, 0))
+        if len(self.goals) == 0 or np.any(self.goals[rows] != goals):
+            missing = np.setdiff1d(goals, self.goals)
+            raise KeyError(f"no distance table for cells {missing[:10].tolist()}")
+        return rows
+
+    def to(self, goal):
+        """Returns the distances from every cell to a goal (the best orientation, with rotation)."""
+        row = self.table[self.rows(goal)]
+        return np.asarray(row.min(axis=-1) if self.rotation else row)
+
+    def distance(self, locations, goals, orientations=None):
+        """
+        Looks up the distances of pairs of cells and goals (arrays or scalars).
+
+        :param orientations: Direction each agent faces (rotation tables only; default:
+                             the best orientation).
+        """
+        locations = np.asarray(locations, dtype=np.int64)
+        rows = self.rows(goals)
+        if not self.rotation:
+            return np.asarray(self.table[rows, locations])
+        if orientations is None:
+            return np.asarray(self.table[rows, locations]).min(axis=-1)
+        return np.asarray(self.table[rows, locations, orientations])
+
+    def path(self, start, goal, orientation=None):
+        """
+        Reconstructs a shortest path by descending the table of the goal.
+
+        With rotation, the descent runs over (cell, orientation) states: an agent either
+        moves forward or turns in place, and a turn repeats its cell in the path.
+
+        :param orientation: Direction the agent faces at start (rotation tables only;
+                            default: the best orientation).
+        :return: The list of location ids from start to goal, or None if the goal is unreachable.
+        """
+        row = np.asarray(self.table[self.rows(goal)], dtype=np.float64)
+        weights = self.grid_map.weights
+        moves = self.grid_map.moves
+        size = self.grid_map.size
+        if not self.rotation:
+            row = row[:, None]
+            orientation = 0
+        elif orientation is None:
+            orientation = int(np.argmin(row[start]))
+        if not np.isfinite(row[start, orientation]):
+            return None
+        path = [int(start)]
+        here, facing = int(start), orientation
+        # A shortest path visits every state at most once, which bounds the descent even
+        # where zero-weight edges would let it circle.
+        for _ in range(row.size):
+            if here == goal:
+                return path
+            if self.rotation:
+                step = here + int(moves[facing])
+                states = [(step, facing, weights[here, facing]),
+                          (here, (facing + 1) % 4, weights[here, 4]),
+                          (here, (facing + 3) % 4, weights[here, 4])]
+            else:
+                states = [(here + int(move), 0, weights[here, d]) for d, move in enumerate(moves.tolist())]
+            remaining = [cost + row[loc, o] if 0 <= loc < size else np.inf for loc, o, cost in states]
+            best = int(np.argmin(remaining))
+            if not np.isfinite(remaining[best]):
+                break
+            here, facing = states[best][0], states[best][1]
+            path.append(here)
+        raise RuntimeError(f"could not descend the distance table from {start} to {goal}")
+
+    @staticmethod
+    def cache_file(map_file, digest, rotation=False):
+        """Returns the .npy path of the table of a map; the name holds the hash of its weights."""
+        return f"{map_file}.{digest[:16]}{'.rotation' if rotation else ''}.dist.npy"
+
+    @classmethod
+    def compute(cls, grid_map, goals, output_file, rotation=False, max_workers=None, budget=1 << 24):
+        """
+        Computes the table into a .npy file and returns it memory-mapped.
+
+        Goals are split into batches of about budget (goal, state) pairs, which are
+        searched in parallel and written straight into the file.
+        """
+        goals = np.asarray(goals, dtype=np.int64)
+        num_states = grid_map.size * 4 if rotation else grid_map.size
+        shape = (len(goals), grid_map.size, 4) if rotation else (len(goals), grid_map.size)
+        # A name of its own, so tools computing the same table at once do not share the file.
+        tmp = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        np.lib.format.open_memmap(tmp, mode='w+', dtype=TABLE_DTYPE, shape=shape).flush()
+
+        edges = reverse_edges(grid_map, rotation)
+        rows, states = root_states(grid_map, goals, rotation)
+        batch = max(1, budget // num_states)
+        bounds = [(first, min(first + batch, len(goals))) for first in range(0, len(goals), batch)]
+        jobs = []
+        for first, last in bounds:
+            in_batch = (rows >= first) & (rows < last)
+            jobs.append((tmp, first, last, edges, num_states, rows[in_batch] - first, states[in_batch]))
+        if len(jobs) > 1 and max_workers != 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(_fill_rows, *zip(*jobs)))
+        else:
+            for job in jobs:
+                _fill_rows(*job)
+        os.replace(tmp, output_file)
+        return cls(grid_map, goals, np.load(output_file, mmap_mode='r'), rotation)
+
+    @classmethod
+    def load(cls, map_file, types=STATION_TYPES, rotation=False, use_cache=True, max_workers=None):
+        """
+        Loads the distance tables of the stations of a map, computing them only once.
+
+        The table is stored next to the map under the hash of the map's weights, with a
+        .json file listing its goals, and later loads memory-map it. Editing the weights
+        changes the hash, so a stale table is never read.
+
+        :param map_file: Path of a .grid or .map file.
+        :param types: Cell types whose cells are goals.
+        :param rotation: Distances per orientation, for agents that turn in place.
+        """
+        grid_map = GridMap.load(map_file)
+        goals = station_cells(grid_map, types)
+        table_file = cls.cache_file(map_file, map_hash(grid_map), rotation)
+        meta_file = table_file[:-len(".npy")] + ".json"
+        if use_cache:
+            try:
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                if meta["goals"] == goals.tolist():
+                    return cls(grid_map, goals, np.load(table_file, mmap_mode='r'), rotation)
+            except (OSError, ValueError, KeyError):
+                pass
+            table = cls.compute(grid_map, goals, table_file, rotation, max_workers)
+            tmp = f"{meta_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"rows": grid_map.rows, "cols": grid_map.cols, "rotation": rotation,
+                           "types": list(types), "goals": goals.tolist()}, f)
+            os.replace(tmp, meta_file)
+            return table
+
+        # Without the cache, the table is computed into a temporary file and read into memory.
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            table = cls.compute(grid_map, goals, os.path.join(tmp_dir, "table.npy"), rotation, max_workers)
+            table.table = np.array(table.table)
+            return table
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute and cache the distance tables of the stations of a map.")
+    parser.add_argument("map", help=".grid or .map file.")
+    parser.add_argument("--types", nargs="+", default=list(STATION_TYPES),
+                        help=f"Cell types whose cells are goals (default: {' '.join(STATION_TYPES)}).")
+    parser.add_argument("--rotation", action="store_true", help="Distances per orientation, for agents that turn in place.")
+    parser.add_argument("--query", nargs=2, type=int, metavar=("CELL", "GOAL"), action="append", default=[],
+                        help="Print the distance and a shortest path from CELL to GOAL (repeatable).")
+    parser.add_argument("--no_cache", action="store_true", help="Compute the table without reading or writing the cache.")
+    parser.add_argument("-j", "--max_workers", type=int, default=None, help="Number of processes (default: CPU count).")
+    args = parser.parse_args()
+
+    table = DistanceTable.load(args.map, args.types, args.rotation, not args.no_cache, args.max_workers)
+    reachable = np.isfinite(table.table)
+    print(f"{args.map}: {len(table.goals)} goals x {table.grid_map.size} cells"
+          + (" x 4 orientations" if table.rotation else "")
+          + f", {reachable.mean() * 100 if table.table.size else 0:.1f}% reachable"
+          + (f", longest distance {table.table[reachable].max():g}" if reachable.any() else ""))
+    for cell, goal in args.query:
+        try:
+            path = table.path(cell, goal)
+            print(f"    {cell} -> {goal}: distance {table.distance(cell, goal):g}"
+                  + (f", path {path}" if path is not None else ""))
+        except KeyError as e:
+            print(f"Error: {e.args[0]}")
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+# Cell types, in the order of their codes. Types a .grid file uses beyond these get the
+# next codes, recorded per map in type_names.
+TYPE_NAMES = ("Travel", "Obstacle", "Endpoint", "Home", "Induct", "Eject", "Magic")
+NO_STATION = -1
+
+# Characters of MovingAI .map files (header "type octile", "height", "width", "map").
+MOVINGAI_OBSTACLE_CHARS = "@OT"
+
+
+def cache_paths(path):
+    """Returns the paths of the .npy cache files and of the cache metadata for a map file."""
+    return {"types": path + ".types.npy", "stations": path + ".stations.npy", "weights": path + ".weights.npy",
+            "meta": path + ".npy.json"}
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def unit_weights(rows, cols, obstacle):
+    """
+    Computes the edge weights the engine gives an unweighted map: moving to an in-bounds,
+    4-neighboring, non-obstacle cell costs 1, and waiting anywhere but on an obstacle costs 1.
+
+    :return: A (rows * cols x 5) float64 array, inf where a move is forbidden.
+    """
+    obstacle = np.asarray(obstacle, dtype=bool).reshape(rows, cols)
+    free = ~obstacle
+    weights = np.full((rows, cols, 5), np.inf)
+    weights[free, 4] = 1
+    # moves [1, -cols, -1, cols] go to the next column, the previous row, the previous
+    # column and the next row.
+    east, north, west, south = (weights[..., d] for d in range(4))
+    east[:, :-1][free[:, :-1] & free[:, 1:]] = 1
+    north[1:, :][free[1:, :] & free[:-1, :]] = 1
+    west[:, 1:][free[:, 1:] & free[:, :-1]] = 1
+    south[:-1, :][free[:-1, :] & free[1:, :]] = 1
+    return weights.reshape(rows * cols, 5)
+
+
+def label_components(size, first, second):
+    """
+    Labels the connected components of a graph given by its undirected links.
+
+    The smallest node id is propagated along all links at once, and labels jump to the
+    label of their label, until nothing changes.
+
+    :param size: The number of nodes.
+    :param first: One end of every link, an int array.
+    :param second: The other end of every link.
+    :return: The label of every node: the smallest id of its component.
+    """
+    labels = np.arange(size)
+    while True:
+        low = np.minimum(labels[first], labels[second])
+        updated = labels.copy()
+        np.minimum.at(updated, first, low)
+        np.minimum.at(updated, second, low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def read_movingai_chars(path):
+    """
+    Reads the character grid of a MovingAI .map file.
+
+    :return: A (height x width) array of single-character strings.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if not lines or not lines[0].startswith("type"):
+        raise ValueError(f"'{path}' is missing the 'type' line of a MovingAI map")
+    header = dict(line.split(None, 1) for line in lines[:lines.index("map")] if ' ' in line)
+    height, width = int(header["height"]), int(header["width"])
+    start = lines.index("map") + 1
+    grid = lines[start:start + height]
+    if len(grid) != height or any(len(line) < width for line in grid):
+        raise ValueError(f"'{path}' should have {height} rows of {width} characters")
+    return np.frombuffer(''.join(line[:width] for line in grid).encode(), dtype='S1').reshape(height, width).astype('U1')
+
+
+class GridMap:
+    """
+    A map compiled into NumPy arrays, the way the engine sees it.
+
+    Location ids are row-major (id = row * cols + col), and moving in direction d (0..3)
+    from location u leads to u + moves[d] with moves = [1, -cols, -1, cols]; direction 4
+    is waiting. A move is allowed if its weight is finite. In .grid files the first number
+    of the size line is the number of rows, and the "x" and "y" columns are the row and the
+    column, so their ids are x * cols + y.
+    """
+
+    def __init__(self, rows, cols, types, stations, weights, type_names=TYPE_NAMES):
+        self.rows = rows
+        self.cols = cols
+        self.types = np.asarray(types, dtype=np.uint8)
+        self.stations = np.asarray(stations, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.type_names = list(type_names)
+        self.moves = np.array([1, -cols, -1, cols], dtype=np.int64)
+        self.obstacle = self.types == self.type_names.index("Obstacle")
+        self.traversable = ~self.obstacle
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def type_mask(self, name):
+        """Marks the cells of a type ("Eject", "Endpoint", ...); all False if the map has none."""
+        if name not in self.type_names:
+            return np.zeros(self.size, dtype=bool)
+        return self.types == self.type_names.index(name)
+
+    def type_strings(self):
+        """Returns the type name of every cell as a string array."""
+        return np.array(self.type_names)[self.types]
+
+    def id_to_rc(self, ids):
+        """Converts location ids (an array or a scalar) into (row, col); for .grid files, their (x, y) columns."""
+        return np.divmod(ids, self.cols)
+
+    def rc_to_id(self, rows, cols):
+        return np.asarray(rows) * self.cols + cols
+
+    def id_to_xy(self, ids):
+        """Converts location ids into plot coordinates: x is the column and y the row."""
+        return np.asarray(ids) % self.cols, np.asarray(ids) // self.cols
+
+    def xy_to_id(self, x, y):
+        return np.asarray(y) * self.cols + x
+
+    def neighbors(self, ids=None):
+        """
+        Lists the cells reachable in one move.
+
+        :param ids: Location ids (default: all cells).
+        :return: A (len(ids) x 4) int64 array with the neighbor in every direction, -1
+                 where the move is forbidden.
+        """
+        ids = np.arange(self.size) if ids is None else np.asarray(ids)
+        targets = ids[:, None] + self.moves[None, :]
+        return np.where(np.isfinite(self.weights[ids, :4]), targets, -1)
+
+    def components(self):
+        """
+        Labels the connected components of the map, ignoring the direction of the moves:
+        two cells are linked if a move between them is allowed either way.
+
+        :return: The label of every cell, -1 for obstacles.
+        """
+        cells = np.arange(self.size)
+        first, second = [], []
+        for d, move in enumerate(self.moves.tolist()):
+            allowed = np.isfinite(self.weights[:, d]) & (cells + move >= 0) & (cells + move < self.size)
+            first.append(cells[allowed])
+            second.append(cells[allowed] + move)
+        labels = label_components(self.size, np.concatenate(first), np.concatenate(second))
+        return np.where(self.traversable, labels, -1)
+
+    @classmethod
+    def parse(cls, path):
+        """Parses a weighted .grid file, an engine (kiva) .map file or a MovingAI .map file."""
+        if path.endswith(".grid"):
+            return cls._parse_grid(path)
+        with open(path) as f:
+            first = f.readline()
+        if first.startswith("type"):
+            chars = read_movingai_chars(path)
+            rows, cols = chars.shape
+            obstacle = np.isin(chars, list(MOVINGAI_OBSTACLE_CHARS)).ravel()
+            types = np.where(obstacle, TYPE_NAMES.index("Obstacle"), TYPE_NAMES.index("Travel"))
+            return cls(rows, cols, types, np.full(rows * cols, NO_STATION), unit_weights(rows, cols, obstacle))
+        return cls._parse_kiva(path)
+
+    @classmethod
+    def _parse_kiva(cls, path):
+        with open(path) as f:
+            lines = f.read().splitlines()
+        rows, cols = (int(v) for v in lines[0].split(',')[:2])
+        grid = np.frombuffer(''.join(line[:cols].ljust(cols) for line in lines[4:4 + rows]).encode(), dtype=np.uint8)
+        types = np.full(rows * cols, TYPE_NAMES.index("Travel"), dtype=np.uint8)
+        for char, name in (('@', "Obstacle"), ('e', "Endpoint"), ('r', "Home")):
+            types[grid == ord(char)] = TYPE_NAMES.index(name)
+        obstacle = types == TYPE_NAMES.index("Obstacle")
+        return cls(rows, cols, types, np.full(rows * cols, NO_STATION), unit_weights(rows, cols, obstacle))
+
+    @classmethod
+    def _parse_grid(cls, path):
+        with open(path) as f:
+            f.readline()  # "Grid size (x, y)"
+            rows, cols = (int(v) for v in f.readline().split(',')[:2])
+            f.readline()  # column names
+            body = f.read()
+        size = rows * cols
+        fields = body.replace('\r', '').replace('\n', ',').split(',')
+        if len(fields) < 10 * size:
+            raise ValueError(f"'{path}' should have {size} cells of 10 fields")
+        type_strings = np.array(fields[1:10 * size:10])
+        names, codes = np.unique(type_strings, return_inverse=True)
+        type_names = list(TYPE_NAMES) + sorted(set(names) - set(TYPE_NAMES))
+        types = np.array([type_names.index(name) for name in names], dtype=np.uint8)[codes]
+        station_strings = np.array(fields[2:10 * size:10])
+        stations = np.full(size, NO_STATION, dtype=np.int32)
+        has_station = station_strings != "None"
+        stations[has_station] = station_strings[has_station].astype(np.int64)
+        weights = np.column_stack([np.array(fields[5 + d:10 * size:10], dtype=np.float64) for d in range(5)])
+        return cls(rows, cols, types, stations, weights, type_names)
+
+    @classmethod
+    def load(cls, path, use_cache=True):
+        """
+        Loads a map, parsing it only the first time.
+
+        The first load saves the arrays as .npy files next to the map; later loads memory-map
+        them read-only instead of parsing the file again. The cache is rebuilt when the size
+        or modification time of the map changes. If the folder is not writable, the map is
+        returned without caching.
+
+        :param path: Path of a .grid or .map file.
+        :param use_cache: Read and write the .npy cache.
+        """
+        if not use_cache:
+            return cls.parse(path)
+
+        files = cache_paths(path)
+        signature = _source_signature(path)
+        try:
+            with open(files["meta"]) as f:
+                meta = json.load(f)
+            if meta["source"] == signature:
+                return cls(meta["rows"], meta["cols"], *(np.load(files[name], mmap_mode='r')
+                                                         for name in ("types", "stations", "weights")),
+                           type_names=meta["type_names"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        grid_map = cls.parse(path)
+        # Each writer uses its own temporary names, as processes and threads may compile the
+        # same map at once. The meta file, which makes the cache valid, is written last.
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            for name in ("types", "stations", "weights"):
+                with open(files[name] + suffix, 'wb') as f:
+                    np.save(f, getattr(grid_map, name))
+                os.replace(files[name] + suffix, files[name])
+            with open(files["meta"] + suffix, 'w') as f:
+                json.dump({"source": signature, "rows": grid_map.rows, "cols": grid_map.cols,
+                           "type_names": grid_map.type_names}, f)
+            os.replace(files["meta"] + suffix, files["meta"])
+        except OSError as e:
+            print(f"Warning: could not cache '{path}': {e}")
+        return grid_map
+
+
+def find_map_file(name):
+    """Finds the map file of a config.txt map entry ("maps/kiva"), trying .grid then .map."""
+    if os.path.isfile(name):
+        return name
+    return next((name + ext for ext in (".grid", ".map") if os.path.isfile(name + ext)), None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile maps into memory-mappable .npy arrays.")
+    parser.add_argument("maps", nargs="+", help=".grid or .map files to compile.")
+    parser.add_argument("--no_cache", action="store_true", help="Only parse the files, without writing the .npy cache.")
+    args = parser.parse_args()
+
+    for path in args.maps:
+        grid_map = GridMap.load(path, use_cache=not args.no_cache)
+        counts = np.bincount(grid_map.types, minlength=len(grid_map.type_names))
+        print(f"{path}: {grid_map.rows} rows x {grid_map.cols} cols, "
+              + ", ".join(f"{count} {name}" for name, count in zip(grid_map.type_names, counts) if count))
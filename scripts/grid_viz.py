@@ -2,49 +2,28 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 
-# Load .map file
-def load_map(map_path):
-    with open(map_path, 'r') as f:
-        lines = [line.strip() for line in f.readlines()]
-    
-    # First line is: height,width
-    height, width = map(int, lines[0].split(','))
-
-    # The grid starts from line 4 onwards
-    grid_lines = lines[4:]
-
-    # Confirm that the number of lines matches height
-    assert len(grid_lines) == height, "Grid height does not match map file metadata"
-
-    grid = []
-    for line in grid_lines:
-        row = [1 if char == '.' else 0 for char in line]
-        grid.append(row)
+from grid_map import GridMap
+from plan_validator import vertex_conflicts
+from trajectories import MISSING, load_paths
 
-    return np.array(grid), width
+# Load a .map or .grid file as a (rows x cols) grid, 1 for free cells and 0 for obstacles
+def load_map(map_path):
+    grid_map = GridMap.load(map_path)
+    return grid_map.traversable.reshape(grid_map.rows, grid_map.cols).astype(int), grid_map.cols
 
 
 # Convert flat location ID to (x, y)
 def id_to_xy(loc_id, width):
     return loc_id % width, loc_id // width
 
-# Parse RHCR path file
+# Parse RHCR path file into an (agents x timesteps x 2) array of (x, y),
+# with NaN where an agent has no entry so its marker is hidden at that frame
 def parse_paths(path_file, width):
-    with open(path_file, 'r') as f:
-        lines = f.readlines()
-    num_agents = int(lines[0])
-    all_paths = []
-
-    for line in lines[1:num_agents+1]:
-        path = []
-        entries = line.strip().split(';')
-        for entry in entries:
-            if not entry: continue
-            loc_id, _, _ = entry.split(',')
-            x, y = id_to_xy(int(loc_id), width)
-            path.append((x, y))
-        all_paths.append(path)
-    return all_paths
+    locations = np.asarray(load_paths(path_file)[0])
+    x, y = id_to_xy(locations, width)
+    xy = np.stack([x, y], axis=-1).astype(float)
+    xy[locations == MISSING] = np.nan
+    return xy
 
 # Animate paths
 def animate_paths(grid, agents_paths):
@@ -71,34 +50,26 @@ def animate_paths(grid, agents_paths):
         marker, = ax.plot(x + 0.5, y + 0.5, 'o', markersize=8, color=colors(i))
         markers.append(marker)
 
-    # Collision tracking
-    collision_counter = [0]
-    collision_frames = set()
+    # Collisions are found once for the whole plan rather than per drawn frame
+    keys = agents_paths[..., 1] * grid.shape[1] + agents_paths[..., 0]
+    keys = np.where(np.isnan(keys), MISSING, keys).astype(int)
+    collision_frames = np.unique(vertex_conflicts(keys)["timestep"])
 
     # Animation update
     def update(frame):
-        positions = {}
-        for i, path in enumerate(agents_paths):
-            if frame < len(path):
-                x, y = path[frame]
-                pos = (x, y)
-                if pos not in positions:
-                    positions[pos] = [i]
-                else:
-                    positions[pos].append(i)
-
-        # Count collisions
-        for agents in positions.values():
-            if len(agents) > 1 and frame not in collision_frames:
-                collision_counter[0] += 1
-                collision_frames.add(frame)
-
-        # Move agents
+        # Agents sharing a cell are drawn with a small offset, by their rank among them
+        order = np.argsort(keys[:, frame], kind="stable")
+        ordered = keys[order, frame]
+        starts = np.r_[True, ordered[1:] != ordered[:-1]]
+        group = np.cumsum(starts) - 1
+        sizes = np.bincount(group)
+        rank = np.arange(len(order)) - np.flatnonzero(starts)[group]
+        offsets = np.empty(len(order))
+        offsets[order] = np.where(sizes[group] > 1, rank * 0.1, 0)
+
         for i, path in enumerate(agents_paths):
-            if frame < len(path):
-                x, y = path[frame]
-                offset = positions[(x, y)].index(i) * 0.1 if len(positions[(x, y)]) > 1 else 0
-                markers[i].set_data(x + 0.5 + offset, y + 0.5 + offset)
+            x, y = path[frame]
+            markers[i].set_data([x + 0.5 + offsets[i]], [y + 0.5 + offsets[i]])
 
         return markers
 
@@ -106,7 +77,7 @@ def animate_paths(grid, agents_paths):
     ani = animation.FuncAnimation(fig, update, frames=max_frames, interval=500, blit=True)
     plt.show()
 
-    print(f"Total number of collision frames: {collision_counter[0]}")
+    print(f"Total number of collision frames: {len(collision_frames)}")
 
 
 # === MAIN ===
@@ -1,247 +1,180 @@
+import argparse
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from grid_map import read_movingai_chars
 
 # --- Configuration ---
 # Standard MovingAI characters
 TRAVERSABLE_CHARS = {'.', 'G', 'W'} # Common traversable
 OBSTACLE_CHARS = {'@', 'O', 'T'}       # Common obstacles
 
-# You can extend this map if you have custom characters for specific types/stations
-# For example, if 'E' in your .map file means "Eject" with station "10000"
-# CHAR_TO_TYPE_STATION_MAP = {
-#     'E': ("Eject", "10000")
-# }
-# For now, we'll only handle standard Obstacle/Travel based on above sets.
-# If you need "Eject", you'll need to define how it's identified from the .map.
-# Let's assume for the sake of getting close to your example, 'E' maps to Eject.
-# And let's assume 'S' (Swamp) and 'W' (Water) are traversable with cost 1.
-# The example shows (x=1, y=3) as Eject. If map_data[3][1] was 'E', this would work.
-
-DEFAULT_TYPE_STATION_MAP = {
-   # Default for traversable
-   "__traversable__": ("Travel", "None"),
-   # Default for obstacle
-   "__obstacle__": ("Obstacle", "None"),
-   # --- Add your custom character mappings here ---
-        'r': ("Induct", "1000"),
-        'S': ("Induct", "1000")
-   #      'P': ("Pickup", "P123"),
-}
-
-# To match the example output's Eject cell, we need a way to specify it.
-# If map_data[3][1] (row 3, col 1) has a unique character, say 'X',
-# then we could add 'X': ("Eject", "10000") to DEFAULT_TYPE_STATION_MAP.
-# Or, we can hardcode a coordinate-based override for this example.
-# For this script, I'll show how to use a special character. Let's use 'E'.
-# If you don't have 'E' in your map, then the Eject line won't be produced as in the example.
+# Custom characters for specific types/stations, e.g. 'E' for an "Eject" cell of station
+# "10000". They are checked first and are traversable. Pass a JSON file with --char_map to
+# use other characters: {"E": ["Eject", "10000"], "S": ["Induct", "1000"], "@": ["Obstacle", "None"]}.
+# Characters that are neither custom, obstacle nor traversable are treated as obstacles.
 CUSTOM_CHAR_MAP = {
    'E': ("Eject", "10000"),
     'S': ("Induct", "1000") # As per example for cell (1,3)
 }
-# Merge custom chars into traversable/obstacle logic
-# For simplicity, we'll assume custom types are "traversable" in principle,
-# meaning they are nodes in the graph, not voids.
-# Their specific interactions (weights) are handled by the type.
+
+HEADER = "id,type,station,x,y,weight_to_NORTH,weight_to_WEST,weight_to_SOUTH,weight_to_EAST,weight_for_WAIT"
+
+# Cells are written column by column (id = x * height + y) with the size line "width,height",
+# which the engine reads as rows,cols. Its moves [1, -cols, -1, cols] are then y+1, x-1, y-1
+# and x+1, while the weight columns are written as NORTH (y-1), WEST, SOUTH (y+1) and EAST.
+# NORTH and SOUTH are therefore swapped for the engine; --engine_order writes them in the
+# engine's order instead (y+1 first), as in the bundled .grid maps.
+CHUNK_CELLS = 1 << 16
+
+
+def default_char_map():
+   """Returns the character mapping of the constants above, as {char: (type, station)}."""
+   char_map = {char: ("Travel", "None") for char in TRAVERSABLE_CHARS}
+   char_map.update({char: ("Obstacle", "None") for char in OBSTACLE_CHARS})
+   char_map.update(CUSTOM_CHAR_MAP)
+   return char_map
+
+
+def load_char_map(path):
+   """Reads a {char: [type, station]} JSON file; cells of type "Obstacle" are not traversable."""
+   with open(path) as f:
+       return {char: tuple(value) for char, value in json.load(f).items()}
+
 
 def parse_movingai_map(filepath):
-   """Parses a MovingAI .map file."""
-   map_data = []
-   height = 0
-   width = 0
+   """Parses a MovingAI .map file into a (height x width) character array, via grid_map."""
    try:
-       with open(filepath, 'r') as f:
-           lines = [line.strip() for line in f.readlines()]
-           
-           if not lines[0].startswith("type"):
-               raise ValueError("Missing 'type' line in map header.")
-           # type_line = lines.pop(0) # e.g. "type octile" - often ignored
-
-           height_line = next(line for line in lines if line.startswith("height"))
-           height = int(height_line.split()[1])
-           
-           width_line = next(line for line in lines if line.startswith("width"))
-           width = int(width_line.split()[1])
-           
-           map_keyword_index = -1
-           for i, line in enumerate(lines):
-               if line == "map":
-                   map_keyword_index = i
-                   break
-           
-           if map_keyword_index == -1:
-               raise ValueError("Missing 'map' keyword in map file.")
-
-           map_data_lines = lines[map_keyword_index+1 : map_keyword_index+1+height]
-           
-           if len(map_data_lines) != height:
-               raise ValueError(f"Map data has {len(map_data_lines)} rows, expected {height}.")
-
-           for r, line in enumerate(map_data_lines):
-               if len(line) != width:
-                   raise ValueError(f"Map row {r} has {len(line)} columns, expected {width}.")
-               map_data.append(list(line))
-               
+       map_data = read_movingai_chars(filepath)
    except FileNotFoundError:
        print(f"Error: File not found at {filepath}", file=sys.stderr)
        return None, 0, 0
    except Exception as e:
        print(f"Error parsing map file {filepath}: {e}", file=sys.stderr)
        return None, 0, 0
-       
+   height, width = map_data.shape
    return map_data, height, width
 
-def convert_map_to_custom_format(map_data, height, width, output_filepath):
-   """Converts parsed map data to the specified custom CSV-like format."""
-   if not map_data:
+
+def classify_cells(map_data, char_map=None):
+   """
+   Maps every character of the grid to its type and station.
+
+   :return: A (labels, codes, obstacle) triple: the "type,station" label of every distinct
+            character, the (height x width) index of every cell into labels and the
+            (height x width) obstacle mask.
+   """
+   char_map = default_char_map() if char_map is None else char_map
+   chars, codes = np.unique(np.asarray(map_data), return_inverse=True)
+   codes = codes.reshape(np.shape(map_data))
+   labels, obstacle_chars = [], []
+   for char in chars.tolist():
+       if char not in char_map:
+           count = int((codes == len(labels)).sum())
+           print(f"Warning: Unknown character '{char}' in {count} cells. Treating as Obstacle.", file=sys.stderr)
+       node_type, station = char_map.get(char, ("Obstacle", "None"))
+       labels.append(f"{node_type},{station}")
+       obstacle_chars.append(node_type == "Obstacle")
+   return labels, codes, np.array(obstacle_chars, dtype=bool)[codes]
+
+
+def neighbor_weights(obstacle):
+   """
+   Computes with shifted obstacle masks whether each cell can move north (y-1), west (x-1),
+   south (y+1) and east (x+1): both cells must be inside the map and not obstacles.
+
+   :return: A (height x width x 4) bool array in the order north, west, south, east.
+   """
+   free = ~obstacle
+   allowed = np.zeros(obstacle.shape + (4,), dtype=bool)
+   allowed[1:, :, 0] = free[1:, :] & free[:-1, :]
+   allowed[:, 1:, 1] = free[:, 1:] & free[:, :-1]
+   allowed[:-1, :, 2] = free[:-1, :] & free[1:, :]
+   allowed[:, :-1, 3] = free[:, :-1] & free[:, 1:]
+   return allowed
+
+
+def convert_map_to_custom_format(map_data, height, width, output_filepath, char_map=None, engine_order=False):
+   """
+   Converts parsed map data to the specified custom CSV-like format.
+
+   The types and weights of all cells are computed with array operations, and the lines
+   are written in chunks of CHUNK_CELLS cells, so no list of all lines is built.
+
+   :param char_map: {char: (type, station)} (default: default_char_map()).
+   :param engine_order: Write the y+1 weight first and the y-1 weight third, as the engine reads them.
+   """
+   if map_data is None:
        return
 
-   output_lines = []
-   output_lines.append("Grid size (x, y)")
-   output_lines.append(f"{width},{height}")
-   output_lines.append("id,type,station,x,y,weight_to_NORTH,weight_to_WEST,weight_to_SOUTH,weight_to_EAST,weight_for_WAIT")
-
-   # Pre-calculate cell properties (is_obstacle) for easier neighbor checks
-   is_obstacle_grid = [[False for _ in range(width)] for _ in range(height)]
-   cell_types_stations = {} # Store (type, station) for each (x,y)
-
-   for r_idx in range(height): # y
-       for c_idx in range(width): # x
-           char = map_data[r_idx][c_idx]
-           
-           # Check custom character map first
-           if char in CUSTOM_CHAR_MAP:
-               node_type, station = CUSTOM_CHAR_MAP[char]
-               # Assume custom types are not obstacles unless explicitly defined as such
-               # For weight calculation, we treat them as traversable spots.
-               is_obstacle_grid[r_idx][c_idx] = False 
-           elif char in OBSTACLE_CHARS:
-               node_type, station = DEFAULT_TYPE_STATION_MAP["__obstacle__"]
-               is_obstacle_grid[r_idx][c_idx] = True
-           elif char in TRAVERSABLE_CHARS:
-               node_type, station = DEFAULT_TYPE_STATION_MAP["__traversable__"]
-               is_obstacle_grid[r_idx][c_idx] = False
-           else:
-               # Default for unknown characters: treat as obstacle
-               print(f"Warning: Unknown character '{char}' at ({c_idx},{r_idx}). Treating as Obstacle.", file=sys.stderr)
-               node_type, station = DEFAULT_TYPE_STATION_MAP["__obstacle__"]
-               is_obstacle_grid[r_idx][c_idx] = True
-           cell_types_stations[(c_idx, r_idx)] = (node_type, station)
-
-
-   # Iterate column-major for ID generation
-   for c_idx in range(width):    # x-coordinate
-       for r_idx in range(height): # y-coordinate
-           node_id = c_idx * height + r_idx
-           
-           current_char = map_data[r_idx][c_idx]
-           node_type, station = cell_types_stations[(c_idx, r_idx)]
-           current_is_obstacle = is_obstacle_grid[r_idx][c_idx]
-
-           # --- Determine weights to neighbors ---
-           # Default weight for traversable to traversable is 1
-           # Default weight to obstacle or out-of-bounds is 'inf'
-           # If current cell is an obstacle, all outgoing weights are 'inf'
-           
-           # Weight to NORTH (y-1)
-           if current_is_obstacle or r_idx == 0 or is_obstacle_grid[r_idx-1][c_idx]:
-               w_n = "inf"
-           else:
-               w_n = "1"
-
-           # Weight to WEST (x-1)
-           if current_is_obstacle or c_idx == 0 or is_obstacle_grid[r_idx][c_idx-1]:
-               w_w = "inf"
-           else:
-               w_w = "1"
-
-           # Weight to SOUTH (y+1)
-           if current_is_obstacle or r_idx == height - 1 or is_obstacle_grid[r_idx+1][c_idx]:
-               w_s = "inf"
-           else:
-               w_s = "1"
-
-           # Weight to EAST (x+1)
-           if current_is_obstacle or c_idx == width - 1 or is_obstacle_grid[r_idx][c_idx+1]:
-               w_e = "inf"
-           else:
-               w_e = "1"
-           
-           weight_for_wait = "1" # As per example
-
-           output_lines.append(
-               f"{node_id},{node_type},{station},{c_idx},{r_idx},"
-               f"{w_n},{w_w},{w_s},{w_e},{weight_for_wait}"
-           )
-           
+   labels, codes, obstacle = classify_cells(map_data, char_map)
+   allowed = neighbor_weights(obstacle)
+   if engine_order:
+       allowed = allowed[..., [2, 1, 0, 3]]
+   # One of 16 weight strings per cell, from the four bits north, west, south, east.
+   bits = (allowed * np.array([8, 4, 2, 1])).sum(axis=-1)
+   weight_strings = [",".join("1" if code & bit else "inf" for bit in (8, 4, 2, 1)) for code in range(16)]
+   # Column-major ids: transposing makes id = x * height + y the flat index.
+   codes, bits = codes.T.ravel(), bits.T.ravel()
+
    try:
        with open(output_filepath, 'w') as f:
-           for line in output_lines:
-               f.write(line + "\n")
+           f.write(f"Grid size (x, y)\n{width},{height}\n{HEADER}\n")
+           for start in range(0, height * width, CHUNK_CELLS):
+               ids = range(start, min(start + CHUNK_CELLS, height * width))
+               x, y = np.divmod(np.arange(ids.start, ids.stop), height)
+               f.write("".join(f"{i},{labels[c]},{xi},{yi},{weight_strings[b]},1\n" for i, c, xi, yi, b in
+                               zip(ids, codes[ids.start:ids.stop].tolist(), x.tolist(), y.tolist(),
+                                   bits[ids.start:ids.stop].tolist())))
        print(f"Successfully converted map to {output_filepath}")
    except IOError:
        print(f"Error: Could not write to output file {output_filepath}", file=sys.stderr)
 
 
-if __name__ == "__main__":
-   if len(sys.argv) != 3:
-       print("Usage: python convert_map.py <input_map_file.map> <output_custom_file.txt>")
-       sys.exit(1)
+def convert_file(input_file, output_file, char_map=None, engine_order=False):
+   """Converts one MovingAI .map file; returns True on success."""
+   map_grid, h, w = parse_movingai_map(input_file)
+   if map_grid is None:
+       return False
+   convert_map_to_custom_format(map_grid, h, w, output_file, char_map, engine_order)
+   return os.path.isfile(output_file)
 
-   input_file = sys.argv[1]
-   output_file = sys.argv[2]
-
-   # --- Example of how you might define CHAR_TO_TYPE_STATION_MAP ---
-   # This would be better loaded from a config file or passed as arguments
-   # if you have many special types.
-   # For the 'Eject' in the example (id=40, x=1, y=3), if your .map file
-   # has a special character like 'E' at map_data[3][1], this map would handle it:
-   # CUSTOM_CHAR_MAP['E'] = ("Eject", "10000") # Already defined globally for demo
-
-   # Create a dummy .map file for testing, matching the example's implied structure somewhat
-   # for the Eject cell. We need height 37, width 77 for the IDs to match.
-   # Let's create a small one first for easier debugging.
-   # If you want to test the exact example (id=40 for Eject at x=1, y=3)
-   # you'll need a map that is at least 4 rows and 2 columns.
-   # And the character map_data[3][1] should be 'E' (based on CUSTOM_CHAR_MAP)
-   
-   # --- Create a dummy .map file for testing ---
-   # To make the script runnable and testable with the "Eject" example,
-   # let's assume the input .map might contain an 'E'
-   dummy_map_content = """type octile
-height 4
-width 5
-map
-.S.T.
-.@.E.
-G.W..
-...O.
-"""
-   # In this dummy map:
-   # (0,0) '.' -> id 0
-   # (0,1) '@' -> id 1
-   # (0,2) 'G' -> id 2
-   # (0,3) '.' -> id 3
-   # (1,0) 'S' -> id 4 (x=1, y=0 -> 1*4+0=4)
-   # (1,1) '.' -> id 5
-   # (1,2) '.' -> id 6
-   # (1,3) '.' -> id 7
-   # (3,1) 'E' -> id 13 (x=3, y=1 -> 3*4+1=13) -> Eject, 10000 (height is 4 here)
-
-   # If we use the height/width from the *example output* (77,37) for ID calculation:
-   # (x=1, y=3) -> id = 1 * 37 + 3 = 40.
-   # So, if our input map had map_data[3][1] = 'E', height=37, width=77,
-   # it would produce the "Eject" line.
-   
-   # For the script to run directly:
-   if input_file == "maps/kiva.map":
-       print("Using kiva.map for testing...")
-       with open("kiva.map", "w") as f:
-           f.write(dummy_map_content)
-       # Modify CUSTOM_CHAR_MAP for this dummy map if needed
-       # CUSTOM_CHAR_MAP['E'] = ("Eject", "10000") # Already set
 
-   map_grid, h, w = parse_movingai_map(input_file)
-   if map_grid:
-       convert_map_to_custom_format(map_grid, h, w, output_file)
-   else:
+def convert_directory(input_dir, output_dir, char_map=None, engine_order=False, max_workers=None):
+   """
+   Converts every .map file of a directory into a .grid file of the same name, in parallel.
+
+   :return: A dict mapping every input file to whether it was converted.
+   """
+   os.makedirs(output_dir, exist_ok=True)
+   inputs = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.endswith(".map"))
+   outputs = [os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + ".grid") for path in inputs]
+   with ProcessPoolExecutor(max_workers=max_workers) as pool:
+       results = pool.map(convert_file, inputs, outputs, [char_map] * len(inputs), [engine_order] * len(inputs))
+       return dict(zip(inputs, results))
+
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Convert MovingAI .map files into the engine's .grid format.")
+   parser.add_argument("input", help="A .map file, or a directory of .map files.")
+   parser.add_argument("output", help="The .grid file, or the output directory.")
+   parser.add_argument("--char_map", help="JSON file mapping characters to [type, station] (default: the built-in mapping).")
+   parser.add_argument("--engine_order", action="store_true",
+                       help="Write the y+1 weight in the first column and the y-1 weight in the third, as the engine reads them.")
+   parser.add_argument("-j", "--max_workers", type=int, default=None,
+                       help="Number of processes for a directory (default: CPU count).")
+   args = parser.parse_args()
+
+   char_map = load_char_map(args.char_map) if args.char_map else None
+   if os.path.isdir(args.input):
+       results = convert_directory(args.input, args.output, char_map, args.engine_order, args.max_workers)
+       failed = [path for path, ok in results.items() if not ok]
+       print(f"Converted {len(results) - len(failed)} of {len(results)} maps into {args.output}")
+       sys.exit(1 if failed else 0)
+   if not convert_file(args.input, args.output, char_map, args.engine_order):
        print("Failed to parse the input map. Exiting.")
-       sys.exit(1)
\ No newline at end of file
+       sys.exit(1)
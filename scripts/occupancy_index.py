@@ -0,0 +1,196 @@
+import argparse
+import os
+
+import numpy as np
+
+from grid_map import GridMap
+from trajectories import MISSING, _source_signature, load_paths
+
+INTERVAL_DTYPE = np.dtype([("agent", "i4"), ("location", "i4"), ("t_enter", "i4"), ("t_leave", "i4")])
+
+
+def occupancy_intervals(locations, sort=True):
+    """
+    Run-length encodes every agent's locations into occupancy intervals.
+
+    :param locations: An (agents x timesteps) array, as returned by load_paths.
+    :param sort: Sort the intervals by location and t_enter instead of by agent and t_enter.
+    :return: A structured array of INTERVAL_DTYPE, one record for every maximal stay of an
+             agent at a location (t_leave is the last timestep spent there, inclusive).
+    """
+    locations = np.asarray(locations)
+    num_agents, horizon = locations.shape
+    starts = np.ones(locations.shape, dtype=bool)
+    starts[:, 1:] = locations[:, 1:] != locations[:, :-1]
+    starts &= locations != MISSING
+    ends = np.ones(locations.shape, dtype=bool)
+    ends[:, :-1] = locations[:, :-1] != locations[:, 1:]
+    ends &= locations != MISSING
+    agents, t_enter = np.nonzero(starts)
+    _, t_leave = np.nonzero(ends)  # both row-major, so the i-th end closes the i-th start
+
+    intervals = np.zeros(len(agents), dtype=INTERVAL_DTYPE)
+    intervals["agent"] = agents
+    intervals["location"] = locations[agents, t_enter]
+    intervals["t_enter"] = t_enter
+    intervals["t_leave"] = t_leave
+    return intervals[np.lexsort((intervals["t_enter"], intervals["location"]))] if sort else intervals
+
+
+class OccupancyIndex:
+    """
+    An inverted index from location ids to the intervals agents spent there.
+
+    The intervals of every location are sorted by t_enter, together with the running
+    maximum of their t_leave, so the intervals overlapping a time range are found by two
+    binary searches. The index is saved next to paths.txt as paths.txt.occ.npz and rebuilt
+    when the size or modification time of paths.txt changes.
+    """
+
+    def __init__(self, path, arrays):
+        self.path = path
+        self.width = int(arrays["width"])
+        self.horizon = int(arrays["horizon"])
+        self.node_starts = arrays["node_starts"]
+        self.agent = arrays["agent"]
+        self.t_enter = arrays["t_enter"]
+        self.t_leave = arrays["t_leave"]
+        self.leave_max = arrays["leave_max"]
+
+    @property
+    def num_nodes(self):
+        return len(self.node_starts) - 1
+
+    @staticmethod
+    def index_path(path):
+        return path + ".occ.npz"
+
+    @classmethod
+    def build(cls, path, width=0):
+        """
+        Builds the index of a paths.txt file in one vectorized pass and saves it.
+
+        :param path: Path of paths.txt.
+        :param width: Number of map columns, needed for bounding box queries.
+        """
+        signature = _source_signature(path)
+        locations, _ = load_paths(path)
+        intervals = occupancy_intervals(locations)
+        num_nodes = int(intervals["location"].max()) + 1 if len(intervals) else 0
+        horizon = np.int64(locations.shape[1] + 1)
+        # Offsetting every location's t_leave by location * horizon keeps the running maximum
+        # from carrying over from one location to the next.
+        offset = intervals["location"].astype(np.int64) * horizon
+        arrays = {
+            "width": np.int64(width),
+            "horizon": horizon - 1,
+            "node_starts": np.searchsorted(intervals["location"], np.arange(num_nodes + 1)).astype(np.int64),
+            "agent": intervals["agent"],
+            "t_enter": intervals["t_enter"],
+            "t_leave": intervals["t_leave"],
+            "leave_max": (np.maximum.accumulate(intervals["t_leave"] + offset) - offset).astype(np.int32)
+            if len(intervals) else np.zeros(0, dtype=np.int32),
+            "source_size": np.int64(signature["size"]),
+            "source_mtime_ns": np.int64(signature["mtime_ns"]),
+        }
+        try:
+            tmp = cls.index_path(path) + ".tmp"
+            with open(tmp, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, cls.index_path(path))
+        except OSError as e:
+            print(f"Warning: could not save the occupancy index of '{path}': {e}")
+        return cls(path, arrays)
+
+    @classmethod
+    def open(cls, path, width=0):
+        """Opens the saved index of paths.txt, building it first if it is missing or outdated."""
+        signature = _source_signature(path)
+        try:
+            with np.load(cls.index_path(path)) as saved:
+                arrays = dict(saved)
+            if int(arrays["source_size"]) == signature["size"] and int(arrays["source_mtime_ns"]) == signature["mtime_ns"]:
+                if width:
+                    arrays["width"] = np.int64(width)
+                return cls(path, arrays)
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(path, width)
+
+    def cell(self, location, first_timestep=0, last_timestep=None):
+        """
+        Finds the intervals agents spent at a location that overlap a time range.
+
+        :param location: The location id.
+        :param first_timestep: The first timestep of the range.
+        :param last_timestep: The last timestep of the range, inclusive (default: the end).
+        :return: A structured array of INTERVAL_DTYPE sorted by t_enter.
+        """
+        if not 0 <= location < self.num_nodes:
+            return np.zeros(0, dtype=INTERVAL_DTYPE)
+        last_timestep = self.horizon if last_timestep is None else last_timestep
+        start, end = self.node_starts[location], self.node_starts[location + 1]
+        low = start + np.searchsorted(self.leave_max[start:end], first_timestep, side="left")
+        high = start + np.searchsorted(self.t_enter[start:end], last_timestep, side="right")
+        rows = np.arange(low, max(low, high))
+        rows = rows[self.t_leave[rows] >= first_timestep]
+        result = np.zeros(len(rows), dtype=INTERVAL_DTYPE)
+        result["agent"] = self.agent[rows]
+        result["location"] = location
+        result["t_enter"] = self.t_enter[rows]
+        result["t_leave"] = self.t_leave[rows]
+        return result
+
+    def cells(self, locations, first_timestep=0, last_timestep=None):
+        """
+        Finds the intervals spent at any of some locations that overlap a time range.
+
+        :return: A structured array of INTERVAL_DTYPE sorted by t_enter.
+        """
+        found = [self.cell(int(location), first_timestep, last_timestep) for location in np.unique(locations)]
+        found = np.concatenate(found) if found else np.zeros(0, dtype=INTERVAL_DTYPE)
+        return found[np.argsort(found["t_enter"], kind="stable")]
+
+    def region(self, x0, y0, x1, y1, first_timestep=0, last_timestep=None):
+        """
+        Finds the intervals spent inside a bounding box (inclusive corners) that overlap a time range.
+
+        :return: A structured array of INTERVAL_DTYPE sorted by t_enter.
+        """
+        if not self.width:
+            raise ValueError("Region queries need the map width; build or open the index with width=...")
+        xs, ys = np.meshgrid(np.arange(min(x0, x1), max(x0, x1) + 1), np.arange(min(y0, y1), max(y0, y1) + 1))
+        inside = (xs < self.width) & (xs >= 0) & (ys >= 0)
+        return self.cells((ys * self.width + xs)[inside], first_timestep, last_timestep)
+
+    def agents(self, locations, first_timestep=0, last_timestep=None):
+        """Returns the sorted ids of the agents that were at any of some locations during a time range."""
+        return np.unique(self.cells(locations, first_timestep, last_timestep)["agent"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find which agents occupied some cells during a time range.")
+    parser.add_argument("paths", help="paths.txt file.")
+    parser.add_argument("-m", "--map", help="Map file, to take the width from for --region.")
+    parser.add_argument("--width", type=int, default=0, help="Number of map columns, for --region.")
+    parser.add_argument("--cells", type=int, nargs="+", default=[], help="Location ids to query.")
+    parser.add_argument("--region", type=int, nargs=4, metavar=("X0", "Y0", "X1", "Y1"), help="Bounding box to query.")
+    parser.add_argument("--time", type=int, nargs=2, metavar=("T0", "T1"), default=(0, None),
+                        help="Time range to query, inclusive (default: the whole run).")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the saved index.")
+    args = parser.parse_args()
+
+    width = GridMap.load(args.map).cols if args.map else args.width
+    index = OccupancyIndex.build(args.paths, width) if args.rebuild else OccupancyIndex.open(args.paths, width)
+    print(f"{args.paths}: {len(index.agent)} occupancy intervals over {index.num_nodes} locations")
+    first, last = args.time
+    if args.region:
+        found = index.region(*args.region, first, last)
+    elif args.cells:
+        found = index.cells(args.cells, first, last)
+    else:
+        found = np.zeros(0, dtype=INTERVAL_DTYPE)
+    for record in found:
+        print("    agent {:4d} at {:6d} from {:6d} to {:6d}".format(*record.tolist()))
+    if args.region or args.cells:
+        print(f"{len(found)} intervals, {len(np.unique(found['agent']))} agents")
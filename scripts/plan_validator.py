@@ -0,0 +1,210 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from grid_map import GridMap, find_map_file
+from trajectories import MISSING, find_run_files, load_paths, time_chunks
+
+# One record per violation. agent2 is -1 for violations of a single agent; location2 is
+# the other end of the edge for edge conflicts and jumps; gap is the number of timesteps
+# between the two visits of a k-robust conflict.
+VIOLATION_DTYPE = np.dtype([("agent1", "i4"), ("agent2", "i4"), ("timestep", "i4"),
+                            ("location", "i4"), ("location2", "i4"), ("gap", "i4")])
+KINDS = ("vertex", "edge", "k_robust", "jump", "obstacle", "orientation")
+
+
+def _records(agent1, agent2, timestep, location, location2=None, gap=None):
+    records = np.zeros(len(agent1), dtype=VIOLATION_DTYPE)
+    records["agent1"], records["agent2"] = agent1, agent2
+    records["timestep"], records["location"] = timestep, location
+    records["location2"] = -1 if location2 is None else location2
+    records["gap"] = 0 if gap is None else gap
+    return records[np.lexsort((records["agent2"], records["agent1"], records["timestep"]))]
+
+
+def vertex_conflicts(locations, ignored=None):
+    """
+    Finds pairs of agents at the same location at the same timestep.
+
+    :param locations: An (agents x timesteps) location array.
+    :param ignored: Optional locations where agents may meet (the engine's "Magic" cells).
+    """
+    locations = np.asarray(locations)
+    # Sorting every timestep's column finds the timesteps with a shared location in one pass.
+    ordered = np.sort(locations, axis=0)
+    shared = (ordered[1:] == ordered[:-1]) & (ordered[1:] != MISSING)
+    if ignored is not None and len(ignored):
+        shared &= ~np.isin(ordered[1:], ignored)
+    columns = np.flatnonzero(shared.any(axis=0))
+    if not len(columns):
+        return np.zeros(0, dtype=VIOLATION_DTYPE)
+    # Pair every agent of a shared location with the first agent found there.
+    subset = locations[:, columns]
+    order = np.argsort(subset, axis=0, kind="stable")
+    ordered = np.take_along_axis(subset, order, axis=0)
+    shared = shared[:, columns]
+    rows = np.arange(1, len(subset))[:, None]
+    first = np.maximum.accumulate(np.r_[np.zeros((1, len(columns)), dtype=np.int64), np.where(shared, 0, rows)], axis=0)
+    p, c = np.nonzero(shared)
+    return _records(order[first[p + 1, c], c], order[p + 1, c], columns[c], ordered[p + 1, c])
+
+
+def edge_conflicts(locations):
+    """Finds pairs of agents that swap locations between two timesteps, reported at the later timestep."""
+    locations = np.asarray(locations)
+    found = []
+    for t0, t1, occupancy in time_chunks(locations[:, :-1]):
+        u = locations[:, t0:t1].astype(np.int64)
+        v = locations[:, t0 + 1:t1 + 1].astype(np.int64)
+        agents, steps = np.nonzero((u != v) & (u != MISSING) & (v != MISSING))
+        u, v = u[agents, steps], v[agents, steps]
+        inside = v < occupancy.shape[1]
+        agents, steps, u, v = agents[inside], steps[inside], u[inside], v[inside]
+        other = occupancy[steps, v]
+        swap = (other > agents)
+        swap[swap] = locations[other[swap], t0 + steps[swap] + 1] == u[swap]
+        found.append(_records(agents[swap], other[swap], t0 + steps[swap] + 1, u[swap], v[swap]))
+    return np.concatenate(found) if found else np.zeros(0, dtype=VIOLATION_DTYPE)
+
+
+def k_robust_conflicts(locations, k, ignored=None):
+    """
+    Finds agents that arrive at a location within k timesteps after another agent was there,
+    as the engine's --robust k forbids. Each arrival is reported once, against the closest
+    earlier visit (agent1 is the earlier agent, gap the number of timesteps in between).
+    """
+    locations = np.asarray(locations)
+    found = []
+    if k <= 0:
+        return np.zeros(0, dtype=VIOLATION_DTYPE)
+    for t0, t1, occupancy in time_chunks(locations, history=k):
+        current = locations[:, t0:t1]
+        previous = locations[:, t0 - 1:t1 - 1] if t0 > 0 else np.c_[np.full(len(locations), MISSING), current[:, :-1]]
+        agents, steps = np.nonzero((current != previous) & (current != MISSING))
+        arrived = current[agents, steps].astype(np.int64)
+        if ignored is not None and len(ignored):
+            keep = ~np.isin(arrived, ignored)
+            agents, steps, arrived = agents[keep], steps[keep], arrived[keep]
+        earlier = np.full(len(agents), -1, dtype=np.int64)
+        gaps = np.zeros(len(agents), dtype=np.int64)
+        for gap in range(1, k + 1):
+            open_ = (earlier < 0) & (t0 + steps - gap >= 0)
+            other = occupancy[steps[open_] + k - gap, arrived[open_]]
+            hit = (other >= 0) & (other != agents[open_])
+            index = np.flatnonzero(open_)[hit]
+            earlier[index], gaps[index] = other[hit], gap
+        hit = earlier >= 0
+        found.append(_records(earlier[hit], agents[hit], t0 + steps[hit], arrived[hit], gap=gaps[hit]))
+    return np.concatenate(found) if found else np.zeros(0, dtype=VIOLATION_DTYPE)
+
+
+def _moves(locations):
+    """Returns the agent, timestep, origin and destination of every move between two timesteps."""
+    u, v = locations[:, :-1], locations[:, 1:]
+    agents, timesteps = np.nonzero((u != v) & (u != MISSING) & (v != MISSING))
+    return agents, timesteps, u[agents, timesteps].astype(np.int64), v[agents, timesteps].astype(np.int64)
+
+
+def move_violations(locations, graph, orientations=None):
+    """
+    Checks every step of every agent against the map.
+
+    :return: A dict with "jump" (moves to a location that is not a neighbor, or along an
+             edge with infinite weight), "obstacle" (entries on obstacle cells) and
+             "orientation" (moves not in the heading of the agent, with rotation) records.
+    """
+    locations = np.asarray(locations)
+    agents, timesteps, u, v = _moves(locations)
+
+    direction = np.full(len(u), -1)
+    for d, step in enumerate(graph.moves):
+        direction[v - u == step] = d
+    size = graph.size
+    valid = (u >= 0) & (u < size) & (v >= 0) & (v < size) & (direction >= 0)
+    allowed = np.zeros(len(u), dtype=bool)
+    allowed[valid] = np.isfinite(graph.weights[u[valid], direction[valid]])
+    bad = ~allowed
+    violations = {"jump": _records(agents[bad], np.full(bad.sum(), -1), timesteps[bad] + 1, u[bad], v[bad])}
+
+    outside = (locations < 0) | (locations >= size)
+    on_obstacle = (locations != MISSING) & (outside | graph.obstacle[np.where(outside, 0, locations)])
+    occ_agents, occ_times = np.nonzero(on_obstacle)
+    violations["obstacle"] = _records(occ_agents, np.full(len(occ_agents), -1), occ_times,
+                                      locations[occ_agents, occ_times])
+
+    if orientations is not None:
+        heading = np.asarray(orientations)[agents, timesteps]
+        wrong = (heading >= 0) & allowed & (direction != heading)
+        violations["orientation"] = _records(agents[wrong], np.full(wrong.sum(), -1), timesteps[wrong] + 1,
+                                             u[wrong], v[wrong])
+    else:
+        violations["orientation"] = np.zeros(0, dtype=VIOLATION_DTYPE)
+    return violations
+
+
+def validate(locations, graph=None, k_robust=0, orientations=None):
+    """
+    Validates a whole plan.
+
+    :param locations: An (agents x timesteps) location array, e.g. from trajectories.load_paths.
+    :param graph: Optional GridMap of the map, required for the jump, obstacle and orientation checks.
+    :param k_robust: The engine's --robust value. Edge conflicts are only checked for k_robust = 0,
+                     as the engine does, because a swap is a k-robust conflict for k >= 1.
+    :param orientations: Optional orientation array; headings are checked where it is not -1.
+    :return: A dict mapping each kind in KINDS to a structured array of VIOLATION_DTYPE records.
+    """
+    ignored = np.flatnonzero(graph.type_mask("Magic")) if graph is not None else None
+    violations = {"vertex": vertex_conflicts(locations, ignored)}
+    violations["edge"] = edge_conflicts(locations) if k_robust == 0 else np.zeros(0, dtype=VIOLATION_DTYPE)
+    violations["k_robust"] = k_robust_conflicts(locations, k_robust, ignored)
+    if graph is not None:
+        violations.update(move_violations(locations, graph, orientations))
+    else:
+        for kind in ("jump", "obstacle", "orientation"):
+            violations[kind] = np.zeros(0, dtype=VIOLATION_DTYPE)
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a 'lifelong' plan (paths.txt) for conflicts and illegal moves.")
+    parser.add_argument("runs", nargs="+", help="Run output folders or paths.txt files.")
+    parser.add_argument("-m", "--map", help="Map file (default: the map in config.txt, as .grid or .map).")
+    parser.add_argument("--robust", type=int, default=None, help="k of the k-robust check (default: robust in config.txt).")
+    parser.add_argument("--show", type=int, default=10, help="Number of violations listed per kind (default: 10).")
+    parser.add_argument("--report", help="Save all violations of the last run as JSON.")
+    args = parser.parse_args()
+
+    failed = False
+    for run in args.runs:
+        try:
+            paths_file, config = find_run_files(run)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            failed = True
+            continue
+        map_file = args.map
+        if map_file is None and "map" in config:
+            map_file = find_map_file(config["map"])
+        k = args.robust if args.robust is not None else int(config.get("robust", 0))
+        locations, orientations = load_paths(paths_file)
+        graph = GridMap.load(map_file) if map_file else None
+        violations = validate(locations, graph, k, orientations if int(config.get("rotate", 0)) else None)
+
+        total = sum(len(v) for v in violations.values())
+        failed = failed or total > 0
+        print(f"{run}: {locations.shape[0]} agents x {locations.shape[1]} timesteps, k = {k}, "
+              f"map {map_file or 'not checked'}: " + ", ".join(f"{len(violations[kind])} {kind}" for kind in KINDS))
+        for kind in KINDS:
+            for record in violations[kind][:args.show]:
+                print(f"    {kind}: agent {record['agent1']}"
+                      + (f" and agent {record['agent2']}" if record['agent2'] >= 0 else "")
+                      + f" at timestep {record['timestep']}, location {record['location']}"
+                      + (f" -> {record['location2']}" if record['location2'] >= 0 else "")
+                      + (f" (gap {record['gap']})" if record['gap'] else ""))
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({kind: [dict(zip(VIOLATION_DTYPE.names, map(int, r))) for r in records]
+                           for kind, records in violations.items()}, f)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,237 @@
+import argparse
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Fields of the rows the solvers append to solver.csv, one row per replanning call.
+# Every row ends with "timestep,num_drives,seed" written by the simulation; ECBS also
+# appends its planning window. Slots a solver fills with a copy or a constant are
+# prefixed with an underscore.
+_TAIL = [("timestep", "i8"), ("num_drives", "i8"), ("seed", "i8")]
+SCHEMAS = {
+    # runtime, high-level (priority tree) and low-level (A*) search effort, cost of the
+    # solution, sum of the agents' individual shortest path costs, mean path length and
+    # number of collisions left in the root node.
+    "PBS": [("runtime", "f8"), ("hl_expanded", "i8"), ("hl_generated", "i8"),
+            ("ll_expanded", "i8"), ("ll_generated", "i8"), ("solution_cost", "f8"),
+            ("min_sum_of_costs", "f8"), ("avg_path_length", "f8"), ("num_collisions", "i8")] + _TAIL,
+    # As PBS, with the focal search lower bound instead of the sum of individual costs.
+    "ECBS": [("runtime", "f8"), ("hl_expanded", "i8"), ("hl_generated", "i8"),
+             ("ll_expanded", "i8"), ("ll_generated", "i8"), ("solution_cost", "f8"),
+             ("min_f_val", "f8"), ("avg_path_length", "f8"), ("num_collisions", "i8")] + _TAIL
+            + [("window", "i8")],
+    # Number of wait commands issued to resolve conflicts and low-level search effort.
+    "LRA": [("runtime", "f8"), ("num_wait_commands", "i8"), ("_num_wait_commands", "i8"),
+            ("ll_expanded", "i8"), ("ll_generated", "i8"), ("_unused5", "i8"),
+            ("_unused6", "i8"), ("_unused7", "i8"), ("_unused8", "i8")] + _TAIL,
+    # Number of restarts with a new agent order, low-level search effort and solution cost.
+    "WHCA": [("runtime", "f8"), ("num_restarts", "i8"), ("_num_restarts", "i8"),
+             ("ll_expanded", "i8"), ("ll_generated", "i8"), ("solution_cost", "f8"),
+             ("min_sum_of_costs", "f8"), ("avg_path_length", "f8"), ("_unused8", "i8")] + _TAIL,
+    # Independence detection: number of independent groups and size of the largest one.
+    "ID": [("runtime", "f8"), ("num_groups", "i8"), ("largest_group", "i8"),
+           ("_unused3", "i8"), ("_unused4", "i8"), ("_unused5", "i8"), ("_unused6", "i8"),
+           ("_unused7", "i8"), ("_unused8", "i8")] + _TAIL,
+}
+
+
+def schema_name(solver):
+    """Maps a solver name from config.txt ("PBS", "ID+PBS", ...) to its SCHEMAS key."""
+    solver = solver.upper()
+    if solver.startswith("ID"):
+        return "ID"
+    if solver not in SCHEMAS:
+        raise ValueError(f"Unknown solver '{solver}', expected one of {', '.join(SCHEMAS)}")
+    return solver
+
+
+def read_solver_name(output_folder):
+    """Reads the solver name from the config.txt of a run folder, or returns None."""
+    path = os.path.join(output_folder, "config.txt")
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name.strip() == "solver":
+                return value.strip()
+    return None
+
+
+def load_solver_csv(path, solver="PBS"):
+    """
+    Reads solver.csv into a NumPy structured array with one record per replanning call.
+
+    The whole file is converted by a single vectorized call; only files with malformed
+    rows (e.g. a last row the engine is still writing) are parsed line by line.
+
+    :param path: Path of solver.csv.
+    :param solver: The solver that wrote the file, as in config.txt.
+    :return: A structured array with the fields of SCHEMAS[solver].
+    """
+    dtype = np.dtype(SCHEMAS[schema_name(solver)])
+    columns = len(dtype.names)
+    with open(path) as f:
+        text = f.read().replace('\r', '').strip()
+    if not text:
+        return np.zeros(0, dtype=dtype)
+
+    try:
+        table = np.loadtxt(io.StringIO(text), delimiter=',', ndmin=2)
+    except ValueError:
+        table = None
+    if table is None or table.shape[1] != columns:
+        parsed = (_parse_row(line, columns) for line in text.split('\n'))
+        table = np.array([row for row in parsed if row is not None], dtype=np.float64).reshape(-1, columns)
+
+    records = np.zeros(len(table), dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        records[name] = table[:, i]
+    return records
+
+
+def _parse_row(line, columns):
+    fields = line.split(',')
+    if len(fields) != columns:
+        return None
+    try:
+        return [float(v) for v in fields]
+    except ValueError:
+        return None
+
+
+def load_run(output_folder, solver=None):
+    """
+    Reads the solver.csv of a run folder, taking the solver from its config.txt.
+
+    :return: A structured array as returned by load_solver_csv.
+    """
+    solver = solver or read_solver_name(output_folder) or "PBS"
+    return load_solver_csv(os.path.join(output_folder, "solver.csv"), solver)
+
+
+def load_runs(output_folders, solver=None, max_workers=8):
+    """
+    Reads the solver.csv of many run folders with a pool of threads.
+
+    :return: A dict mapping each folder to its structured array.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(output_folders, pool.map(lambda folder: load_run(folder, solver), output_folders)))
+
+
+def runtime_percentiles(records, window=None, q=(50, 95, 99)):
+    """
+    Computes runtime percentiles, overall or per window of simulation timesteps.
+
+    :param records: A structured array from load_solver_csv.
+    :param window: Length of the timestep windows, or None for a single window.
+    :param q: The percentiles (0-100) to compute.
+    :return: A dict with "start" (first timestep of every window), "calls" (replanning
+             calls per window) and one array per percentile, named "p50", "p95", ...
+    """
+    runtime = records["runtime"]
+    timestep = records["timestep"]
+    bins = np.zeros(len(records), dtype=np.int64) if window is None else timestep // window
+    order = np.lexsort((runtime, bins))
+    bins, runtime = bins[order], runtime[order]
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]]) if len(bins) else np.zeros(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(bins)])
+
+    result = {"start": bins[starts] * (window or 0), "calls": counts}
+    for p in q:
+        # Linear interpolation between the closest ranks within each window, as np.percentile.
+        position = starts + (counts - 1) * (p / 100.0)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        result[f"p{p:g}"] = runtime[low] + (runtime[high] - runtime[low]) * (position - low)
+    return result
+
+
+def expansion_rates(records):
+    """
+    Computes node expansion and generation rates in nodes per second.
+
+    :return: A dict with, for every *_expanded and *_generated field, the per-call rate
+             (array) and the overall rate (total nodes over total runtime).
+    """
+    runtime = records["runtime"]
+    total = runtime.sum()
+    rates = {}
+    for name in records.dtype.names:
+        if name.endswith("_expanded") or name.endswith("_generated"):
+            nodes = records[name].astype(np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rates[f"{name}_per_s"] = np.where(runtime > 0, nodes / runtime, np.nan)
+            rates[f"{name}_per_s_overall"] = nodes.sum() / total if total > 0 else np.nan
+    return rates
+
+
+def runtime_timeline(records, smooth=1):
+    """
+    Builds the timeline of runtime against simulation timestep.
+
+    :param records: A structured array from load_solver_csv.
+    :param smooth: Number of consecutive calls in the moving average of the runtime.
+    :return: A dict with the "timestep", "runtime", "runtime_smoothed" and
+             "cumulative_runtime" arrays, ordered by timestep.
+    """
+    order = np.argsort(records["timestep"], kind="stable")
+    timestep = records["timestep"][order]
+    runtime = records["runtime"][order]
+    cumulative = np.cumsum(runtime)
+    smooth = max(1, min(smooth, len(runtime))) if len(runtime) else 1
+    padded = np.r_[0.0, cumulative]
+    counts = np.minimum(np.arange(1, len(runtime) + 1), smooth)
+    smoothed = (padded[1:] - padded[np.maximum(np.arange(1, len(runtime) + 1) - smooth, 0)]) / counts
+    return {"timestep": timestep, "runtime": runtime, "runtime_smoothed": smoothed,
+            "cumulative_runtime": cumulative}
+
+
+def summarize(records):
+    """
+    Summarizes one run's replanning calls.
+
+    :return: A dict with the number of calls, the total, mean, p50, p95, p99 and max
+             runtime and the overall expansion rates.
+    """
+    summary = {"calls": len(records)}
+    if not len(records):
+        return summary
+    runtime = records["runtime"]
+    percentiles = np.percentile(runtime, [50, 95, 99])
+    summary.update({"runtime_total": runtime.sum(), "runtime_mean": runtime.mean(),
+                    "runtime_p50": percentiles[0], "runtime_p95": percentiles[1],
+                    "runtime_p99": percentiles[2], "runtime_max": runtime.max()})
+    summary.update({name: value for name, value in expansion_rates(records).items() if name.endswith("_overall")})
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the per-window solver statistics in solver.csv.")
+    parser.add_argument("runs", nargs="+", help="Run output folders (or solver.csv files).")
+    parser.add_argument("--solver", help="Solver that wrote the files (default: read from config.txt).")
+    parser.add_argument("--window", type=int, default=None,
+                        help="Also print runtime percentiles per window of this many timesteps.")
+    parser.add_argument("--timeline", help="Save the runtime-versus-timestep timeline of the first run as CSV.")
+    parser.add_argument("--smooth", type=int, default=1, help="Moving-average length of the timeline (default: 1).")
+    args = parser.parse_args()
+
+    folders = [(os.path.dirname(path) or ".") if path.endswith(".csv") else path for path in args.runs]
+    runs = load_runs(folders, args.solver)
+    for folder, records in runs.items():
+        print(f"{folder}: " + ", ".join(f"{name} {value:.4g}" for name, value in summarize(records).items()))
+        if args.window:
+            table = runtime_percentiles(records, args.window)
+            print("    start   calls        p50        p95        p99")
+            for row in zip(table["start"], table["calls"], table["p50"], table["p95"], table["p99"]):
+                print("    {:5d} {:7d} {:10.4g} {:10.4g} {:10.4g}".format(*row))
+
+    if args.timeline:
+        timeline = runtime_timeline(next(iter(runs.values())), args.smooth)
+        names = list(timeline)
+        np.savetxt(args.timeline, np.column_stack([timeline[name] for name in names]), delimiter=',',
+                   header=','.join(names), comments='', fmt='%.6g')
+        print(f"Timeline saved to {args.timeline}")
@@ -0,0 +1,144 @@
+import argparse
+import os
+
+import numpy as np
+
+from occupancy_index import occupancy_intervals
+from grid_map import GridMap, find_map_file, label_components
+from task_metrics import load_tasks
+from trajectories import find_run_file, find_run_files, load_paths
+
+STALL_DTYPE = np.dtype([("agent", "i4"), ("location", "i4"), ("t_enter", "i4"), ("t_leave", "i4"),
+                        ("duration", "i4"), ("goal", "i4")])
+
+
+def find_stalls(locations, tasks=None, min_duration=20):
+    """
+    Finds agents that stay at one location for a long time while they have a task elsewhere.
+
+    The locations are run-length encoded, and every run of at least min_duration timesteps
+    is matched with the agent's pending task at its start: the first task finished after it
+    began, or the unfinished one.
+
+    :param locations: The (agents x timesteps) locations from trajectories.load_paths.
+    :param tasks: A structured array from task_metrics.load_tasks. Without it, every long
+                  run counts as a stall and the goal is -1.
+    :param min_duration: Minimum number of timesteps at one location.
+    :return: A structured array of STALL_DTYPE ordered by agent and t_enter.
+    """
+    runs = occupancy_intervals(locations, sort=False)
+    duration = runs["t_leave"] - runs["t_enter"] + 1
+    runs, duration = runs[duration >= min_duration], duration[duration >= min_duration]
+
+    stalls = np.zeros(len(runs), dtype=STALL_DTYPE)
+    for name in ("agent", "location", "t_enter", "t_leave"):
+        stalls[name] = runs[name]
+    stalls["duration"] = duration
+    stalls["goal"] = -1
+    if tasks is None:
+        return stalls
+
+    # Tasks are ordered by agent and finish time, with the unfinished one last, so one
+    # key per task is sorted and a binary search finds the pending task of every run.
+    horizon = np.int64(np.asarray(locations).shape[1] + 2)
+    tasks = tasks[tasks["index"] > 0]
+    finish = np.where(tasks["time"] < 0, horizon - 1, tasks["time"])
+    keys = tasks["agent"] * horizon + finish
+    pending = np.searchsorted(keys, runs["agent"] * horizon + runs["t_enter"], side="right")
+    found = pending < len(keys)
+    found[found] = tasks["agent"][pending[found]] == runs["agent"][found]
+    stalls["goal"][found] = tasks["location"][pending[found]]
+    return stalls[found & (stalls["goal"] != stalls["location"])]
+
+
+def find_clusters(stalls, width, min_agents=2):
+    """
+    Groups stalls that overlap in time at 4-neighboring locations into deadlock clusters.
+
+    :param stalls: A structured array from find_stalls.
+    :param width: Number of map columns.
+    :param min_agents: Minimum number of agents in a cluster.
+    :return: A list of dicts with the "agents" and "locations" of every cluster, the span of
+             its stalls ("start", "end") and the window all of them overlap ("overlap_start",
+             "overlap_end", empty if start > end), ordered by start.
+    """
+    # Sorting by location and t_enter, with the running maximum of t_leave per location,
+    # bounds the candidates at every neighbor to the stalls that can overlap in time.
+    horizon = np.int64(stalls["t_leave"].max()) + 2 if len(stalls) else np.int64(1)
+    order = np.lexsort((stalls["t_enter"], stalls["location"]))
+    location = stalls["location"].astype(np.int64)
+    base = location[order] * horizon
+    enter_keys = base + stalls["t_enter"][order]
+    leave_max = np.maximum.accumulate(base + stalls["t_leave"][order]) if len(stalls) else base
+    first, second = [], []
+    for offset in (1, -1, width, -width):
+        neighbor = location + offset
+        valid = (neighbor >= 0) if abs(offset) == width else (neighbor // width == location // width)
+        low = np.searchsorted(leave_max, neighbor * horizon + stalls["t_enter"], side="left")
+        high = np.searchsorted(enter_keys, neighbor * horizon + stalls["t_leave"], side="right")
+        counts = np.where(valid, np.maximum(high - low, 0), 0)
+        i = np.repeat(np.arange(len(stalls)), counts)
+        j = order[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(low, counts)]
+        overlap = (stalls["location"][j] == neighbor[i]) & (stalls["t_leave"][j] >= stalls["t_enter"][i])
+        first.append(i[overlap])
+        second.append(j[overlap])
+    first, second = np.concatenate(first), np.concatenate(second)
+
+    labels = label_components(len(stalls), first, second)
+
+    clusters = []
+    order = np.argsort(labels, kind="stable")
+    _, starts, sizes = np.unique(labels[order], return_index=True, return_counts=True)
+    for start, size in zip(starts[sizes >= min_agents], sizes[sizes >= min_agents]):
+        members = stalls[order[start:start + size]]
+        agents = np.unique(members["agent"])
+        if len(agents) < min_agents:
+            continue
+        clusters.append({"agents": agents.tolist(), "locations": np.unique(members["location"]).tolist(),
+                         "start": int(members["t_enter"].min()), "end": int(members["t_leave"].max()),
+                         "overlap_start": int(members["t_enter"].max()), "overlap_end": int(members["t_leave"].min())})
+    return sorted(clusters, key=lambda cluster: cluster["start"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find stalled agents and deadlock clusters in a 'lifelong' run.")
+    parser.add_argument("run", help="Run output folder or paths.txt file.")
+    parser.add_argument("-m", "--map", help="Map file (default: the map in config.txt, as .grid or .map).")
+    parser.add_argument("--min_duration", type=int, default=20,
+                        help="Minimum number of timesteps at one location (default: 20).")
+    parser.add_argument("--min_agents", type=int, default=2, help="Minimum number of agents in a cluster (default: 2).")
+    parser.add_argument("--show", type=int, default=10, help="Number of stalls and clusters listed (default: 10).")
+    parser.add_argument("--csv", help="Save all stalls as CSV.")
+    args = parser.parse_args()
+
+    try:
+        paths_file, config = find_run_files(args.run)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    map_file = args.map
+    if map_file is None and "map" in config:
+        map_file = find_map_file(config["map"])
+    if map_file is None:
+        print("Error: no map found, pass it with -m")
+        raise SystemExit(1)
+
+    tasks_file = find_run_file(os.path.dirname(paths_file) if os.path.isfile(args.run) else args.run, "tasks.txt")
+    if tasks_file is None:
+        print("Warning: no tasks.txt found, every long stay counts as a stall")
+    locations, _ = load_paths(paths_file)
+    stalls = find_stalls(locations, load_tasks(tasks_file) if tasks_file else None, args.min_duration)
+    clusters = find_clusters(stalls, GridMap.load(map_file).cols, args.min_agents)
+
+    print(f"{args.run}: {len(stalls)} stalls of at least {args.min_duration} timesteps "
+          f"({len(np.unique(stalls['agent']))} agents), {len(clusters)} deadlock clusters")
+    for stall in stalls[np.argsort(-stalls["duration"], kind="stable")][:args.show]:
+        print(f"    agent {stall['agent']} at {stall['location']} from {stall['t_enter']} to {stall['t_leave']}"
+              f" ({stall['duration']} timesteps)" + (f", goal {stall['goal']}" if stall['goal'] >= 0 else ""))
+    for cluster in sorted(clusters, key=lambda c: -len(c["agents"]))[:args.show]:
+        print(f"    cluster of {len(cluster['agents'])} agents {cluster['agents']} at {cluster['locations']},"
+              f" timesteps {cluster['start']}-{cluster['end']}")
+    if args.csv:
+        np.savetxt(args.csv, np.column_stack([stalls[name] for name in STALL_DTYPE.names]), delimiter=',',
+                   header=','.join(STALL_DTYPE.names), comments='', fmt='%d')
+        print(f"Stalls saved to {args.csv}")
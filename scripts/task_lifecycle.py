@@ -0,0 +1,137 @@
+import argparse
+import os
+
+import numpy as np
+
+from task_metrics import finished_mask, load_tasks
+from trajectories import MISSING, find_run_file, load_paths
+
+# A task starts when the agent finishes its previous one (or at 0) and ends when it reaches
+# the task location. The engine has no dwell time at stations and tasks.txt records no
+# durations (its third field is the heuristic distance to the task location), so a task's
+# timesteps split into travel (the location changes), turning (only the orientation
+# changes, runs with --rotate) and waiting (neither).
+BREAKDOWN_DTYPE = np.dtype([("agent", "i4"), ("location", "i4"), ("start", "i4"), ("finish", "i4"),
+                            ("flowtime", "i4"), ("travel", "i4"), ("turning", "i4"), ("waiting", "i4"),
+                            ("distance", "f8"), ("detour", "f8")])
+
+
+def task_breakdown(tasks, locations, orientations=None):
+    """
+    Splits the time of every finished task into travel, turning and waiting.
+
+    :param tasks: A structured array from task_metrics.load_tasks.
+    :param locations: The (agents x timesteps) locations from trajectories.load_paths.
+    :param orientations: The matching orientations, to count turns in place.
+    :return: A structured array of BREAKDOWN_DTYPE with one record per finished task. The
+             detour is the travel and turning steps beyond the heuristic distance.
+    """
+    locations = np.asarray(locations)
+    horizon = locations.shape[1]
+    moved = np.zeros(locations.shape, dtype=np.int32)
+    moved[:, 1:] = (locations[:, 1:] != locations[:, :-1]) & (locations[:, 1:] != MISSING) & (locations[:, :-1] != MISSING)
+    turned = np.zeros(locations.shape, dtype=np.int32)
+    if orientations is not None:
+        orientations = np.asarray(orientations)
+        turned[:, 1:] = (orientations[:, 1:] != orientations[:, :-1]) & (moved[:, 1:] == 0)
+    # Number of moves and turns in (0, t] for every agent and timestep.
+    moves = np.cumsum(moved, axis=1)
+    turns = np.cumsum(turned, axis=1)
+
+    finished = finished_mask(tasks)
+    start = np.r_[0, tasks["time"][:-1]][finished]
+    done = tasks[finished]
+    agent = done["agent"]
+    finish = np.minimum(done["time"], horizon - 1)
+    start = np.minimum(start, finish)
+
+    breakdown = np.zeros(len(done), dtype=BREAKDOWN_DTYPE)
+    breakdown["agent"] = agent
+    breakdown["location"] = done["location"]
+    breakdown["start"] = start
+    breakdown["finish"] = done["time"]
+    breakdown["flowtime"] = finish - start
+    breakdown["travel"] = moves[agent, finish] - moves[agent, start]
+    breakdown["turning"] = turns[agent, finish] - turns[agent, start]
+    breakdown["waiting"] = breakdown["flowtime"] - breakdown["travel"] - breakdown["turning"]
+    breakdown["distance"] = done["distance"]
+    breakdown["detour"] = breakdown["travel"] + breakdown["turning"] - done["distance"]
+    return breakdown
+
+
+def waiting_dominated(breakdown, share=0.5):
+    """Marks the tasks that spent more than share of their flowtime waiting."""
+    return breakdown["waiting"] > share * breakdown["flowtime"]
+
+
+def group_stats(breakdown, by="location"):
+    """
+    Aggregates the breakdown per task location (station) or per agent.
+
+    :param by: "location" or "agent".
+    :return: A dict of arrays: the group keys, the number of tasks, the mean flowtime,
+             travel, turning, waiting and detour, the 95th percentile of the waiting time
+             and the share of the time spent waiting.
+    """
+    keys, inverse = np.unique(breakdown[by], return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    stats = {by: keys, "tasks": counts}
+    for name in ("flowtime", "travel", "turning", "waiting", "detour"):
+        stats[f"{name}_mean"] = np.bincount(inverse, weights=breakdown[name], minlength=len(keys)) / np.maximum(counts, 1)
+
+    # Nearest-rank 95th percentile of the waiting time within every group.
+    order = np.lexsort((breakdown["waiting"], inverse))
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    ranks = starts + np.ceil(0.95 * counts).astype(np.int64) - 1
+    stats["waiting_p95"] = breakdown["waiting"][order][np.maximum(ranks, starts)] if len(keys) else np.zeros(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats["waiting_share"] = np.where(stats["flowtime_mean"] > 0, stats["waiting_mean"] / stats["flowtime_mean"], 0.0)
+    return stats
+
+
+def save_stats(stats, path):
+    names = list(stats)
+    np.savetxt(path, np.column_stack([stats[name] for name in names]), delimiter=',', header=','.join(names),
+               comments='', fmt=['%d', '%d'] + ['%.6g'] * (len(names) - 2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the time of every task of a run into travel, turning and waiting.")
+    parser.add_argument("run", help="Run output folder.")
+    parser.add_argument("--share", type=float, default=0.5,
+                        help="Flag tasks that spent more than this share of their time waiting (default: 0.5).")
+    parser.add_argument("--top", type=int, default=10, help="Number of stations and agents listed (default: 10).")
+    parser.add_argument("--save", help="Folder to save the per-task, per-station and per-agent tables to as CSV.")
+    args = parser.parse_args()
+
+    paths_file, tasks_file = find_run_file(args.run, "paths.txt"), find_run_file(args.run, "tasks.txt")
+    if paths_file is None or tasks_file is None:
+        print(f"Error: '{args.run}' needs both paths.txt and tasks.txt")
+        raise SystemExit(1)
+    locations, orientations = load_paths(paths_file)
+    breakdown = task_breakdown(load_tasks(tasks_file), locations, orientations)
+    flagged = waiting_dominated(breakdown, args.share)
+
+    total = max(int(breakdown["flowtime"].sum()), 1)
+    print(f"{len(breakdown)} finished tasks: " + ", ".join(
+        f"{name} {breakdown[name].sum() / total:.1%}" for name in ("travel", "turning", "waiting")) +
+        f", mean detour {breakdown['detour'].mean() if len(breakdown) else 0:.2f} steps")
+    print(f"{int(flagged.sum())} tasks ({flagged.mean() if len(flagged) else 0:.1%}) spent more than {args.share:.0%} of their time waiting")
+
+    for by in ("location", "agent"):
+        stats = group_stats(breakdown, by)
+        print(f"Most waiting per {by}:")
+        print(f"    {by:>8} {'tasks':>6} {'flowtime':>9} {'travel':>7} {'waiting':>8} {'p95 wait':>9} {'share':>6}")
+        for i in np.argsort(-stats["waiting_mean"], kind="stable")[:args.top]:
+            print(f"    {stats[by][i]:8d} {stats['tasks'][i]:6d} {stats['flowtime_mean'][i]:9.2f} {stats['travel_mean'][i]:7.2f} "
+                  f"{stats['waiting_mean'][i]:8.2f} {stats['waiting_p95'][i]:9.0f} {stats['waiting_share'][i]:6.1%}")
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            save_stats(stats, os.path.join(args.save, f"lifecycle_per_{by}.csv"))
+
+    if args.save:
+        names = list(BREAKDOWN_DTYPE.names)
+        np.savetxt(os.path.join(args.save, "lifecycle_tasks.csv"),
+                   np.column_stack([breakdown[name] for name in names] + [flagged]), delimiter=',',
+                   header=','.join(names + ["waiting_dominated"]), comments='', fmt=['%d'] * 8 + ['%.6g'] * 2 + ['%d'])
+        print(f"Tables saved to {args.save}")
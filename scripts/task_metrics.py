@@ -0,0 +1,222 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from trajectories import find_run_file
+
+# tasks.txt lists, after the number of agents, one line per agent with a
+# "location,time,distance;" record per task. The first record is the start location at
+# time 0, finished tasks have the timestep they were finished at and unfinished ones -1.
+# The distance is the heuristic distance from the previous location (empty for the start
+# record and for unfinished tasks), not a duration.
+TASK_DTYPE = np.dtype([("agent", "i4"), ("index", "i4"), ("location", "i4"), ("time", "i4"), ("distance", "f8")])
+
+
+def load_tasks(path):
+    """
+    Parses tasks.txt into a structured array with one record per task.
+
+    The records of all agents are converted by a single vectorized call.
+
+    :param path: Path of tasks.txt.
+    :return: A structured array of TASK_DTYPE ordered by agent and index (the position in
+             the agent's line, 0 for the start record). Empty distances are NaN.
+    """
+    with open(path) as f:
+        num_agents = int(f.readline())
+        lines = f.read().replace('\r', '').split('\n')[:num_agents]
+    lines += [''] * (num_agents - len(lines))
+
+    counts = np.array([line.count(';') for line in lines], dtype=np.int64)
+    body = ''.join(lines).replace(',;', ',nan;').replace(';', ',').rstrip(',')
+    values = np.fromstring(body, dtype=np.float64, sep=',') if body else np.zeros(0)
+    if values.size != 3 * counts.sum():
+        raise ValueError(f"'{path}' has malformed records: expected {3 * counts.sum()} numbers, found {values.size}")
+    values = values.reshape(-1, 3)
+
+    tasks = np.zeros(len(values), dtype=TASK_DTYPE)
+    tasks["agent"] = np.repeat(np.arange(num_agents), counts)
+    starts = np.cumsum(counts) - counts
+    tasks["index"] = np.arange(len(values)) - np.repeat(starts, counts)
+    tasks["location"] = values[:, 0]
+    tasks["time"] = values[:, 1]
+    tasks["distance"] = values[:, 2]
+    return tasks
+
+
+def finished_mask(tasks):
+    """Marks the finished tasks (not the start records, not the unfinished tasks)."""
+    return (tasks["index"] > 0) & (tasks["time"] > 0)
+
+
+def flowtimes(tasks):
+    """
+    Computes the flowtime of every finished task: its finish time minus the finish time of
+    the agent's previous task (or 0 for the first one), when the engine assigned it.
+
+    :return: An array aligned with tasks, NaN for records that are not finished tasks.
+    """
+    previous = np.r_[0, tasks["time"][:-1]]
+    return np.where(finished_mask(tasks), tasks["time"] - previous, np.nan)
+
+
+def completions(tasks, horizon=None):
+    """
+    Counts the tasks finished at every timestep.
+
+    :param horizon: Length of the returned array minus one (default: the makespan).
+    :return: An int64 array indexed by timestep.
+    """
+    times = tasks["time"][finished_mask(tasks)]
+    horizon = int(times.max()) if horizon is None and len(times) else (horizon or 0)
+    return np.bincount(times[times <= horizon], minlength=horizon + 1)
+
+
+def sliding_throughput(tasks, window, horizon=None):
+    """
+    Computes the throughput (tasks per timestep) over a sliding window.
+
+    :param window: Length of the window in timesteps.
+    :param horizon: The last timestep (default: the makespan).
+    :return: A dict with the "timestep" each window ends at (from window to horizon) and
+             the "throughput" of the window.
+    """
+    counts = np.r_[0, np.cumsum(completions(tasks, horizon))]
+    ends = np.arange(window, len(counts))
+    return {"timestep": ends, "throughput": (counts[ends] - counts[ends - window]) / window}
+
+
+def tasks_per_agent(tasks):
+    """Counts the finished tasks of every agent."""
+    num_agents = int(tasks["agent"].max()) + 1 if len(tasks) else 0
+    return np.bincount(tasks["agent"][finished_mask(tasks)], minlength=num_agents)
+
+
+def summarize(tasks, simulation_time=None, warmup=0):
+    """
+    Summarizes the tasks of one run.
+
+    :param tasks: A structured array from load_tasks.
+    :param simulation_time: Simulation length in timesteps (default: the makespan).
+    :param warmup: Number of initial timesteps left out of the steady-state throughput.
+    :return: A dict with the number of finished and unfinished tasks, the makespan, the
+             throughput, the steady-state throughput after the warm-up, the total and mean
+             flowtime and the minimum, mean and maximum tasks per agent.
+    """
+    finished = finished_mask(tasks)
+    times = tasks["time"][finished]
+    makespan = int(times.max()) if len(times) else 0
+    horizon = simulation_time or makespan
+    flow = flowtimes(tasks)[finished]
+    per_agent = tasks_per_agent(tasks)
+    return {
+        "finished_tasks": int(finished.sum()),
+        "unfinished_tasks": int(((tasks["index"] > 0) & (tasks["time"] < 0)).sum()),
+        "makespan": makespan,
+        "throughput": len(times) / horizon if horizon else None,
+        "steady_throughput": int((times > warmup).sum()) / (horizon - warmup) if horizon > warmup else None,
+        "flowtime": float(flow.sum()),
+        "flowtime_mean": float(flow.mean()) if len(flow) else None,
+        "tasks_per_agent_min": int(per_agent.min()) if len(per_agent) else None,
+        "tasks_per_agent_mean": float(per_agent.mean()) if len(per_agent) else None,
+        "tasks_per_agent_max": int(per_agent.max()) if len(per_agent) else None,
+    }
+
+
+def _simulation_time(run):
+    config = os.path.join(run, "config.txt")
+    if os.path.isfile(config):
+        with open(config) as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name.strip() == "simulation_time":
+                    return int(value)
+    return None
+
+
+def analyze_run(run, warmup=0):
+    """
+    Summarizes a run folder (or a tasks.txt file), with the simulation time from its config.txt.
+
+    :return: The dict of summarize, with the "run" first, or with an "error" if tasks.txt is missing or malformed.
+    """
+    path = run if os.path.isfile(run) else find_run_file(run, "tasks.txt")
+    if path is None:
+        return {"run": run, "error": "no tasks.txt"}
+    try:
+        tasks = load_tasks(path)
+    except ValueError as e:
+        return {"run": run, "error": str(e)}
+    folder = os.path.dirname(path) if os.path.isfile(run) else run
+    return {"run": run, **summarize(tasks, _simulation_time(folder), warmup)}
+
+
+def analyze_runs(runs, warmup=0, max_workers=None):
+    """
+    Summarizes many runs with a pool of processes.
+
+    :return: A list of the dicts of analyze_run, in the order of runs.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(analyze_run, runs, [warmup] * len(runs), chunksize=8))
+
+
+def find_runs(root):
+    """Lists every folder below root (including root) that has a tasks.txt, in sorted order."""
+    runs = []
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        if find_run_file(folder, "tasks.txt"):
+            runs.append(folder)
+        try:
+            with os.scandir(folder) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return sorted(runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute throughput and flowtime metrics from the tasks.txt of runs.")
+    parser.add_argument("runs", nargs="+", help="Run output folders, folders of runs or tasks.txt files.")
+    parser.add_argument("--warmup", type=int, default=0, help="Timesteps left out of the steady-state throughput (default: 0).")
+    parser.add_argument("--window", type=int, default=None,
+                        help="Also save the sliding-window throughput of every run with this window length.")
+    parser.add_argument("--csv", help="Save the summaries to this CSV file.")
+    parser.add_argument("-j", "--max_workers", type=int, default=None, help="Number of processes (default: CPU count).")
+    args = parser.parse_args()
+
+    runs = []
+    for run in args.runs:
+        runs.extend([run] if os.path.isfile(run) or find_run_file(run, "tasks.txt") else find_runs(run))
+    results = analyze_runs(runs, args.warmup, args.max_workers)
+    for result in results:
+        if "error" in result:
+            print(f"{result['run']}: error: {result['error']}")
+            continue
+        print(f"{result['run']}: " + ", ".join(f"{name} {value:.4g}" for name, value in result.items()
+                                               if name != "run" and value is not None))
+
+    if args.window:
+        for run in runs:
+            path = run if os.path.isfile(run) else find_run_file(run, "tasks.txt")
+            if path is None:
+                continue
+            tasks = load_tasks(path)
+            table = sliding_throughput(tasks, args.window, _simulation_time(run if os.path.isdir(run) else os.path.dirname(run)))
+            output = os.path.normpath(run) + f".throughput_w{args.window}.csv"
+            np.savetxt(output, np.column_stack([table["timestep"], table["throughput"]]), delimiter=',',
+                       header="timestep,throughput", comments='', fmt=['%d', '%.6g'])
+            print(f"Sliding throughput saved to {output}")
+
+    if args.csv:
+        fields = list(dict.fromkeys(name for result in results for name in result))
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Summaries saved to {args.csv}")
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# paths.txt lists, after the number of agents, one line per agent with a
+# "location,orientation,timestep;" entry for every simulated timestep. The orientation
+# is -1 unless the engine ran with --rotate.
+MISSING = -1  # location of a timestep an agent line has no entry for
+
+
+def cache_paths(path):
+    """Returns the paths of the .npy cache files and of the cache metadata for a paths.txt file."""
+    return {"locations": path + ".locations.npy", "orientations": path + ".orientations.npy",
+            "meta": path + ".npy.json"}
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parse_paths(path):
+    """
+    Parses paths.txt into dense arrays.
+
+    The entries of all agents are converted by a single vectorized call, and every entry
+    is placed by its own timestep, so lines of different lengths are padded with MISSING.
+
+    :param path: Path of paths.txt.
+    :return: A (locations, orientations) pair of (agents x timesteps) arrays, int32 and int8.
+    """
+    with open(path) as f:
+        num_agents = int(f.readline())
+        lines = f.read().replace('\r', '').split('\n')[:num_agents]
+    lines += [''] * (num_agents - len(lines))
+
+    counts = np.array([line.count(';') for line in lines], dtype=np.int64)
+    body = ''.join(lines).replace(';', ',').rstrip(',')
+    entries = np.fromstring(body, dtype=np.int64, sep=',') if body else np.zeros(0, dtype=np.int64)
+    if entries.size != 3 * counts.sum():
+        raise ValueError(f"'{path}' has malformed entries: expected {3 * counts.sum()} numbers, found {entries.size}")
+    entries = entries.reshape(-1, 3)
+
+    agents = np.repeat(np.arange(num_agents), counts)
+    timesteps = entries[:, 2]
+    horizon = int(timesteps.max()) + 1 if len(timesteps) else 0
+    locations = np.full((num_agents, horizon), MISSING, dtype=np.int32)
+    orientations = np.full((num_agents, horizon), -1, dtype=np.int8)
+    locations[agents, timesteps] = entries[:, 0]
+    orientations[agents, timesteps] = entries[:, 1]
+    return locations, orientations
+
+
+def load_paths(path, use_cache=True):
+    """
+    Loads paths.txt as dense (agents x timesteps) location and orientation arrays.
+
+    The first load saves the arrays as .npy files next to paths.txt; later loads memory-map
+    them read-only instead of parsing the text again. The cache is rebuilt when the size
+    or modification time of paths.txt changes. If the folder is not writable, the arrays
+    are returned without caching.
+
+    :param path: Path of paths.txt.
+    :param use_cache: Read and write the .npy cache.
+    :return: A (locations, orientations) pair of int32 and int8 arrays.
+    """
+    if not use_cache:
+        return parse_paths(path)
+
+    files = cache_paths(path)
+    signature = _source_signature(path)
+    try:
+        with open(files["meta"]) as f:
+            if json.load(f) == signature:
+                return (np.load(files["locations"], mmap_mode='r'),
+                        np.load(files["orientations"], mmap_mode='r'))
+    except (OSError, ValueError):
+        pass
+
+    locations, orientations = parse_paths(path)
+    try:
+        for name, array in (("locations", locations), ("orientations", orientations)):
+            tmp = files[name] + ".tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, files[name])
+        with open(files["meta"] + ".tmp", 'w') as f:
+            json.dump(signature, f)
+        os.replace(files["meta"] + ".tmp", files["meta"])
+    except OSError as e:
+        print(f"Warning: could not cache '{path}': {e}")
+    return locations, orientations
+
+
+def _parse_entries(text):
+    """Parses "location,orientation,timestep;" entries into an (entries x 3) int64 array."""
+    text = text.replace(';', ',').strip().rstrip(',')
+    values = np.fromstring(text, dtype=np.int64, sep=',') if text else np.zeros(0, dtype=np.int64)
+    return values[:len(values) - len(values) % 3].reshape(-1, 3)
+
+
+class PathsIndex:
+    """
+    A byte-offset index of paths.txt for reading a window of agents and timesteps without
+    parsing the whole file.
+
+    The index records where every agent line starts and ends and, every `every` entries
+    of a line, the byte offset and timestep of the entry (a checkpoint). A read seeks to
+    the last checkpoint before the window and parses only up to the first one after it.
+    The index is saved next to paths.txt as paths.txt.idx.npz and rebuilt when the size
+    or modification time of paths.txt changes.
+    """
+
+    def __init__(self, path, arrays):
+        self.path = path
+        self.every = int(arrays["every"])
+        self.line_starts = arrays["line_starts"]
+        self.line_ends = arrays["line_ends"]
+        self.checkpoint_offsets = arrays["checkpoint_offsets"]
+        self.checkpoint_timesteps = arrays["checkpoint_timesteps"]
+
+    @property
+    def num_agents(self):
+        return len(self.line_starts)
+
+    @staticmethod
+    def index_path(path):
+        return path + ".idx.npz"
+
+    @classmethod
+    def build(cls, path, every=100):
+        """
+        Scans paths.txt once and saves its index.
+
+        :param path: Path of paths.txt.
+        :param every: Number of entries between two checkpoints of a line.
+        """
+        signature = _source_signature(path)
+        line_starts, line_ends, offsets, timesteps = [], [], [], []
+        with open(path, 'rb') as f:
+            num_agents = int(f.readline())
+            for _ in range(num_agents):
+                start = f.tell()
+                line = f.readline()
+                body = line.rstrip(b'\r\n')
+                line_starts.append(start)
+                line_ends.append(start + len(body))
+                # Entry j starts at the line start (j = 0) or right after the (j-1)-th ';'.
+                separators = np.flatnonzero(np.frombuffer(body, dtype=np.uint8) == ord(';'))
+                entry_starts = np.r_[0, separators[:-1] + 1] if len(separators) else np.zeros(0, dtype=np.int64)
+                checkpoints = entry_starts[::every]
+                offsets.append(start + checkpoints)
+                timesteps.append([int(body[c:body.index(b';', c)].split(b',')[2]) for c in checkpoints])
+
+        columns = max((len(o) for o in offsets), default=0)
+        arrays = {
+            "every": np.int64(every),
+            "line_starts": np.array(line_starts, dtype=np.int64),
+            "line_ends": np.array(line_ends, dtype=np.int64),
+            "checkpoint_offsets": np.full((len(offsets), columns), -1, dtype=np.int64),
+            "checkpoint_timesteps": np.full((len(offsets), columns), np.iinfo(np.int64).max, dtype=np.int64),
+            "source_size": np.int64(signature["size"]),
+            "source_mtime_ns": np.int64(signature["mtime_ns"]),
+        }
+        for a, (o, t) in enumerate(zip(offsets, timesteps)):
+            arrays["checkpoint_offsets"][a, :len(o)] = o
+            arrays["checkpoint_timesteps"][a, :len(t)] = t
+        try:
+            tmp = cls.index_path(path) + ".tmp"
+            with open(tmp, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, cls.index_path(path))
+        except OSError as e:
+            print(f"Warning: could not save the index of '{path}': {e}")
+        return cls(path, arrays)
+
+    @classmethod
+    def open(cls, path, every=100):
+        """Opens the saved index of paths.txt, building it first if it is missing or outdated."""
+        signature = _source_signature(path)
+        try:
+            with np.load(cls.index_path(path)) as saved:
+                arrays = dict(saved)
+            if int(arrays["source_size"]) == signature["size"] and int(arrays["source_mtime_ns"]) == signature["mtime_ns"]:
+                return cls(path, arrays)
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(path, every)
+
+    def read(self, agents, first_timestep, last_timestep):
+        """
+        Reads the entries of some agents between two timesteps.
+
+        :param agents: An iterable of agent ids, e.g. range(120, 141).
+        :param first_timestep: The first timestep of the window.
+        :param last_timestep: The last timestep of the window (inclusive).
+        :return: A (locations, orientations) pair of (len(agents) x window length) arrays,
+                 int32 and int8, with MISSING where an agent has no entry.
+        """
+        agents = list(agents)
+        length = last_timestep - first_timestep + 1
+        locations = np.full((len(agents), length), MISSING, dtype=np.int32)
+        orientations = np.full((len(agents), length), -1, dtype=np.int8)
+        with open(self.path, 'rb') as f:
+            for row, agent in enumerate(agents):
+                timesteps = self.checkpoint_timesteps[agent]
+                if not len(timesteps) or self.checkpoint_offsets[agent, 0] < 0:
+                    continue  # empty line
+                # The last checkpoint at or before the window and the first one after it.
+                first = max(np.searchsorted(timesteps, first_timestep, side="right") - 1, 0)
+                after = np.searchsorted(timesteps, last_timestep, side="right")
+                start = self.checkpoint_offsets[agent, first]
+                end = self.checkpoint_offsets[agent, after] \
+                    if after < timesteps.shape[0] and self.checkpoint_offsets[agent, after] >= 0 else self.line_ends[agent]
+                f.seek(start)
+                entries = _parse_entries(f.read(end - start).decode())
+                inside = (entries[:, 2] >= first_timestep) & (entries[:, 2] <= last_timestep)
+                entries = entries[inside]
+                locations[row, entries[:, 2] - first_timestep] = entries[:, 0]
+                orientations[row, entries[:, 2] - first_timestep] = entries[:, 1]
+        return locations, orientations
+
+
+def find_run_file(run, name):
+    """
+    Finds a result file of a run folder, in either layout the engine produces ("<run>/name",
+    or "<run>\\name" next to the folder on Linux).
+
+    :return: The path of the file, or None.
+    """
+    for path in (os.path.join(run, name), os.path.normpath(run) + "\\" + name):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def find_run_files(run):
+    """Returns the paths.txt and the config of a run folder or of a paths.txt file."""
+    if os.path.isfile(run):
+        paths_file, folder = run, os.path.dirname(run)
+    else:
+        folder = run
+        paths_file = find_run_file(run, "paths.txt")
+        if paths_file is None:
+            raise FileNotFoundError(f"No paths.txt found for '{run}'")
+    config = {}
+    config_file = os.path.join(folder, "config.txt")
+    if os.path.isfile(config_file):
+        with open(config_file) as f:
+            for line in f:
+                name, sep, value = line.partition(':')
+                if sep:
+                    config[name.strip()] = value.strip()
+    return paths_file, config
+
+
+def time_chunks(locations, history=0, budget=1 << 24):
+    """
+    Splits the timesteps into chunks whose occupancy tables fit in about budget entries.
+
+    Yields (t0, t1, occupancy), where occupancy[t - t0 + history, location] is the agent at
+    location at timestep t, or -1, for t0 - history <= t < t1. With several agents at one
+    location (a vertex conflict), the table holds one of them.
+    """
+    agents, horizon = locations.shape
+    size = int(locations.max(initial=0)) + 1
+    length = max(1, budget // size - history)
+    for t0 in range(0, horizon, length):
+        t1 = min(horizon, t0 + length)
+        first = max(0, t0 - history)
+        window = np.asarray(locations[:, first:t1])
+        occupancy = np.full((t1 - t0 + history, size), -1, dtype=np.int32)
+        a, t = np.nonzero(window != MISSING)
+        occupancy[t + first - t0 + history, window[a, t]] = a
+        yield t0, t1, occupancy
+
+
+def id_to_xy(locations, width):
+    """Converts row-major location ids (an array or a scalar) into x (column) and y (row) coordinates."""
+    return locations % width, locations // width
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert paths.txt into memory-mappable .npy arrays.")
+    parser.add_argument("paths", nargs="+", help="paths.txt files to convert.")
+    parser.add_argument("--no_cache", action="store_true", help="Only parse the files, without writing the .npy cache.")
+    parser.add_argument("--index", type=int, metavar="EVERY", default=None,
+                        help="Build the byte-offset index with a checkpoint every EVERY timesteps instead.")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if args.index:
+            index = PathsIndex.build(path, args.index)
+            print(f"{path}: indexed {index.num_agents} agents with {index.checkpoint_offsets.shape[1]} checkpoints each")
+            continue
+        locations, orientations = load_paths(path, use_cache=not args.no_cache)
+        print(f"{path}: {locations.shape[0]} agents x {locations.shape[1]} timesteps, "
+              f"{int((np.asarray(locations) == MISSING).sum())} missing entries")
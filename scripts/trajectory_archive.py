@@ -0,0 +1,309 @@
+import argparse
+import json
+import lzma
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from grid_map import GridMap
+from trajectories import MISSING, find_run_file, load_paths
+
+# File layout:
+#   MAGIC, uint32 header length, JSON header,
+#   int64 block offsets ((chunks x groups) + 1, relative to the end of the offsets),
+#   the compressed blocks, the compressed task columns.
+# Block (c, g) holds agents g * group_size ... of time chunk c: one byte with the dtype
+# code of the location deltas, the deltas along time ((agents x steps), the first step
+# of each agent absolute), then the int8 orientations if the run used rotation.
+MAGIC = b"RHCRTRJ1"
+SUFFIX = ".traj"
+CODECS = {"zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+          "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress)}
+_DELTA_DTYPES = [np.int8, np.int16, np.int32]
+
+
+def _encode_block(locations, orientations):
+    deltas = locations.astype(np.int64)
+    deltas[:, 1:] = np.diff(deltas, axis=1)
+    code = next(i for i, dtype in enumerate(_DELTA_DTYPES)
+                if not deltas.size or (deltas.min() >= np.iinfo(dtype).min and deltas.max() <= np.iinfo(dtype).max))
+    payload = bytes([code]) + deltas.astype(_DELTA_DTYPES[code]).tobytes()
+    if orientations is not None:
+        payload += orientations.astype(np.int8).tobytes()
+    return payload
+
+
+def _decode_block(payload, shape, with_orientations):
+    dtype = np.dtype(_DELTA_DTYPES[payload[0]])
+    size = shape[0] * shape[1]
+    deltas = np.frombuffer(payload, dtype=dtype, count=size, offset=1).reshape(shape)
+    locations = np.cumsum(deltas, axis=1, dtype=np.int64).astype(np.int32)
+    if with_orientations:
+        orientations = np.frombuffer(payload, dtype=np.int8, count=size, offset=1 + size * dtype.itemsize).reshape(shape)
+    else:
+        orientations = np.full(shape, -1, dtype=np.int8)
+    return locations, orientations
+
+
+def _read_tasks(tasks_file):
+    """Reads tasks.txt into per-agent record counts, locations, times and the raw distance fields."""
+    with open(tasks_file) as f:
+        num_agents = int(f.readline())
+        lines = f.read().split('\n')[:num_agents]
+    lines += [''] * (num_agents - len(lines))
+    counts, locations, times, distances = [], [], [], []
+    for line in lines:
+        records = [r.split(',') for r in line.split(';') if r]
+        counts.append(len(records))
+        for location, time, distance in records:
+            locations.append(int(location))
+            times.append(int(time))
+            distances.append(distance)
+    return {"counts": np.array(counts, dtype=np.int32), "locations": np.array(locations, dtype=np.int32),
+            "times": np.array(times, dtype=np.int32), "distances": '\n'.join(distances)}
+
+
+def write_archive(paths_file, output_file, tasks_file=None, map_file=None, chunk_length=256, group_size=64,
+                  codec="zlib", max_workers=None):
+    """
+    Converts a run's paths.txt (and optionally tasks.txt) into a compact binary archive.
+
+    :param paths_file: Path of paths.txt.
+    :param output_file: Path of the archive to write.
+    :param tasks_file: Optional path of tasks.txt, stored in the same archive.
+    :param map_file: Optional map file whose dimensions are recorded in the header.
+    :param chunk_length: Number of timesteps per block.
+    :param group_size: Number of agents per block.
+    :param codec: "zlib" (faster) or "lzma" (smaller).
+    :param max_workers: Number of threads compressing blocks.
+    :return: The header dict.
+    """
+    compress = CODECS[codec][0]
+    locations, orientations = load_paths(paths_file, use_cache=False)
+    num_agents, horizon = locations.shape
+    rotation = bool((np.asarray(orientations) != -1).any())
+    if map_file:
+        grid_map = GridMap.load(map_file)
+        rows, cols = grid_map.rows, grid_map.cols
+    else:
+        rows, cols = None, None
+
+    blocks = [(t0, a0) for t0 in range(0, horizon, chunk_length) for a0 in range(0, num_agents, group_size)]
+
+    def pack(block):
+        t0, a0 = block
+        window = (slice(a0, a0 + group_size), slice(t0, t0 + chunk_length))
+        return compress(_encode_block(np.asarray(locations[window]),
+                                      np.asarray(orientations[window]) if rotation else None))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        compressed = list(pool.map(pack, blocks))
+    offsets = np.zeros(len(compressed) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in compressed])
+
+    header = {"version": 1, "codec": codec, "rows": rows, "cols": cols, "num_agents": num_agents,
+              "horizon": horizon, "chunk_length": chunk_length, "group_size": group_size,
+              "rotation": rotation, "missing": MISSING, "tasks": None}
+    task_blob = b""
+    if tasks_file:
+        tasks = _read_tasks(tasks_file)
+        parts = [compress(tasks[name].tobytes()) for name in ("counts", "locations", "times")]
+        parts.append(compress(tasks["distances"].encode()))
+        header["tasks"] = {"num_agents": len(tasks["counts"]), "records": len(tasks["locations"]),
+                           "sizes": [len(p) for p in parts], "offset": int(offsets[-1])}
+        task_blob = b"".join(parts)
+
+    header_bytes = json.dumps(header).encode()
+    tmp = output_file + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(offsets.tobytes())
+        for block in compressed:
+            f.write(block)
+        f.write(task_blob)
+    os.replace(tmp, output_file)
+    return header
+
+
+class TrajectoryArchive:
+    """
+    Reads an archive written by write_archive. Blocks are decompressed on demand, so a
+    window of agents and timesteps only touches the blocks that overlap it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"'{path}' is not a trajectory archive")
+            length, = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(length))
+            num_blocks = self.num_chunks * self.num_groups
+            self.offsets = np.frombuffer(f.read(8 * (num_blocks + 1)), dtype=np.int64)
+            self.data_start = f.tell()
+        self.decompress = CODECS[self.header["codec"]][1]
+
+    @property
+    def num_agents(self):
+        return self.header["num_agents"]
+
+    @property
+    def horizon(self):
+        return self.header["horizon"]
+
+    @property
+    def num_chunks(self):
+        return -(-self.horizon // self.header["chunk_length"])
+
+    @property
+    def num_groups(self):
+        return -(-self.num_agents // self.header["group_size"])
+
+    def _read_bytes(self, f, start, end):
+        f.seek(self.data_start + start)
+        return f.read(end - start)
+
+    def read_block(self, chunk, group, f=None):
+        """
+        Reads one block.
+
+        :return: A (locations, orientations) pair for the agents of the group and the
+                 timesteps of the chunk.
+        """
+        chunk_length, group_size = self.header["chunk_length"], self.header["group_size"]
+        shape = (min(group_size, self.num_agents - group * group_size), min(chunk_length, self.horizon - chunk * chunk_length))
+        index = chunk * self.num_groups + group
+        if f is None:
+            with open(self.path, 'rb') as f:
+                data = self._read_bytes(f, self.offsets[index], self.offsets[index + 1])
+        else:
+            data = self._read_bytes(f, self.offsets[index], self.offsets[index + 1])
+        return _decode_block(self.decompress(data), shape, self.header["rotation"])
+
+    def read(self, agents=None, first_timestep=0, last_timestep=None):
+        """
+        Reads a window of consecutive agents and timesteps.
+
+        :param agents: A range of agent ids (default: all agents).
+        :param first_timestep: The first timestep of the window.
+        :param last_timestep: The last timestep of the window, inclusive (default: the last one).
+        :return: A (locations, orientations) pair of (agents x timesteps) arrays.
+        """
+        agents = range(self.num_agents) if agents is None else agents
+        last_timestep = self.horizon - 1 if last_timestep is None else min(last_timestep, self.horizon - 1)
+        chunk_length, group_size = self.header["chunk_length"], self.header["group_size"]
+        locations = np.full((len(agents), last_timestep - first_timestep + 1), MISSING, dtype=np.int32)
+        orientations = np.full(locations.shape, -1, dtype=np.int8)
+        if not len(agents) or last_timestep < first_timestep:
+            return locations, orientations
+        a_first, a_last = agents[0], agents[-1]
+        with open(self.path, 'rb') as f:
+            for chunk in range(first_timestep // chunk_length, last_timestep // chunk_length + 1):
+                for group in range(a_first // group_size, a_last // group_size + 1):
+                    block_locations, block_orientations = self.read_block(chunk, group, f)
+                    t0, a0 = chunk * chunk_length, group * group_size
+                    ts = slice(max(first_timestep, t0), min(last_timestep + 1, t0 + block_locations.shape[1]))
+                    ags = slice(max(a_first, a0), min(a_last + 1, a0 + block_locations.shape[0]))
+                    target = (slice(ags.start - a_first, ags.stop - a_first), slice(ts.start - first_timestep, ts.stop - first_timestep))
+                    source = (slice(ags.start - a0, ags.stop - a0), slice(ts.start - t0, ts.stop - t0))
+                    locations[target] = block_locations[source]
+                    orientations[target] = block_orientations[source]
+        return locations, orientations
+
+    def read_tasks(self):
+        """
+        Reads the stored tasks.
+
+        :return: A dict with per-agent record "counts" and the "locations", "times" and
+                 "distances" (the raw text fields) of all records, or None.
+        """
+        tasks = self.header["tasks"]
+        if tasks is None:
+            return None
+        with open(self.path, 'rb') as f:
+            start = tasks["offset"]
+            parts = []
+            for size in tasks["sizes"]:
+                parts.append(self.decompress(self._read_bytes(f, start, start + size)))
+                start += size
+        distances = parts[3].decode()
+        return {"counts": np.frombuffer(parts[0], dtype=np.int32),
+                "locations": np.frombuffer(parts[1], dtype=np.int32),
+                "times": np.frombuffer(parts[2], dtype=np.int32),
+                "distances": distances.split('\n') if tasks["records"] else []}
+
+    def write_paths_text(self, output_file):
+        """Writes the trajectories back in the engine's paths.txt format."""
+        with open(output_file, 'w') as out:
+            out.write(f"{self.num_agents}\n")
+            group_size = self.header["group_size"]
+            for group in range(self.num_groups):
+                agents = range(group * group_size, min(self.num_agents, (group + 1) * group_size))
+                locations, orientations = self.read(agents)
+                for loc_row, ori_row in zip(locations, orientations):
+                    timesteps = np.flatnonzero(loc_row != MISSING)
+                    out.write("".join(f"{l},{o},{t};" for l, o, t in
+                                      zip(loc_row[timesteps].tolist(), ori_row[timesteps].tolist(), timesteps.tolist())))
+                    out.write("\n")
+
+    def write_tasks_text(self, output_file):
+        """Writes the stored tasks back in the engine's tasks.txt format."""
+        tasks = self.read_tasks()
+        if tasks is None:
+            raise ValueError(f"'{self.path}' holds no tasks")
+        with open(output_file, 'w') as out:
+            out.write(f"{len(tasks['counts'])}\n")
+            start = 0
+            for count in tasks["counts"].tolist():
+                out.write("".join(f"{l},{t},{d};" for l, t, d in zip(tasks["locations"][start:start + count].tolist(),
+                                                                    tasks["times"][start:start + count].tolist(),
+                                                                    tasks["distances"][start:start + count])))
+                out.write("\n")
+                start += count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a run's paths.txt and tasks.txt into a compact binary archive, or unpack it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack = commands.add_parser("pack", help="Convert a run folder into an archive.")
+    pack.add_argument("run", help="Run output folder.")
+    pack.add_argument("-o", "--output", help=f"Archive path (default: <run>{SUFFIX}).")
+    pack.add_argument("-m", "--map", help="Map file whose dimensions are recorded in the header.")
+    pack.add_argument("--codec", choices=tuple(CODECS), default="zlib", help="Compression codec (default: zlib).")
+    pack.add_argument("--chunk_length", type=int, default=256, help="Timesteps per block (default: 256).")
+    pack.add_argument("--group_size", type=int, default=64, help="Agents per block (default: 64).")
+
+    unpack = commands.add_parser("unpack", help="Write paths.txt and tasks.txt back from an archive.")
+    unpack.add_argument("archive", help="The archive.")
+    unpack.add_argument("-o", "--output_folder", required=True, help="Folder that receives paths.txt and tasks.txt.")
+
+    info = commands.add_parser("info", help="Print the header of an archive.")
+    info.add_argument("archive", help="The archive.")
+
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        paths_file = find_run_file(args.run, "paths.txt")
+        if paths_file is None:
+            print(f"Error: no paths.txt found for '{args.run}'")
+            raise SystemExit(1)
+        tasks_file = find_run_file(args.run, "tasks.txt")
+        output = args.output or os.path.normpath(args.run) + SUFFIX
+        write_archive(paths_file, output, tasks_file, args.map, args.chunk_length, args.group_size, args.codec)
+        size = os.path.getsize(paths_file) + (os.path.getsize(tasks_file) if tasks_file else 0)
+        print(f"Packed '{args.run}' into '{output}': {size} -> {os.path.getsize(output)} bytes")
+    elif args.command == "unpack":
+        archive = TrajectoryArchive(args.archive)
+        os.makedirs(args.output_folder, exist_ok=True)
+        archive.write_paths_text(os.path.join(args.output_folder, "paths.txt"))
+        if archive.header["tasks"] is not None:
+            archive.write_tasks_text(os.path.join(args.output_folder, "tasks.txt"))
+        print(f"Unpacked '{args.archive}' into '{args.output_folder}'")
+    else:
+        print(json.dumps(TrajectoryArchive(args.archive).header, indent=4))
@@ -1,36 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from grid_map import GridMap
+
 def parse_grid(file_path):
-    grid_data = []
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        # Skip the first two lines (metadata)
-        for line in lines[2:]:
-            parts = line.strip().split(',')
-            # Ensure the line has enough parts and valid numeric data
-            if len(parts) < 5 or not parts[3].isdigit() or not parts[4].isdigit():
-                continue  # Skip invalid lines
-            x, y = int(parts[3]), int(parts[4])
-            cell_type = parts[1]
-            # Assign a numeric value based on the cell type
-            if cell_type == "Obstacle":
-                value = -1  # Obstacles
-            elif cell_type == "Travel":
-                value = 0  # Traversable cells
-            elif cell_type == "Eject":
-                value = 1  # Eject points
-            elif cell_type == "Induct":
-                value = 2  # Induct points
-            else:
-                value = 0  # Default for unknown types
-            # Ensure the grid is large enough
-            while len(grid_data) <= y:
-                grid_data.append([])
-            while len(grid_data[y]) <= x:
-                grid_data[y].append(0)
-            grid_data[y][x] = value
-    return grid_data
+    grid_map = GridMap.load(file_path)
+    # Numeric value per cell type: -1 obstacles, 0 traversable cells, 1 eject and 2 induct points
+    values = np.zeros(grid_map.size, dtype=int)
+    values[grid_map.obstacle] = -1
+    values[grid_map.type_mask("Eject")] = 1
+    values[grid_map.type_mask("Induct")] = 2
+    # Indexed [y][x] by the x and y columns of the .grid file, which are the row and the column
+    return values.reshape(grid_map.rows, grid_map.cols).T
 
 def visualize_grid(grid_data):
     # Convert to a numpy array for visualization
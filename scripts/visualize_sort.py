@@ -4,6 +4,9 @@ import matplotlib.colors as mcolors
 import numpy as np
 import os
 
+from distance_tables import DistanceTable
+from grid_map import NO_STATION, GridMap
+
 # --- Configuration ---
 MAP_FILE = 'sorting_map.grid'
 TASKS_FILE = 'centre_10/tasks.txt' # Adjusted path for potential subfolder
@@ -12,37 +15,29 @@ TASKS_FILE = 'centre_10/tasks.txt' # Adjusted path for potential subfolder
 
 # --- 1. Parse Map File ---
 def parse_map(filepath):
-    """Parses the .grid file."""
+    """Parses the .grid file through grid_map; x and y are the row and column, as in the file."""
+    grid_map = GridMap.load(filepath)
+    xs, ys = grid_map.id_to_rc(np.arange(grid_map.size))
+    type_names = grid_map.type_strings()
     nodes = {}
-    grid_dim = (0, 0)
-    with open(filepath, 'r') as f:
-        lines = f.readlines()
-        grid_dim_str = lines[0].strip().split('(')[1].split(')')[0].split(',')
-        grid_dim = (int(grid_dim_str[0]), int(grid_dim_str[1]))
-        
-        # Header: id,type,station,x,y,weight_to_NORTH,weight_to_WEST,weight_to_SOUTH,weight_to_EAST,weight_for_WAIT
-        for line in lines[2:]: # Skip first two lines (grid_dim, header)
-            parts = line.strip().split(',')
-            node_id = int(parts[0])
-            node_type = parts[1]
-            station_str = parts[2]
-            station_id = int(station_str) if station_str != 'None' else None
-            x, y = int(parts[3]), int(parts[4])
-            
-            nodes[node_id] = {
-                'id': node_id,
-                'type': node_type,
-                'station_id': station_id,
-                'x': x,
-                'y': y
-            }
-    return grid_dim, nodes
+    for node_id, node_type, station, x, y in zip(range(grid_map.size), type_names.tolist(),
+                                                  grid_map.stations.tolist(), xs.tolist(), ys.tolist()):
+        nodes[node_id] = {
+            'id': node_id,
+            'type': node_type,
+            'station_id': station if station != NO_STATION else None,
+            'x': x,
+            'y': y
+        }
+    return (grid_map.rows, grid_map.cols), nodes
 
 # --- 2. Parse Tasks File and Reconstruct Paths ---
-def parse_tasks_and_reconstruct_paths(filepath, nodes_map):
+def parse_tasks_and_reconstruct_paths(filepath, nodes_map, distances=None):
     """
     Parses the tasks.txt file and reconstructs agent paths.
     A path is a dictionary: {time_step: (x, y)}
+    With a distance_tables.DistanceTable, agents follow a shortest path to their goals
+    while traveling; otherwise they stay at their start until they arrive.
     """
     agents_data = {} # {agent_id: {'tasks': [], 'path': {time: (x,y)}, 'initial_pos_id': id}}
     max_time = 0
@@ -113,6 +108,19 @@ def parse_tasks_and_reconstruct_paths(filepath, nodes_map):
 
                     # Travel phase: from time_ready_for_travel to arrival_time - 1
                     travel_duration = arrival_time - time_ready_for_travel
+                    route = None
+                    if distances is not None and travel_duration > 0:
+                        try:
+                            route = distances.path(current_node_id, end_node_id)
+                        except KeyError: # The goal is not a station
+                            route = None
+                    if route is not None:
+                        for t_offset in range(travel_duration):
+                            t = time_ready_for_travel + t_offset
+                            if t not in agents_data[agent_id]['path']:
+                                node_id = route[min(t_offset, len(route) - 1)]
+                                agents_data[agent_id]['path'][t] = (nodes_map[node_id]['x'], nodes_map[node_id]['y'])
+                        travel_duration = 0 # Already filled
                     
                     for t_offset in range(travel_duration):
                         t = time_ready_for_travel + t_offset
@@ -405,7 +413,9 @@ if __name__ == "__main__":
     grid_dimensions, map_nodes = parse_map(MAP_FILE)
     print(f"Map parsed: {grid_dimensions[0]}x{grid_dimensions[1]} grid, {len(map_nodes)} nodes.")
     
-    agents_info, max_t = parse_tasks_and_reconstruct_paths(TASKS_FILE, map_nodes)
+    # Shortest-path distances to the stations, computed once and cached next to the map
+    station_distances = DistanceTable.load(MAP_FILE)
+    agents_info, max_t = parse_tasks_and_reconstruct_paths(TASKS_FILE, map_nodes, station_distances)
     print(f"Tasks parsed for {len(agents_info)} agents. Max time step: {max_t}")
 
     # for agent_id, data in agents_info.items():
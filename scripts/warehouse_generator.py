@@ -0,0 +1,237 @@
+import argparse
+import os
+
+import numpy as np
+
+from grid_map import label_components
+
+# Characters of the layout, as in engine (kiva) .map files.
+TRAVEL, OBSTACLE, ENDPOINT, HOME = b'.', b'@', b'e', b'r'
+# Station ids of .grid files, as in sorting_map.grid: inducts count from 1000 and ejects from 10000.
+INDUCT_BASE, EJECT_BASE = 1000, 10000
+GRID_HEADER = "id,type,station,x,y,weight_to_NORTH,weight_to_WEST,weight_to_SOUTH,weight_to_EAST,weight_for_WAIT"
+PLACEMENTS = ("sides", "top_bottom", "perimeter")
+CHUNK_CELLS = 1 << 16
+
+
+def warehouse_layout(blocks=(8, 3), block_size=(1, 10), aisle_width=1, margin=7, homes=None,
+                     placement="sides", endpoints=None, obstacle_ratio=0.0, seed=0):
+    """
+    Lays out a warehouse like maps/kiva.map: a grid of shelf blocks, each with a row of
+    endpoints along its top and bottom, separated by aisles, and home stations in the
+    margins around the storage area.
+
+    :param blocks: Number of shelf blocks as (rows, cols).
+    :param block_size: Size of a shelf block as (height, width).
+    :param aisle_width: Number of travel cells between the endpoint rows of neighboring
+                        blocks, and between blocks side by side.
+    :param margin: Width of the margins holding the home stations. Stations are placed in
+                   pairs of lanes between travel lanes (".rr.rr."), as in kiva.map.
+    :param homes: Number of home stations (default: every station cell of the margins).
+    :param placement: Margins used for the home stations: "sides" (left and right),
+                      "top_bottom" or "perimeter".
+    :param endpoints: Number of endpoints (default: all); the others stay travel cells.
+    :param obstacle_ratio: Fraction of all cells that should be obstacles. Random travel
+                           cells that do not touch a station are blocked until it is met;
+                           a warning is printed if there are too few of them.
+    :param seed: Seed of the random choices.
+    :return: A (rows x cols) array of single-byte characters.
+    """
+    if placement not in PLACEMENTS:
+        raise ValueError(f"placement should be one of {PLACEMENTS}, not '{placement}'")
+    rng = np.random.default_rng(seed)
+    block_rows, block_cols = blocks
+    height, width = block_size
+    # A block row is an endpoint row, the shelves and another endpoint row, followed by an aisle.
+    pitch_y, pitch_x = height + 2 + aisle_width, width + aisle_width
+    top = margin if placement != "sides" else 1
+    left = margin if placement != "top_bottom" else 1
+    span_y, span_x = block_rows * pitch_y - aisle_width, block_cols * pitch_x - aisle_width
+    rows, cols = top * 2 + span_y, left * 2 + span_x
+
+    grid = np.full((rows, cols), TRAVEL, dtype='S1')
+    # Row and column offsets inside the storage area decide the cell of every block.
+    y = np.arange(rows) - top
+    x = np.arange(cols) - left
+    y_offset, x_offset = y % pitch_y, x % pitch_x
+    block_row = (y >= 0) & (y < span_y) & (y_offset < height + 2)
+    block_col = (x >= 0) & (x < span_x) & (x_offset < width)
+    shelf_row = block_row & (y_offset >= 1) & (y_offset <= height)
+    face_row = block_row & ((y_offset == 0) | (y_offset == height + 1))
+    grid[np.ix_(shelf_row, block_col)] = OBSTACLE
+    face = np.zeros((rows, cols), dtype=bool)
+    face[np.ix_(face_row, block_col)] = True
+
+    # Station lanes of the margins, next to the blocks: cells whose distance to the storage
+    # area is not 1 modulo 3 (".rr.rr."), except on the outer border.
+    station = np.zeros((rows, cols), dtype=bool)
+    lane_x = np.maximum(-x, x - span_x + 1)
+    lane_y = np.maximum(-y, y - span_y + 1)
+    inner_rows = np.arange(rows) % (rows - 1) != 0
+    inner_cols = np.arange(cols) % (cols - 1) != 0
+    if placement in ("sides", "perimeter"):
+        lanes = (lane_x >= 2) & (lane_x % 3 != 1) & inner_cols
+        station[np.ix_(block_row, lanes)] = True
+    if placement in ("top_bottom", "perimeter"):
+        lanes = (lane_y >= 2) & (lane_y % 3 != 1) & inner_rows
+        station[np.ix_(lanes, block_col)] = True
+
+    face_cells, station_cells = np.flatnonzero(face), np.flatnonzero(station)
+    if endpoints is not None:
+        face_cells = _spread(face_cells, endpoints)
+    if homes is not None:
+        station_cells = _spread(station_cells, homes)
+    flat = grid.reshape(-1)
+    flat[face_cells] = ENDPOINT
+    flat[station_cells] = HOME
+
+    if obstacle_ratio > 0:
+        missing = int(round(obstacle_ratio * flat.size)) - int((flat == OBSTACLE).sum())
+        free = flat == TRAVEL
+        # Cells next to a station stay free, so that every station can be entered.
+        is_station = ((grid == ENDPOINT) | (grid == HOME))
+        near = is_station.copy()
+        near[1:] |= is_station[:-1]
+        near[:-1] |= is_station[1:]
+        near[:, 1:] |= is_station[:, :-1]
+        near[:, :-1] |= is_station[:, 1:]
+        candidates = np.flatnonzero(free & ~near.reshape(-1))
+        if missing > 0:
+            flat[rng.choice(candidates, min(missing, len(candidates)), replace=False)] = OBSTACLE
+        # Cells cut off from the largest connected area cannot be used; block them.
+        labels = components(flat.reshape(rows, cols) != OBSTACLE)
+        counts = np.bincount(labels[labels >= 0])
+        if len(counts):
+            flat[(labels >= 0) & (labels != np.argmax(counts))] = OBSTACLE
+        if missing > len(candidates):
+            print(f"Warning: only {len(candidates)} travel cells away from stations can be blocked, so "
+                  f"{(flat == OBSTACLE).mean():.1%} of the cells are obstacles instead of {obstacle_ratio:.1%}")
+    return grid
+
+
+def _spread(cells, count):
+    """Picks count cells evenly spread over a sorted array of cells."""
+    if count >= len(cells):
+        return cells
+    return cells[np.linspace(0, len(cells) - 1, count).round().astype(np.int64)]
+
+
+def components(free):
+    """
+    Labels the 4-connected components of the free cells of a grid.
+
+    :param free: A (rows x cols) bool array.
+    :return: The label of every cell (flat), -1 for blocked cells.
+    """
+    rows, cols = free.shape
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    right = free[:, :-1] & free[:, 1:]
+    down = free[:-1, :] & free[1:, :]
+    first = np.concatenate([ids[:, :-1][right], ids[:-1, :][down]])
+    second = np.concatenate([ids[:, 1:][right], ids[1:, :][down]])
+    return np.where(free.reshape(-1), label_components(rows * cols, first, second), -1)
+
+
+def write_map(grid, path, max_time=5000):
+    """
+    Writes the layout as an engine (kiva) .map file: "rows,cols", the number of
+    endpoints, the number of home stations, the maximum time and the rows of the grid.
+    """
+    rows, cols = grid.shape
+    with open(path, 'wb') as f:
+        f.write(f"{rows},{cols}\n{int((grid == ENDPOINT).sum())}\n{int((grid == HOME).sum())}\n{max_time}\n".encode())
+        f.write(np.column_stack([grid, np.full(rows, b'\n', dtype='S1')]).tobytes())
+
+
+def write_grid(grid, path, eject_group=None):
+    """
+    Writes the layout as a weighted .grid file, like maps/sorting_map.grid: home stations
+    become Induct cells with their own station ids, and endpoints become Eject cells.
+    The size line is "rows,cols", the x and y columns are the row and the column, and
+    the weights are in the engine's move order: moving to a free 4-neighbor and waiting
+    cost 1.
+
+    :param eject_group: Number of consecutive endpoints of a row that share an eject
+                        station (default: all the endpoints of one face of a block).
+    """
+    rows, cols = grid.shape
+    flat = grid.reshape(-1)
+    free = grid != OBSTACLE
+    allowed = np.zeros((rows, cols, 4), dtype=bool)
+    allowed[:, :-1, 0] = free[:, :-1] & free[:, 1:]
+    allowed[1:, :, 1] = free[1:, :] & free[:-1, :]
+    allowed[:, 1:, 2] = free[:, 1:] & free[:, :-1]
+    allowed[:-1, :, 3] = free[:-1, :] & free[1:, :]
+    patterns = (allowed.reshape(-1, 4) * np.array([8, 4, 2, 1])).sum(axis=1)
+    weight_strings = [",".join("1" if pattern & bit else "inf" for bit in (8, 4, 2, 1)) + ",1" for pattern in range(16)]
+
+    # Every cell gets a "type,station" label; stations are numbered in row-major order.
+    labels = ["Travel,None", "Obstacle,None"]
+    codes = np.where(flat == OBSTACLE, 1, 0)
+    homes = np.flatnonzero(flat == HOME)
+    codes[homes] = len(labels) + np.arange(len(homes))
+    labels += [f"Induct,{INDUCT_BASE + i}" for i in range(len(homes))]
+    ejects = np.flatnonzero(flat == ENDPOINT)
+    if len(ejects):
+        # A new station starts after a gap in the row, or every eject_group endpoints.
+        starts = np.r_[True, np.diff(ejects) != 1]
+        group = np.cumsum(starts) - 1
+        if eject_group:
+            run_start = np.maximum.accumulate(np.where(starts, np.arange(len(ejects)), 0))
+            offset = np.arange(len(ejects)) - run_start
+            starts |= (offset % eject_group) == 0
+            group = np.cumsum(starts) - 1
+        codes[ejects] = len(labels) + group
+        labels += [f"Eject,{EJECT_BASE + i}" for i in range(group[-1] + 1)]
+
+    with open(path, 'w') as f:
+        f.write(f"Grid size (x, y)\n{rows},{cols}\n{GRID_HEADER}\n")
+        for start in range(0, rows * cols, CHUNK_CELLS):
+            ids = range(start, min(start + CHUNK_CELLS, rows * cols))
+            x, y = np.divmod(np.arange(ids.start, ids.stop), cols)
+            f.write("".join(f"{i},{labels[c]},{xi},{yi},{weight_strings[p]}\n" for i, c, xi, yi, p in
+                            zip(ids, codes[ids.start:ids.stop].tolist(), x.tolist(), y.tolist(),
+                                patterns[ids.start:ids.stop].tolist())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate warehouse maps like kiva.map and sorting_map.grid.")
+    parser.add_argument("output", help="Output path without extension; .map and/or .grid are appended.")
+    parser.add_argument("--blocks", type=int, nargs=2, default=(8, 3), metavar=("ROWS", "COLS"),
+                        help="Number of shelf blocks (default: 8 3, the layout of kiva.map).")
+    parser.add_argument("--block_size", type=int, nargs=2, default=(1, 10), metavar=("HEIGHT", "WIDTH"),
+                        help="Size of a shelf block (default: 1 10).")
+    parser.add_argument("--aisle_width", type=int, default=1, help="Width of the aisles (default: 1).")
+    parser.add_argument("--margin", type=int, default=7, help="Width of the station margins (default: 7).")
+    parser.add_argument("--homes", type=int, help="Number of home/induct stations (default: all margin lanes).")
+    parser.add_argument("--placement", choices=PLACEMENTS, default="sides",
+                        help="Margins that hold the home/induct stations (default: sides).")
+    parser.add_argument("--endpoints", type=int, help="Number of endpoint/eject cells (default: all block faces).")
+    parser.add_argument("--eject_group", type=int,
+                        help="Endpoints per eject station in .grid files (default: one station per block face).")
+    parser.add_argument("--obstacle_ratio", type=float, default=0.0,
+                        help="Fraction of obstacle cells; random travel cells are blocked to reach it (default: 0, none added).")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Multiply the number of blocks by this factor in both directions (default: 1).")
+    parser.add_argument("--formats", nargs="+", choices=("map", "grid"), default=["map", "grid"],
+                        help="Files to write (default: both).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random choices (default: 0).")
+    args = parser.parse_args()
+
+    blocks = (args.blocks[0] * args.scale, args.blocks[1] * args.scale)
+    grid = warehouse_layout(blocks, args.block_size, args.aisle_width, args.margin, args.homes, args.placement,
+                            args.endpoints, args.obstacle_ratio, args.seed)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    counts = {name: int((grid == char).sum()) for name, char in
+              (("obstacles", OBSTACLE), ("endpoints", ENDPOINT), ("home stations", HOME))}
+    print(f"{grid.shape[0]}x{grid.shape[1]} map ({grid.size} cells): "
+          + ", ".join(f"{count} {name}" for name, count in counts.items())
+          + f", {counts['obstacles'] / grid.size:.1%} obstacles"
+          + (f" (target {args.obstacle_ratio:.1%})" if args.obstacle_ratio > 0 else ""))
+    if "map" in args.formats:
+        write_map(grid, args.output + ".map")
+        print(f"Saved {args.output}.map")
+    if "grid" in args.formats:
+        write_grid(grid, args.output + ".grid", args.eject_group)
+        print(f"Saved {args.output}.grid")
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import os
+import random
+
+from lifelong_results import percentile, run_metrics
+from lifelong_sweep import (LifelongSweep, add_base_config_args, add_pool_args, base_config_from_args,
+                            pool_options_from_args)
+
+SUCCESS = ("finished", "cached")
+METRICS = ("throughput", "runtime_mean")
+
+
+def bootstrap_ci(values, confidence=0.95, resamples=2000, rng=None):
+    """
+    Computes a percentile bootstrap confidence interval of the mean.
+
+    :param values: The samples, e.g. one metric value per seed.
+    :param confidence: The confidence level of the interval.
+    :param resamples: The number of bootstrap resamples.
+    :param rng: Optional random.Random used for resampling.
+    :return: A (low, high) pair, or (None, None) for fewer than two values.
+    """
+    if len(values) < 2:
+        return None, None
+    rng = rng or random.Random(0)
+    n = len(values)
+    means = [sum(rng.choices(values, k=n)) / n for _ in range(resamples)]
+    tail = (1 - confidence) / 2 * 100
+    return percentile(means, tail), percentile(means, 100 - tail)
+
+
+class AdaptiveSeedRunner:
+    """
+    Runs one configuration with as many seeds as its metrics need.
+
+    The first min_seeds seeds run in parallel, then seeds are added in small batches (one at
+    a time by default), so the runner can stop early. After every batch, bootstrap confidence
+    intervals of the mean throughput and the mean replanning runtime over the seeds are
+    computed, and no more seeds are added once every interval is narrower than its target
+    (relative to the mean) or max_seeds is reached.
+    """
+    REPORT_FILE = "seed_report.csv"
+
+    def __init__(self, base_config, output_root, target_width=0.05, min_seeds=3, max_seeds=20, batch_size=None,
+                 first_seed=0, confidence=0.95, resamples=2000, metrics=METRICS, **pool_options):
+        """
+        Initializes the AdaptiveSeedRunner.
+
+        :param base_config: LifelongLauncher keyword arguments of the configuration (without output_folder and seed).
+        :param output_root: Folder that receives one subfolder per seed and the report.
+        :param target_width: Stop when every interval is at most this wide, relative to its mean
+                             (0.05 means the full width is at most 5% of the mean).
+        :param min_seeds: Number of seeds run before the intervals are checked.
+        :param max_seeds: Maximum number of seeds.
+        :param batch_size: Number of seeds added per batch after the first min_seeds (default: 1),
+                           at most max_workers when the pool size is given.
+        :param first_seed: The first seed; the following ones are consecutive.
+        :param confidence: The confidence level of the intervals.
+        :param resamples: The number of bootstrap resamples.
+        :param metrics: Names of the run_metrics values to estimate.
+        :param pool_options: LifelongSweep options (max_workers, timeout, cache, watchdog, preflight).
+        """
+        self.base_config = dict(base_config)
+        self.base_config.pop("seed", None)
+        self.output_root = output_root
+        self.target_width = target_width
+        self.min_seeds = min_seeds
+        self.max_seeds = max_seeds
+        self.batch_size = max(1, batch_size or 1)
+        if batch_size and pool_options.get("max_workers"):
+            self.batch_size = min(self.batch_size, pool_options["max_workers"])
+        self.first_seed = first_seed
+        self.confidence = confidence
+        self.resamples = resamples
+        self.metrics = list(metrics)
+        self.pool_options = pool_options
+        self.records = []
+        self.samples = {metric: [] for metric in self.metrics}
+
+    def intervals(self):
+        """
+        Computes the current confidence interval of every metric.
+
+        :return: A list of dicts with the metric, the number of samples, their mean, the
+                 interval bounds, its relative width and whether it meets the target.
+        """
+        rng = random.Random(0)
+        report = []
+        for metric in self.metrics:
+            values = self.samples[metric]
+            mean = sum(values) / len(values) if values else None
+            low, high = bootstrap_ci(values, self.confidence, self.resamples, rng)
+            width = None
+            if low is not None:
+                width = (high - low) / abs(mean) if mean else (0.0 if high == low else float("inf"))
+            report.append({"metric": metric, "seeds": len(values), "mean": mean, "ci_low": low,
+                           "ci_high": high, "relative_width": width,
+                           "converged": width is not None and width <= self.target_width})
+        return report
+
+    def run(self):
+        """
+        Adds seeds until the intervals converge or max_seeds seeds have been run.
+
+        :return: The final intervals, as returned by intervals().
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        next_seed = self.first_seed
+        report = self.intervals()
+        while len(self.records) < self.max_seeds:
+            size = min(max(self.min_seeds - len(self.records), self.batch_size), self.max_seeds - len(self.records))
+            seeds = list(range(next_seed, next_seed + size))
+            next_seed += size
+            sweep = LifelongSweep(self.base_config, [{"seed": seed} for seed in seeds], self.output_root,
+                                  **self.pool_options)
+            for record in sweep.run():
+                self.records.append(record)
+                if record["status"] not in SUCCESS:
+                    continue
+                metrics = run_metrics(record["output_folder"], self.base_config.get("simulation_time"))
+                for metric in self.metrics:
+                    if metrics.get(metric) is not None:
+                        self.samples[metric].append(metrics[metric])
+
+            report = self.intervals()
+            print(f"=== {len(self.records)} seeds: " + "; ".join(
+                f"{r['metric']} {_format(r['mean'])} [{_format(r['ci_low'])}, {_format(r['ci_high'])}]"
+                for r in report) + " ===")
+            if len(self.records) >= self.min_seeds and all(r["converged"] for r in report):
+                print(f"Converged after {len(self.records)} seeds.")
+                break
+        else:
+            print(f"Stopped at the maximum of {self.max_seeds} seeds without convergence.")
+
+        LifelongSweep(self.base_config, [{"seed": seed} for seed in range(self.first_seed, next_seed)], self.output_root,
+                      **self.pool_options).write_summary(self.records)
+        self.write_report(report)
+        return report
+
+    def write_report(self, report):
+        """
+        Writes the final intervals to seed_report.csv in output_root.
+        """
+        path = os.path.join(self.output_root, self.REPORT_FILE)
+        fields = ["metric", "seeds", "mean", "ci_low", "ci_high", "relative_width", "converged"]
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(report)
+        print(f"{self.confidence:.0%} confidence intervals over {len(self.records)} seeds written to {path}:")
+        for r in report:
+            print(f"    {r['metric']}: {_format(r['mean'])} [{_format(r['ci_low'])}, {_format(r['ci_high'])}]"
+                  f" ({r['seeds']} samples, relative width {_format(r['relative_width'])})")
+
+
+def _format(value):
+    return "-" if value is None else f"{value:.4g}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a 'lifelong' configuration with seeds added until its metrics converge.")
+
+    add_base_config_args(parser)
+    parser.add_argument("--target_width", type=float, default=0.05,
+                        help="Stop when every confidence interval is at most this wide relative to its mean (default: 0.05).")
+    parser.add_argument("--min_seeds", type=int, default=3, help="Number of seeds run before checking convergence (default: 3).")
+    parser.add_argument("--max_seeds", type=int, default=20, help="Maximum number of seeds (default: 20).")
+    parser.add_argument("--batch_size", type=int, default=None, help="Seeds added per batch after the first --min_seeds, at most -j (default: 1).")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals (default: 0.95).")
+    parser.add_argument("--resamples", type=int, default=2000, help="Number of bootstrap resamples (default: 2000).")
+    add_pool_args(parser)
+
+    args, unknown = parser.parse_known_args()
+
+    runner = AdaptiveSeedRunner(
+        base_config_from_args(args, unknown),
+        output_root=args.output_root,
+        target_width=args.target_width,
+        min_seeds=args.min_seeds,
+        max_seeds=args.max_seeds,
+        batch_size=args.batch_size,
+        first_seed=args.seed,
+        confidence=args.confidence,
+        resamples=args.resamples,
+        **pool_options_from_args(args)
+    )
+    runner.run()